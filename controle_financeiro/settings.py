@@ -64,6 +64,11 @@ WSGI_APPLICATION = 'controle_financeiro.wsgi.application'
 DATABASES = {
     "default": dj_database_url.parse(os.getenv("DATABASE_URL"), conn_max_age=600)
 }
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    # fallback SQLite: as escritas leem antes de gravar dentro do atomic(); com
+    # BEGIN IMMEDIATE o lock de escrita é pego no início e as concorrentes
+    # esperam o timeout em vez de falhar na hora com "database is locked"
+    DATABASES["default"].setdefault("OPTIONS", {}).update(transaction_mode="IMMEDIATE", timeout=20)
 
 # ===== Senhas =====
 AUTH_PASSWORD_VALIDATORS = [
@@ -83,6 +88,19 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / "static"]
 
+# ===== Arquivo frio (transações arquivadas) =====
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", BASE_DIR / "archive"))
+
+# ===== Jobs em background (core/jobs.py + manage.py run_worker) =====
+# False: jobs rodam na hora, dentro do request (dev). True: vão para a fila.
+JOBS_ASYNC = os.getenv("JOBS_ASYNC", "False") == "True"
+# parcelamentos acima deste nº de parcelas viram job
+JOBS_INSTALLMENTS_THRESHOLD = int(os.getenv("JOBS_INSTALLMENTS_THRESHOLD", "12"))
+
+# ===== Idempotência dos formulários de criação (core/idempotency.py) =====
+# por quanto tempo um reenvio com a mesma chave é ignorado
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+
 # ===== Outros =====
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = "/admin/login/"
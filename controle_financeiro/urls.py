@@ -5,7 +5,10 @@ from core.views import (
     dashboard, new_transaction,
     receipts_view, expenses_view, add_section,
     edit_transaction, delete_transaction, toggle_status,
-    transactions_view, import_fixed
+    transactions_view, import_fixed,
+    changes_view, close_month, reopen_month, set_budget, due_calendar,
+    job_detail, job_status,
+    account_statement, account_statement_api,
 )
 
 urlpatterns = [
@@ -19,5 +22,14 @@ urlpatterns = [
     path("despesas/", expenses_view, name="expenses"),
     path("secao/add/", add_section, name="add_section"),
     path("transacoes/", transactions_view, name="transactions"),
+    path("vencimentos/", due_calendar, name="due_calendar"),
     path("fixas/importar/<str:kind>/", import_fixed, name="import_fixed"),
+    path("contas/<int:pk>/extrato/", account_statement, name="account_statement"),
+    path("api/contas/<int:pk>/extrato/", account_statement_api, name="account_statement_api"),
+    path("periodo/fechar/", close_month, name="close_month"),
+    path("periodo/reabrir/", reopen_month, name="reopen_month"),
+    path("orcamentos/definir/", set_budget, name="set_budget"),
+    path("api/changes/", changes_view, name="changes"),
+    path("jobs/<int:pk>/", job_detail, name="job_detail"),
+    path("api/jobs/<int:pk>/", job_status, name="job_status"),
 ]
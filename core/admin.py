@@ -1,9 +1,20 @@
+import json
+from datetime import date
+
 from django.contrib import admin
-from .models import Account, Category, Transaction
+from django.contrib.admin.views.main import ChangeList, ORDER_VAR
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from . import periods
+from .models import Account, Category, Transaction, Change, MonthClose, ArchiveFile, Job, CategoryRule, Budget, DueReminder
 
 @admin.register(Account)
 class AccountAdmin(admin.ModelAdmin):
     list_display = ("name", "owner", "initial_balance")
+    list_select_related = ("owner",)
     search_fields = ("name", "owner__username")
 
 @admin.register(Category)
@@ -12,9 +23,143 @@ class CategoryAdmin(admin.ModelAdmin):
     list_filter = ("kind",)
     search_fields = ("name",)
 
+# --------------------------------------------
+# Changelist para tabelas grandes (core_transaction)
+# --------------------------------------------
+
+class EstimatedCountPaginator(Paginator):
+    """
+    No PostgreSQL usa a estimativa do planner (EXPLAIN) em vez de COUNT(*);
+    abaixo de EXACT_BELOW linhas estimadas, conta de verdade (é barato).
+    """
+    EXACT_BELOW = 20_000
+    estimated = False
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        conn = connections[qs.db]
+        if conn.vendor != "postgresql":
+            return super().count
+        sql, params = qs.query.sql_with_params()
+        with conn.cursor() as cur:
+            cur.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+        if estimate < self.EXACT_BELOW:
+            return super().count
+        self.estimated = True
+        return estimate
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Paginação por cursor (?k=<data>_<id>) na ordenação padrão (-date, -id):
+    a próxima página é `WHERE (date, id) < cursor LIMIT n`, custo constante em
+    qualquer profundidade. Com outra ordenação, volta à paginação por OFFSET.
+    """
+    CURSOR_VAR = "k"
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = None
+        raw = request.GET.get(self.CURSOR_VAR)
+        if raw and ORDER_VAR not in request.GET:
+            try:
+                d, pk = raw.split("_", 1)
+                self.cursor = (date.fromisoformat(d), int(pk))
+            except ValueError:
+                self.cursor = None
+        self.keyset = ORDER_VAR not in request.GET
+        self.next_cursor = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(self.CURSOR_VAR, None)
+        return lookup_params
+
+    def get_queryset(self, request, exclude_parameters=None):
+        self.params.pop(self.CURSOR_VAR, None)
+        qs = super().get_queryset(request, exclude_parameters)
+        if self.cursor and exclude_parameters is None:
+            d, pk = self.cursor
+            qs = qs.filter(Q(date__lt=d) | Q(date=d, id__lt=pk))
+        return qs
+
+    def get_results(self, request):
+        super().get_results(request)
+        if self.keyset and self.multi_page:
+            rows = list(self.result_list)  # avalia (e cacheia) a página já exibida
+            if len(rows) == self.list_per_page:
+                self.next_cursor = f"{rows[-1].date.isoformat()}_{rows[-1].pk}"
+
+    def next_cursor_url(self):
+        return self.get_query_string({self.CURSOR_VAR: self.next_cursor}, ["p"])
+
+    def first_page_url(self):
+        return self.get_query_string(remove=[self.CURSOR_VAR, "p"])
+
+
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
     list_display = ("date", "description", "account", "category", "amount", "status", "is_fixed")
-    list_filter = ("account", "category", "date", "status", "is_fixed")
-    search_fields = ("description",)
-    date_hierarchy = "date"
+    # sem filtros por conta/categoria (listariam as de todos os usuários) e sem
+    # date_hierarchy (consultas DISTINCT por data); filtre via ?account__id__exact=
+    list_filter = ("status", "is_fixed", "date")
+    list_select_related = ("account", "category")
+    # prefixo (istartswith) usa o índice UPPER(description) text_pattern_ops no PostgreSQL
+    search_fields = ("^description",)
+    autocomplete_fields = ("account", "category")
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def has_delete_permission(self, request, obj=None):
+        # edição em mês fechado já é recusada por Transaction.clean()
+        if obj is not None and periods.is_closed(obj.account.owner_id, obj.date):
+            return False
+        return super().has_delete_permission(request, obj)
+
+@admin.register(Change)
+class ChangeAdmin(admin.ModelAdmin):
+    list_display = ("seq", "entity", "object_id", "op", "owner", "created_at")
+    list_filter = ("entity", "op")
+    readonly_fields = ("seq", "entity", "object_id", "op", "owner", "data", "created_at")
+
+@admin.register(MonthClose)
+class MonthCloseAdmin(admin.ModelAdmin):
+    list_display = ("owner", "year", "month", "closed_at")
+    list_filter = ("year",)
+
+@admin.register(ArchiveFile)
+class ArchiveFileAdmin(admin.ModelAdmin):
+    list_display = ("year", "path", "row_count", "created_at")
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "owner", "status", "progress_done", "progress_total", "worker", "created_at", "finished_at")
+    list_filter = ("status", "name")
+    readonly_fields = ("params", "result", "error", "worker", "started_at", "finished_at")
+
+@admin.register(CategoryRule)
+class CategoryRuleAdmin(admin.ModelAdmin):
+    list_display = ("pattern", "match_type", "category", "min_amount", "max_amount", "account", "priority", "is_active", "owner")
+    list_filter = ("match_type", "is_active")
+    search_fields = ("pattern",)
+
+@admin.register(Budget)
+class BudgetAdmin(admin.ModelAdmin):
+    list_display = ("category", "year", "month", "limit", "owner")
+    list_filter = ("year", "month")
+    list_select_related = ("category", "owner")
+
+@admin.register(DueReminder)
+class DueReminderAdmin(admin.ModelAdmin):
+    list_display = ("date", "owner", "overdue_count", "overdue_total", "upcoming_count", "upcoming_total", "sent_at")
+    list_filter = ("date",)
+    list_select_related = ("owner",)
+    readonly_fields = ("items", "created_at", "sent_at")
@@ -0,0 +1,370 @@
+"""
+Arquivo frio de transações.
+
+Anos antigos saem de `core_transaction` e vão para arquivos colunares
+comprimidos em disco (um .zip por ano/parte, um membro por dono e coluna),
+sem dependências externas. Os totais por conta ficam em ArchivedAccountTotal, para
+que os saldos continuem corretos, e os arquivos podem ser lidos de volta
+(`read_columns` / `iter_rows`) por análises e exportações — só os membros do
+dono pedido são descomprimidos.
+
+Formato (versão 2):
+    manifest.json              {"version", "year", "rows", "columns": {nome: tipo},
+                                "owners": {owner_id: linhas}}
+    <owner_id>/<coluna>.bin    tipos: i2/i4/i8 (array little-endian),
+                               uuid (16 bytes por linha), str (JSON list);
+                               linhas do dono em ordem (date, id)
+A versão 1 (um `<coluna>.bin` com todos os donos) continua legível.
+"""
+import json
+import os
+import sys
+import uuid
+import zipfile
+from array import array
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from .models import Transaction, ArchiveFile, ArchivedAccountTotal
+
+FORMAT_VERSION = 2
+READABLE_VERSIONS = (1, 2)
+
+# coluna -> tipo no arquivo
+COLUMNS = {
+    "id": "i8",
+    "owner_id": "i8",
+    "account_id": "i8",
+    "category_id": "i8",
+    "date": "i4",           # date.toordinal()
+    "amount_cents": "i8",
+    "status": "str",
+    "description": "str",
+    "group_id": "uuid",
+    "installment_no": "i2",     # -1 = nulo
+    "installment_count": "i2",  # -1 = nulo
+    "is_fixed": "i2",
+    "created_at": "i8",     # microssegundos desde epoch (UTC)
+    "updated_at": "i8",
+}
+
+_TYPECODES = {"i2": "h", "i4": "i", "i8": "q"}
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def archive_dir() -> Path:
+    return Path(getattr(settings, "ARCHIVE_DIR", settings.BASE_DIR / "archive"))
+
+
+def _to_micros(dt):
+    if dt is None:
+        return 0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    delta = dt - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _from_micros(us):
+    return datetime.fromtimestamp(us / 1_000_000, tz=timezone.utc)
+
+
+def _encode(kind, values):
+    if kind in _TYPECODES:
+        arr = values if isinstance(values, array) else array(_TYPECODES[kind], values)
+        if sys.byteorder != "little":
+            arr = array(arr.typecode, arr)
+            arr.byteswap()
+        return arr.tobytes()
+    if kind == "uuid":
+        return b"".join(values)
+    return json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _empty(kind):
+    return array(_TYPECODES[kind]) if kind in _TYPECODES else []
+
+
+def _decode(kind, raw):
+    if kind in _TYPECODES:
+        arr = array(_TYPECODES[kind])
+        arr.frombytes(raw)
+        if sys.byteorder != "little":
+            arr.byteswap()
+        return arr
+    if kind == "uuid":
+        return [uuid.UUID(bytes=raw[i:i + 16]) for i in range(0, len(raw), 16)]
+    return json.loads(raw.decode("utf-8"))
+
+
+# --------------------------------------------
+# Escrita
+# --------------------------------------------
+
+def _year_queryset(year):
+    return Transaction.objects.filter(date__gte=date(year, 1, 1), date__lt=date(year + 1, 1, 1))
+
+
+def _next_path(year, directory):
+    part = 1
+    while (directory / f"transactions_{year}_{part:02d}.zip").exists():
+        part += 1
+    return directory / f"transactions_{year}_{part:02d}.zip"
+
+
+def write_year(year, directory=None, lock=False):
+    """
+    Exporta o ano para um arquivo colunar.
+    Devolve (caminho, nº de linhas, {account_id: (centavos, qtd)}, ids) — os
+    totais saem do que foi gravado, não de uma segunda leitura do banco.
+    `lock=True` lê com FOR UPDATE (exige transação): as linhas lidas ficam
+    travadas até o commit.
+    """
+    directory = Path(directory or archive_dir())
+    directory.mkdir(parents=True, exist_ok=True)
+
+    owners = {}   # owner_id -> {coluna: valores}
+    qs = _year_queryset(year)
+    if lock:
+        qs = qs.select_for_update(of=("self",))
+    rows = (
+        qs.order_by("account__owner_id", "date", "id")
+        .values_list(
+            "id", "account__owner_id", "account_id", "category_id", "date", "amount",
+            "status", "description", "group_id", "installment_no", "installment_count",
+            "is_fixed", "created_at", "updated_at",
+        )
+    )
+    n = 0
+    totals = {}
+    ids = array("q")
+    owner, cols = None, None
+    for (pk, owner_id, account_id, category_id, d, amount, status, desc, group_id,
+         inst_no, inst_count, is_fixed, created_at, updated_at) in rows.iterator(chunk_size=5000):
+        if owner_id != owner:
+            owner = owner_id
+            cols = owners[owner_id] = {name: _empty(kind) for name, kind in COLUMNS.items()}
+        ids.append(pk)
+        cols["id"].append(pk)
+        cols["owner_id"].append(owner_id)
+        cols["account_id"].append(account_id)
+        cols["category_id"].append(category_id)
+        cols["date"].append(d.toordinal())
+        cols["amount_cents"].append(int(amount * 100))
+        cols["status"].append(status)
+        cols["description"].append(desc)
+        cols["group_id"].append(group_id.bytes)
+        cols["installment_no"].append(-1 if inst_no is None else inst_no)
+        cols["installment_count"].append(-1 if inst_count is None else inst_count)
+        cols["is_fixed"].append(1 if is_fixed else 0)
+        cols["created_at"].append(_to_micros(created_at))
+        cols["updated_at"].append(_to_micros(updated_at))
+        cents, count = totals.get(account_id, (0, 0))
+        totals[account_id] = (cents + cols["amount_cents"][-1], count + 1)
+        n += 1
+
+    path = _next_path(year, directory)
+    tmp = path.with_suffix(".zip.tmp")
+
+    manifest = {
+        "version": FORMAT_VERSION, "year": year, "rows": n, "columns": COLUMNS,
+        "owners": {str(o): len(c["id"]) for o, c in owners.items()},
+    }
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        zf.writestr("manifest.json", json.dumps(manifest))
+        for owner_id, cols in owners.items():
+            for name, kind in COLUMNS.items():
+                zf.writestr(f"{owner_id}/{name}.bin", _encode(kind, cols[name]))
+    os.replace(tmp, path)
+    return path, n, totals, ids
+
+
+def _is_partitioned():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cur:
+        cur.execute("SELECT relkind FROM pg_class WHERE relname = %s", [Transaction._meta.db_table])
+        row = cur.fetchone()
+    return bool(row and row[0] == "p")
+
+
+def _lock_partition(year):
+    """
+    Com particionamento: trava a partição do ano contra escritas (inclusive
+    inserts) até o commit e devolve o nome dela; senão None.
+    """
+    if not _is_partitioned():
+        return None
+    partition = f"{Transaction._meta.db_table}_y{year}"
+    with connection.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s)", [partition])
+        if not cur.fetchone()[0]:
+            return None
+        cur.execute(f'LOCK TABLE "{partition}" IN EXCLUSIVE MODE')
+    return partition
+
+
+DELETE_BATCH = 1000
+
+
+def _drop_rows(ids, partition=None):
+    """
+    Remove as linhas arquivadas sem passar pelo Collector (sem journal:
+    arquivar não é excluir). Partição travada: descartada inteira; senão só os
+    ids gravados no arquivo.
+    """
+    table = Transaction._meta.db_table
+    with connection.cursor() as cur:
+        if partition:
+            cur.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{partition}"')
+            cur.execute(f'DROP TABLE "{partition}"')
+            return
+        for i in range(0, len(ids), DELETE_BATCH):
+            chunk = list(ids[i:i + DELETE_BATCH])
+            cur.execute(
+                f'DELETE FROM "{table}" WHERE "id" IN ({", ".join(["%s"] * len(chunk))})', chunk
+            )
+
+
+def archive_year(year, directory=None):
+    """
+    Arquiva um ano: grava o arquivo, registra ArchiveFile + totais por conta e
+    remove do banco exatamente as linhas gravadas — tudo numa transação, com
+    as linhas travadas desde a leitura (o arquivo é apagado se falhar).
+    Escritas concorrentes no ano esperam o fim do arquivamento; linhas novas
+    ficam no banco para o próximo arquivamento.
+    """
+    path = None
+    try:
+        with transaction.atomic():
+            # primeiro write: no SQLite já segura o lock de escrita antes da leitura
+            archive = ArchiveFile.objects.create(year=year, path="", row_count=0)
+            partition = _lock_partition(year)
+            path, n, totals, ids = write_year(year, directory, lock=partition is None)
+            archive.path, archive.row_count = str(path), n
+            archive.save(update_fields=["path", "row_count"])
+            ArchivedAccountTotal.objects.bulk_create([
+                ArchivedAccountTotal(
+                    archive=archive, account_id=account_id,
+                    total=Decimal(cents).scaleb(-2), count=count,
+                )
+                for account_id, (cents, count) in totals.items()
+            ])
+            _drop_rows(ids, partition)
+    except Exception:
+        if path is not None:
+            path.unlink(missing_ok=True)
+        raise
+    return archive
+
+
+# --------------------------------------------
+# Leitura
+# --------------------------------------------
+
+def read_columns(path, columns=None, owner_id=None):
+    """
+    Lê colunas de um arquivo: {nome: array|list}. Ints ficam como array.
+    Com `owner_id`, só as linhas (e só os membros, na versão 2) desse dono.
+    """
+    with zipfile.ZipFile(path) as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+        if manifest["version"] not in READABLE_VERSIONS:
+            raise ValueError(f"Versão de arquivo não suportada: {manifest['version']}")
+        kinds = manifest["columns"]
+        wanted = columns or list(kinds)
+        if manifest["version"] == 1:
+            return _read_v1(zf, kinds, wanted, owner_id)
+        owners = manifest["owners"]
+        if owner_id is not None:
+            owners = [str(owner_id)] if str(owner_id) in owners else []
+        cols = {name: _empty(kinds[name]) for name in wanted}
+        for owner in owners:
+            for name in wanted:
+                cols[name] += _decode(kinds[name], zf.read(f"{owner}/{name}.bin"))
+        return cols
+
+
+def _read_v1(zf, kinds, wanted, owner_id):
+    cols = {name: _decode(kinds[name], zf.read(f"{name}.bin")) for name in wanted}
+    if owner_id is None:
+        return cols
+    owners = cols["owner_id"] if "owner_id" in cols else _decode(kinds["owner_id"], zf.read("owner_id.bin"))
+    keep = [i for i, owner in enumerate(owners) if owner == owner_id]
+    return {
+        name: (array(values.typecode, (values[i] for i in keep)) if isinstance(values, array)
+               else [values[i] for i in keep])
+        for name, values in cols.items()
+    }
+
+
+def archive_paths(year_from=None, year_to=None):
+    """Caminhos dos arquivos registrados no intervalo de anos (inclusive)."""
+    qs = ArchiveFile.objects.order_by("year", "id")
+    if year_from is not None:
+        qs = qs.filter(year__gte=year_from)
+    if year_to is not None:
+        qs = qs.filter(year__lte=year_to)
+    return list(qs.values_list("path", flat=True))
+
+
+def iter_rows(owner_id, year_from=None, year_to=None):
+    """Linhas arquivadas do usuário como dicts (mesmos nomes dos campos do modelo)."""
+    for path in archive_paths(year_from, year_to):
+        c = read_columns(path, owner_id=owner_id)
+        for i in range(len(c["id"])):
+            yield {
+                "id": c["id"][i],
+                "account_id": c["account_id"][i],
+                "category_id": c["category_id"][i],
+                "date": date.fromordinal(c["date"][i]),
+                "amount": Decimal(c["amount_cents"][i]).scaleb(-2),
+                "status": c["status"][i],
+                "description": c["description"][i],
+                "group_id": c["group_id"][i],
+                "installment_no": None if c["installment_no"][i] < 0 else c["installment_no"][i],
+                "installment_count": None if c["installment_count"][i] < 0 else c["installment_count"][i],
+                "is_fixed": bool(c["is_fixed"][i]),
+                "created_at": _from_micros(c["created_at"][i]),
+                "updated_at": _from_micros(c["updated_at"][i]),
+            }
+
+
+def archived_account_totals(user):
+    """{account_id: soma arquivada} das contas do usuário (para saldos)."""
+    rows = (
+        ArchivedAccountTotal.objects
+        .filter(account__owner=user)
+        .order_by()
+        .values("account_id")
+        .annotate(total=Sum("total"))
+    )
+    return {r["account_id"]: r["total"] for r in rows}
+
+
+def archived_month_totals(user=None):
+    """
+    {(owner_id, category_id, ano, mês): (soma, qtd)} das linhas arquivadas
+    (todas ou de um usuário). Arquivar não mexe em CategoryMonthTotal — como
+    nos saldos, o realizado continua contando o que foi arquivado — e
+    `budgets.rebuild_totals` soma isto às linhas vivas.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    months = {}   # ordinal -> (ano, mês)
+    wanted = ["owner_id", "category_id", "date", "amount_cents"]
+    for path in archive_paths():
+        c = read_columns(path, wanted, owner_id=user.pk if user is not None else None)
+        for owner_id, category_id, d, cents in zip(c["owner_id"], c["category_id"], c["date"], c["amount_cents"]):
+            if d not in months:
+                day = date.fromordinal(d)
+                months[d] = (day.year, day.month)
+            acc = totals[(owner_id, category_id, *months[d])]
+            acc[0] += cents
+            acc[1] += 1
+    return {key: (Decimal(cents).scaleb(-2), n) for key, (cents, n) in totals.items()}
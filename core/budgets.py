@@ -0,0 +1,319 @@
+"""
+Orçamentos mensais por categoria.
+
+O realizado NÃO é recalculado a cada página: CategoryMonthTotal guarda a soma
+(com sinal) e a quantidade de transações por (dono, categoria, ano, mês) e é
+mantido por deltas `total = total + x` (F()) na MESMA transação de banco de
+cada escrita em Transaction — save/delete por instância e também
+bulk_create/update/bulk_update (ver BudgetedQuerySet). O painel de
+orçamento x realizado lê então uma linha por categoria.
+
+Arquivar um ano (core/archive.py) não altera os contadores: o realizado cobre
+o histórico inteiro, vivo + arquivado, como os saldos. `rebuild_totals`
+recalcula tudo a partir das transações e dos arquivos (carga inicial /
+correção de divergências, comando `rebuild_budget_totals`).
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from .journal import JournaledQuerySet
+
+# campos de Transaction que mudam o contador
+COUNTED_FIELDS = ("date", "amount", "category", "category_id", "account", "account_id")
+
+WARN_PCT = 80
+CENT = Decimal("0.01")
+MAX_LIMIT = Decimal("9999999999.99")   # Budget.limit: max_digits=12, decimal_places=2
+
+
+def touches(fields):
+    """True se a escrita envolve algum campo contado (None = todos)."""
+    return fields is None or any(f in COUNTED_FIELDS for f in fields)
+
+
+def _as_date(d):
+    return date.fromisoformat(d) if isinstance(d, str) else d
+
+
+def _add(deltas, key, amount, count):
+    total, n = deltas[key]
+    deltas[key] = (total + amount, n + count)
+
+
+def grouped(qs):
+    """Soma/quantidade por chave (dono, categoria, ano, mês) de um queryset de Transaction."""
+    rows = (
+        qs.order_by()
+        .values_list(
+            "account__owner_id", "category_id",
+            ExtractYear("date"), ExtractMonth("date"),
+        )
+        .annotate(s=Sum("amount"), n=Count("id"))
+    )
+    return {(o, c, y, m): (s, n) for o, c, y, m, s, n in rows}
+
+
+def apply(deltas):
+    """
+    Aplica {(owner_id, category_id, ano, mês): (delta_total, delta_qtd)} com
+    UPDATE ... SET total = total + delta; cria a linha se ainda não existe.
+    Deve rodar dentro da transação da escrita.
+    """
+    from .models import CategoryMonthTotal
+
+    for (owner_id, category_id, year, month), (total, count) in sorted(deltas.items()):
+        if not total and not count:
+            continue
+        key = {"owner_id": owner_id, "category_id": category_id, "year": year, "month": month}
+        qs = CategoryMonthTotal.objects.filter(**key)
+        if qs.update(total=F("total") + total, count=F("count") + count):
+            continue
+        try:
+            with transaction.atomic():
+                CategoryMonthTotal.objects.create(total=total, count=count, **key)
+        except IntegrityError:
+            # outra transação criou a linha entre o UPDATE e o INSERT
+            qs.update(total=F("total") + total, count=F("count") + count)
+
+
+def month_keys(qs):
+    """{(dono, ano, mês)} tocados por um queryset de Transaction."""
+    return set(
+        qs.order_by()
+        .values_list("account__owner_id", ExtractYear("date"), ExtractMonth("date"))
+        .distinct()
+    )
+
+
+def diff(after, before):
+    """Deltas after - before (dicts de `grouped`)."""
+    deltas = defaultdict(lambda: (Decimal("0"), 0))
+    for key, (s, n) in after.items():
+        _add(deltas, key, Decimal(s), n)
+    for key, (s, n) in before.items():
+        _add(deltas, key, -Decimal(s), -n)
+    return deltas
+
+
+# --------------------------------------------
+# Ganchos de escrita
+# --------------------------------------------
+
+def _owner_of(account_id):
+    from .models import Account
+
+    return Account.objects.filter(pk=account_id).values_list("owner_id", flat=True).first()
+
+
+def entry(tx, owner_id=None):
+    """Chave + valor de uma instância de Transaction."""
+    d = _as_date(tx.date)
+    if owner_id is None:
+        owner_id = tx.account.owner_id
+    return (owner_id, tx.category_id, d.year, d.month), Decimal(str(tx.amount))
+
+
+def stored_entry(tx, lock=False):
+    """
+    Chave + valor da linha como está no banco (antes de um save/delete).
+    Sem `lock`, aproveita o estado carregado (checagens baratas, ex.: mês
+    fechado); com `lock`, relê a linha com SELECT ... FOR UPDATE — é o que os
+    contadores usam, já que a instância pode estar desatualizada.
+    """
+    loaded = None if lock else tx.loaded_state() or {}
+    if loaded and all(a in loaded for a in ("date", "amount", "category_id", "account_id")):
+        if loaded["account_id"] == tx.account_id:
+            owner_id = tx.account.owner_id
+        else:
+            owner_id = _owner_of(loaded["account_id"])
+        d = loaded["date"]
+        return (owner_id, loaded["category_id"], d.year, d.month), loaded["amount"]
+    rows = type(tx)._base_manager.filter(pk=tx.pk)
+    if lock:
+        rows = rows.select_for_update(of=("self",))
+    row = rows.values_list("account__owner_id", "category_id", "date", "amount").first()
+    if row is None:
+        return None
+    owner_id, category_id, d, amount = row
+    return (owner_id, category_id, d.year, d.month), Decimal(str(amount))
+
+
+def on_save(old, tx, fields=None):
+    """`old` = stored_entry(tx, lock=True) lido antes do UPDATE; `fields` = update_fields."""
+    deltas = defaultdict(lambda: (Decimal("0"), 0))
+    if old is not None:
+        _add(deltas, old[0], -old[1], -1)
+    if fields is None or {"date", "amount", "category", "account"} <= {f.removesuffix("_id") for f in fields}:
+        key, amount = entry(tx)
+    else:
+        # save parcial: campos fora de update_fields ficaram como estavam no banco
+        key, amount = stored_entry(tx, lock=True)
+    _add(deltas, key, amount, 1)
+    apply(deltas)
+
+
+def on_delete(tx, owner_id, batch=None):
+    """Desconta a linha excluída; dentro de um journal.DeleteBatch, acumula e aplica uma vez no fim."""
+    stored = getattr(tx, "_budget_entry", None)   # Transaction.delete(): linha relida do banco
+    if stored is not None:
+        key, amount = stored
+    elif owner_id is None:   # dono desconhecido (conta já removida)
+        return
+    else:
+        # cascata / QuerySet.delete(): o Collector acabou de carregar as instâncias
+        key, amount = entry(tx, owner_id)
+    if batch is None:
+        apply({key: (-amount, -1)})
+        return
+    deltas = batch.state("budgets", lambda: defaultdict(lambda: (Decimal("0"), 0)), apply)
+    _add(deltas, key, -amount, -1)
+
+
+class BudgetedQuerySet(JournaledQuerySet):
+    """
+    Mantém CategoryMonthTotal também nas escritas em lote de Transaction,
+    recusa (periods.MonthClosedError) as que tocam mês fechado e incrementa
+    `version` em todo UPDATE (bulk_update, jobs) — senão um save_if_unchanged
+    concorrente não perceberia a escrita.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from . import periods
+
+        objs = list(objs)
+        owners = {}
+        for o in objs:
+            if o.account_id not in owners:
+                owners[o.account_id] = _owner_of(o.account_id)
+        # verificações antes do atomic: um erro aqui não invalida a transação de quem chamou
+        periods.ensure_open(
+            (owners[o.account_id], _as_date(o.date).year, _as_date(o.date).month) for o in objs
+        )
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            created = [o for o in objs if o.pk is not None]
+            if created:
+                deltas = defaultdict(lambda: (Decimal("0"), 0))
+                for o in created:
+                    key, amount = entry(o, owners[o.account_id])
+                    _add(deltas, key, amount, 1)
+                apply(deltas)
+        return objs
+
+    def update(self, **kwargs):
+        from . import periods
+
+        keys = month_keys(self)
+        new_date = kwargs.get("date")
+        if isinstance(new_date, (date, str)):
+            new_date = _as_date(new_date)
+            keys |= {(owner_id, new_date.year, new_date.month) for owner_id, _y, _m in keys}
+        periods.ensure_open(keys)
+        kwargs.setdefault("version", F("version") + 1)
+        if not touches(kwargs):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            rows = self.model._base_manager.filter(pk__in=list(self.values_list("pk", flat=True)))
+            before = grouped(rows)
+            result = super().update(**kwargs)
+            apply(diff(grouped(rows), before))
+        return result
+
+    def delete(self):
+        from . import periods
+
+        periods.ensure_open(month_keys(self))
+        return super().delete()
+
+    # bulk_update() chega aqui: QuerySet.bulk_update faz um update() por lote.
+
+
+# --------------------------------------------
+# Leitura / manutenção
+# --------------------------------------------
+
+def month_totals(user, year, month, category_ids=None):
+    """{category_id: total com sinal} do mês, direto dos contadores."""
+    from .models import CategoryMonthTotal
+
+    qs = CategoryMonthTotal.objects.filter(owner=user, year=year, month=month)
+    if category_ids is not None:
+        qs = qs.filter(category_id__in=category_ids)
+    return dict(qs.values_list("category_id", "total"))
+
+
+def budget_panel(user, year, month):
+    """
+    Orçamento x realizado do mês: uma linha por orçamento, com
+    spent (positivo), remaining, over_by, pct e status ('ok' | 'warn' | 'over').
+    """
+    from .models import Budget
+
+    budgets = list(
+        Budget.objects.filter(owner=user, year=year, month=month)
+        .select_related("category")
+        .order_by("category__name")
+    )
+    totals = month_totals(user, year, month, [b.category_id for b in budgets])
+    rows = []
+    for b in budgets:
+        spent = -(totals.get(b.category_id) or Decimal("0"))
+        if b.category.kind != "EX":
+            spent = -spent
+        pct = int(spent * 100 / b.limit) if b.limit else 0
+        if spent > b.limit:
+            status = "over"
+        elif pct >= WARN_PCT:
+            status = "warn"
+        else:
+            status = "ok"
+        rows.append({
+            "budget": b,
+            "category": b.category,
+            "limit": b.limit,
+            "spent": spent,
+            "remaining": b.limit - spent,
+            "over_by": max(spent - b.limit, Decimal("0")),
+            "pct": pct,
+            "bar_pct": max(0, min(pct, 100)),
+            "status": status,
+        })
+    return rows
+
+
+def rebuild_totals(user=None):
+    """Recalcula os contadores a partir das transações vivas + arquivadas (todas ou de um usuário)."""
+    from django.contrib.auth import get_user_model
+
+    from . import archive
+    from .models import Category, CategoryMonthTotal, Transaction
+
+    tx = Transaction.objects.all()
+    counters = CategoryMonthTotal.objects.all()
+    if user is not None:
+        tx = tx.filter(account__owner=user)
+        counters = counters.filter(owner=user)
+    with transaction.atomic():
+        counters.delete()
+        totals = defaultdict(lambda: (Decimal("0"), 0))
+        for source in (grouped(tx), archive.archived_month_totals(user)):
+            for key, (s, n) in source.items():
+                _add(totals, key, Decimal(s), n)
+        # arquivos podem citar usuários/categorias removidos depois do arquivamento
+        owners = set(get_user_model().objects.filter(pk__in={k[0] for k in totals}).values_list("pk", flat=True))
+        categories = set(Category.objects.filter(pk__in={k[1] for k in totals}).values_list("pk", flat=True))
+        rows = [
+            CategoryMonthTotal(
+                owner_id=owner_id, category_id=category_id, year=year, month=month,
+                total=s, count=n,
+            )
+            for (owner_id, category_id, year, month), (s, n) in totals.items()
+            if owner_id in owners and category_id in categories
+        ]
+        CategoryMonthTotal.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
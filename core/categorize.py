@@ -0,0 +1,210 @@
+"""
+Categorização automática por regras (CategoryRule).
+
+As regras ativas de um usuário são compiladas num único matcher:
+  - palavras-chave -> UMA regex em forma de trie, dentro de um lookahead
+    `(?=(trie))`, que acha todas as ocorrências (inclusive sobrepostas) numa
+    só passada em C — o custo por posição não cresce com o nº de palavras;
+  - regex do usuário -> UMA regex combinada com um grupo nomeado por regra;
+  - regras só com filtro (valor/conta, sem padrão) valem para toda descrição.
+Dos candidatos encontrados vence o de maior prioridade cujos filtros de
+valor (absoluto) e conta passam. Numa mesma posição a regex combinada só
+reporta a primeira regra que casa; se uma regex candidata é barrada pelos
+filtros, as demais regex de prioridade maior que o vencedor são testadas uma
+a uma (caminho raro).
+"""
+import re
+from decimal import Decimal
+
+from django.db.models import Count, Max
+
+from .models import CategoryRule
+
+# construções que quebram (ou mudam de sentido) quando as regex são combinadas
+_UNSUPPORTED = [
+    (re.compile(r"\\[1-9]|\(\?P="), "Backreferences não são suportadas."),
+    (re.compile(r"\(\?P<|\(\?\("), "Grupos nomeados e condicionais não são suportados."),
+    (re.compile(r"\(\?[aiLmsux]+\)"),
+     "Flags globais como (?i) não são suportadas; use (?i:...) — a busca já ignora maiúsculas."),
+]
+_GROUP_PREFIX = "_cr"
+
+
+def validate_pattern(pattern):
+    """Erro (str) se a regex não pode ser usada numa regra, senão None."""
+    for check, message in _UNSUPPORTED:
+        if check.search(pattern):
+            return message
+    try:
+        re.compile(pattern)
+        # do jeito que entra no matcher combinado
+        re.compile(f"(?=(?:(?P<{_GROUP_PREFIX}0>{pattern})|(?P<{_GROUP_PREFIX}1>x)))")
+    except re.error as e:
+        return f"Regex inválida: {e}"
+    return None
+
+
+def _trie_regex(words):
+    """Regex equivalente a `w1|w2|...` com prefixos comuns fatorados (casa a mais longa)."""
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        end = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not end:
+            return branches[0]
+        alt = "(?:" + "|".join(branches) + ")"
+        return alt + "?" if end else alt
+
+    return build(trie)
+
+
+class RuleMatcher:
+    """Matcher compilado de um conjunto de regras."""
+
+    def __init__(self, rules):
+        # rank 0 = maior prioridade
+        rules = sorted(rules, key=lambda r: (-r.priority, r.id))
+        self.categories = [r.category_id for r in rules]
+        self.filters = [
+            (
+                None if r.min_amount is None else abs(r.min_amount),
+                None if r.max_amount is None else abs(r.max_amount),
+                r.account_id,
+            )
+            for r in rules
+        ]
+        self.has_filter = [f != (None, None, None) for f in self.filters]
+
+        keywords = {}
+        regex_parts = []
+        self.group_rank = {}
+        self.always = []
+        # cada regex também compilada sozinha: numa posição a alternação só
+        # reporta a primeira que casa (ver match)
+        self.regex_rules = []
+        for rank, r in enumerate(rules):
+            pattern = (r.pattern or "").strip()
+            if not pattern:
+                self.always.append(rank)
+            elif r.match_type == CategoryRule.REGEX:
+                if validate_pattern(pattern):
+                    continue  # regra antiga inválida: ignorada em vez de quebrar o matcher
+                name = f"{_GROUP_PREFIX}{rank}"
+                self.group_rank[name] = rank
+                regex_parts.append(f"(?P<{name}>{pattern})")
+                self.regex_rules.append((rank, re.compile(pattern, re.IGNORECASE)))
+            else:
+                keywords.setdefault(pattern.lower(), []).append(rank)
+
+        # cada ocorrência casa com a palavra mais longa naquela posição; as
+        # palavras que são prefixo dela (mesma posição) entram junto
+        self.kw_ranks = {
+            kw: sorted(
+                rank
+                for i in range(1, len(kw) + 1) if kw[:i] in keywords
+                for rank in keywords[kw[:i]]
+            )
+            for kw in keywords
+        }
+        self.kw_re = None
+        if keywords:
+            self.kw_re = re.compile(f"(?=({_trie_regex(keywords)}))")
+        self.group_rank_set = set(self.group_rank.values())
+        self.regex_re = None
+        if regex_parts:
+            self.regex_re = re.compile(f"(?=(?:{'|'.join(regex_parts)}))", re.IGNORECASE)
+
+    def __bool__(self):
+        return bool(self.categories)
+
+    def _accepts(self, rank, amount, account_id):
+        lo, hi, acc = self.filters[rank]
+        if acc is not None and acc != account_id:
+            return False
+        if lo is None and hi is None:
+            return True
+        if amount is None:
+            return False
+        value = abs(amount)
+        return (lo is None or value >= lo) and (hi is None or value <= hi)
+
+    def match(self, description, amount=None, account_id=None):
+        """category_id da melhor regra para a descrição, ou None."""
+        cands = None
+        if self.kw_re is not None:
+            for m in self.kw_re.finditer(description.lower()):
+                if cands is None:
+                    cands = []
+                cands.extend(self.kw_ranks[m.group(1)])
+        if self.regex_re is not None:
+            for m in self.regex_re.finditer(description):
+                if cands is None:
+                    cands = []
+                cands.append(self.group_rank[m.lastgroup])
+        if self.always:
+            cands = (cands or []) + self.always
+        if cands is None:
+            return None
+
+        best = None
+        regex_filtered = False
+        for rank in sorted(set(cands)) if len(cands) > 1 else cands:
+            if not self.has_filter[rank] or self._accepts(rank, amount, account_id):
+                best = rank
+                break
+            if rank in self.group_rank_set:
+                regex_filtered = True
+
+        # uma regex barrada pelos filtros pode ter escondido, na mesma posição,
+        # outra regex de prioridade menor: testa as que não apareceram, uma a uma
+        if regex_filtered:
+            seen = set(cands)
+            limit = len(self.categories) if best is None else best
+            for rank, rx in self.regex_rules:
+                if rank >= limit:
+                    break
+                if rank not in seen and rx.search(description) and (
+                    not self.has_filter[rank] or self._accepts(rank, amount, account_id)
+                ):
+                    best = rank
+                    break
+        return None if best is None else self.categories[best]
+
+    def match_many(self, rows):
+        """rows: iterável de (description, amount, account_id) -> lista de category_id|None."""
+        match = self.match
+        return [match(d, a, acc) for d, a, acc in rows]
+
+
+# cache por processo: user_id -> (carimbo das regras, matcher)
+_CACHE = {}
+
+
+def matcher_for(user):
+    """Matcher das regras ativas do usuário (recompila só quando as regras mudam)."""
+    rules = CategoryRule.objects.filter(owner=user, is_active=True)
+    stamp = tuple(rules.aggregate(n=Count("id"), last=Max("updated_at")).values())
+    cached = _CACHE.get(user.pk)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    matcher = RuleMatcher(list(rules))
+    _CACHE[user.pk] = (stamp, matcher)
+    return matcher
+
+
+def suggest_category(user, description, amount=None, account_id=None):
+    """category_id sugerido para uma nova transação, ou None."""
+    matcher = matcher_for(user)
+    if not matcher:
+        return None
+    if amount is not None and not isinstance(amount, Decimal):
+        amount = Decimal(str(amount))
+    return matcher.match(description, amount, account_id)
@@ -0,0 +1,98 @@
+"""
+Vencimentos: transações PENDENTES por data.
+
+Todas as consultas filtram status = 'PEN' + faixa de datas e são atendidas
+pelo índice parcial `core_tx_pending_idx` (account, date) WHERE status = 'PEN':
+o custo depende só das linhas pendentes, não do histórico pago.
+"""
+import calendar
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+
+from .models import Transaction, TransactionStatus
+
+UPCOMING_DAYS = 7
+PANEL_LIMIT = 10
+
+_FIELDS = (
+    "id", "date", "description", "amount", "version", "account__name",
+    "category__name", "category__kind", "installment_no", "installment_count",
+)
+
+
+def pending(user):
+    return Transaction.objects.filter(account__owner=user, status=TransactionStatus.PENDING)
+
+
+def _summary(qs):
+    agg = qs.order_by().aggregate(n=Count("id"), total=Sum("amount"))
+    return agg["n"], agg["total"] or Decimal("0")
+
+
+def overdue(user, today, limit=PANEL_LIMIT):
+    """(itens mais antigos primeiro, quantidade, total) pendentes antes de hoje."""
+    qs = pending(user).filter(date__lt=today)
+    n, total = _summary(qs)
+    return list(qs.order_by("date", "id").values(*_FIELDS)[:limit]), n, total
+
+
+def upcoming(user, today, days=UPCOMING_DAYS, limit=PANEL_LIMIT):
+    """(itens, quantidade, total) pendentes de hoje até hoje + days - 1."""
+    qs = pending(user).filter(date__gte=today, date__lt=today + timedelta(days=days))
+    n, total = _summary(qs)
+    return list(qs.order_by("date", "id").values(*_FIELDS)[:limit]), n, total
+
+
+def month_calendar(user, year, month):
+    """
+    Semanas do mês (seg..dom) para a grade: lista de semanas, cada uma com
+    7 dicts {date, in_month, items, total}.
+    """
+    weeks = calendar.Calendar(firstweekday=0).monthdatescalendar(year, month)
+    start, end = weeks[0][0], weeks[-1][-1]
+    by_day = defaultdict(list)
+    rows = (
+        pending(user).filter(date__gte=start, date__lte=end)
+        .order_by("date", "id").values(*_FIELDS)
+    )
+    for r in rows:
+        by_day[r["date"]].append(r)
+    return [
+        [
+            {
+                "date": d,
+                "in_month": d.month == month,
+                "items": by_day.get(d, []),
+                "total": sum((r["amount"] for r in by_day.get(d, [])), Decimal("0")),
+            }
+            for d in week
+        ]
+        for week in weeks
+    ]
+
+
+def iter_due_by_owner(today, days=UPCOMING_DAYS):
+    """
+    Uma passada em todos os pendentes até o horizonte, agrupada por dono:
+    gera (owner_id, vencidos, próximos). Usado pelo generate_due_reminders.
+    """
+    horizon = today + timedelta(days=days)
+    rows = (
+        Transaction.objects
+        .filter(status=TransactionStatus.PENDING, date__lt=horizon)
+        .order_by("account__owner_id", "date", "id")
+        .values_list("account__owner_id", "id", "date", "description", "amount")
+    )
+    current, late, soon = None, [], []
+    for owner_id, pk, d, description, amount in rows.iterator(chunk_size=5000):
+        if owner_id != current:
+            if current is not None:
+                yield current, late, soon
+            current, late, soon = owner_id, [], []
+        item = {"id": pk, "date": d, "description": description, "amount": amount}
+        (late if d < today else soon).append(item)
+    if current is not None:
+        yield current, late, soon
@@ -0,0 +1,90 @@
+"""
+Chaves de idempotência para formulários de criação.
+
+O formulário leva uma chave única (`new_key`) num campo oculto. A view chama
+`claim` DENTRO da mesma transação das escritas: o INSERT da chave (único por
+dono + escopo + chave) é o que serializa envios duplicados — o segundo espera o
+primeiro terminar e então recebe DuplicateRequest com a resposta gravada, sem
+repetir nada. Se a escrita falhar, a chave volta junto no rollback e o
+reenvio pode ser processado; quando a falha não desfaz a transação (ex.: job
+inline que terminou FAILED), a view chama `release`. Chaves valem por IDEMPOTENCY_TTL_HOURS; as
+vencidas são reaproveitadas e removidas por `purge_expired`.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.timezone import now
+
+from .models import IdempotencyKey
+
+MAX_KEY_LENGTH = 64
+
+
+class DuplicateRequest(Exception):
+    """Reenvio de uma chave já processada; `response` é a URL da resposta original."""
+
+    def __init__(self, record):
+        super().__init__(record.key)
+        self.record = record
+        self.response = record.response
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def ttl():
+    return timedelta(hours=getattr(settings, "IDEMPOTENCY_TTL_HOURS", 24))
+
+
+def claim(user, scope, key):
+    """
+    Registra a chave para esta escrita. Sem chave devolve None (clientes antigos);
+    chave já usada e dentro do TTL -> DuplicateRequest.
+    """
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError("Chave de idempotência inválida.")
+    current = now()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                owner=user, scope=scope, key=key, expires_at=current + ttl()
+            )
+    except IntegrityError:
+        pass
+
+    record = IdempotencyKey.objects.get(owner=user, scope=scope, key=key)
+    if record.expires_at <= current:
+        # vencida: reaproveita com UPDATE condicional (só um reenvio vence)
+        renewed = IdempotencyKey.objects.filter(pk=record.pk, expires_at=record.expires_at).update(
+            expires_at=current + ttl(), response="", created_at=current
+        )
+        if renewed:
+            record.refresh_from_db()
+            return record
+        record.refresh_from_db()
+    raise DuplicateRequest(record)
+
+
+def complete(record, response):
+    """Grava a resposta (URL de redirecionamento) para os reenvios."""
+    if record is None:
+        return
+    record.response = response or ""
+    IdempotencyKey.objects.filter(pk=record.pk).update(response=record.response)
+
+
+def release(record):
+    """Desfaz o `claim` de uma escrita que não aconteceu: o reenvio será processado."""
+    if record is None:
+        return
+    IdempotencyKey.objects.filter(pk=record.pk).delete()
+
+
+def purge_expired():
+    n, _ = IdempotencyKey.objects.filter(expires_at__lte=now()).delete()
+    return n
@@ -0,0 +1,373 @@
+"""
+Insights de gastos sobre todo o histórico do usuário.
+
+O histórico (transações vivas + anos arquivados, ver core/archive.py) é
+carregado UMA vez em colunas numpy compactas — datas como ordinais int32,
+valores em centavos int64, ids de categoria/conta, flags e um código por
+descrição normalizada — direto do cursor do banco e dos membros do usuário
+nos arquivos, sem instanciar modelos. As análises são passadas
+vetorizadas sobre essas colunas (bincount / unique / cumsum):
+
+  - gasto mensal por categoria, média móvel e variação mês a mês;
+  - transações fora da curva (z-score dentro da categoria);
+  - cobranças recorrentes que não estão marcadas como `is_fixed`.
+
+O resultado fica em cache por usuário até a próxima escrita: o carimbo é a
+posição do journal do usuário em ordem de commit (journal.owner_position) +
+o último arquivo gerado, então qualquer insert/update/delete invalida.
+Benchmark: `manage.py bench_insights`.
+"""
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+from operator import itemgetter
+
+import numpy as np
+from django.db import connections
+from django.db.models import BigIntegerField, BooleanField, ExpressionWrapper, F, Func, IntegerField, Max, Q
+from django.db.models.functions import Cast, Round
+from django.utils.timezone import localdate
+
+from . import archive, journal
+from .models import ArchiveFile, Category, Transaction
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+ROLLING_MONTHS = 3        # média móvel (meses completos anteriores)
+SERIES_MONTHS = 12        # meses devolvidos na série por categoria
+OUTLIER_Z = 3.0
+OUTLIER_MIN_COUNT = 8     # categorias com poucas transações não têm "curva"
+OUTLIER_RECENT_MONTHS = 3
+RECURRING_WINDOW = 6      # meses olhados para achar recorrências
+RECURRING_MIN_MONTHS = 3
+RECURRING_MAX_CV = 0.2    # variação máxima do valor (desvio / média)
+TOP = 10
+
+_DIGITS_RE = re.compile(r"\d+")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_description(text):
+    """Chave de agrupamento: minúsculas, números viram '#', espaços colapsados."""
+    return _SPACES_RE.sub(" ", _DIGITS_RE.sub("#", text.lower())).strip()
+
+
+@dataclass
+class Columns:
+    id: np.ndarray            # int64
+    date: np.ndarray          # int32, date.toordinal()
+    cents: np.ndarray         # int64 (+ receita, - despesa)
+    category: np.ndarray      # int64
+    account: np.ndarray       # int64
+    fixed: np.ndarray         # bool
+    installment: np.ndarray   # bool (faz parte de um parcelamento)
+    desc: np.ndarray          # int32, índice em `descriptions`
+    descriptions: list = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.id)
+
+
+def _ints(arr):
+    """array.array do arquivo (já na ordem nativa) -> ndarray sem cópia."""
+    return np.frombuffer(arr, dtype=arr.typecode)
+
+
+def _code_descriptions(raw):
+    """
+    Descrições -> (códigos int32, chaves normalizadas). A normalização (regex)
+    roda uma vez por descrição distinta, não por linha.
+    """
+    distinct = dict.fromkeys(raw)
+    codes = {}
+    for text in distinct:
+        distinct[text] = codes.setdefault(normalize_description(text), len(codes))
+    return np.fromiter(map(distinct.__getitem__, raw), dtype=np.int32, count=len(raw)), list(codes)
+
+
+class EpochDays(Func):
+    """Dias desde 1970-01-01, calculados no banco: a coluna chega como int, sem objetos date."""
+    template = "(%(expressions)s - DATE '1970-01-01')"    # PostgreSQL: date - date = int
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra):
+        return self.as_sql(
+            compiler, connection, template="CAST(julianday(%(expressions)s) - 2440587.5 AS INTEGER)", **extra
+        )
+
+
+LIVE_CHUNK = 50_000
+_NUMERIC = (("id", np.int64), ("date", np.int32), ("cents", np.int64), ("category", np.int64),
+            ("account", np.int64), ("fixed", bool), ("installment", bool))
+
+
+def _live_columns(user, descriptions):
+    """
+    Transações vivas do usuário direto do cursor do banco, sem conversores do
+    ORM por linha: datas/valores/flags já saem numéricos do SELECT e cada lote
+    vira arrays com np.fromiter.
+    """
+    qs = (
+        Transaction.objects.filter(account__owner=user)
+        .order_by()
+        .annotate(
+            days=EpochDays("date"),
+            cents=Cast(Round(F("amount") * 100), BigIntegerField()),
+            installment=ExpressionWrapper(Q(installment_no__isnull=False), output_field=BooleanField()),
+        )
+        .values_list("id", "days", "cents", "category_id", "account_id", "is_fixed", "installment", "description")
+    )
+    sql, params = qs.query.sql_with_params()   # SELECT na ordem do values_list
+    parts = []
+    with connections[qs.db].cursor() as cur:
+        cur.execute(sql, params)
+        while rows := cur.fetchmany(LIVE_CHUNK):
+            part = {
+                name: np.fromiter(map(itemgetter(i), rows), dtype=dtype, count=len(rows))
+                for i, (name, dtype) in enumerate(_NUMERIC)
+            }
+            part["date"] += EPOCH_ORDINAL
+            parts.append(part)
+            descriptions.extend(map(itemgetter(len(_NUMERIC)), rows))
+    return parts
+
+
+def _archived_columns(user, descriptions):
+    """Linhas arquivadas do usuário: só os membros dele em cada arquivo."""
+    parts = []
+    wanted = ["id", "account_id", "category_id", "date", "amount_cents",
+              "is_fixed", "installment_no", "description"]
+    for path in archive.archive_paths():
+        c = archive.read_columns(path, wanted, owner_id=user.pk)
+        if not c["id"]:
+            continue
+        parts.append({
+            "id": _ints(c["id"]),
+            "date": _ints(c["date"]),
+            "cents": _ints(c["amount_cents"]),
+            "category": _ints(c["category_id"]),
+            "account": _ints(c["account_id"]),
+            "fixed": _ints(c["is_fixed"]) != 0,
+            "installment": _ints(c["installment_no"]) >= 0,
+        })
+        descriptions.extend(c["description"])
+    return parts
+
+
+def load_columns(user):
+    """Histórico completo do usuário (vivo + arquivado) em colunas."""
+    raw = []
+    parts = _live_columns(user, raw) + _archived_columns(user, raw)
+    arrays = {
+        name: np.concatenate([np.empty(0, dtype=dtype)] + [p[name].astype(dtype, copy=False) for p in parts])
+        for name, dtype in _NUMERIC
+    }
+    codes, descriptions = _code_descriptions(raw)
+    return Columns(desc=codes, descriptions=descriptions, **arrays)
+
+
+# --------------------------------------------
+# Análise (só numpy, sem banco)
+# --------------------------------------------
+
+def month_index(ordinals):
+    """Ordinais -> meses desde 1970-01 (int64)."""
+    days = (np.asarray(ordinals, dtype=np.int64) - EPOCH_ORDINAL).astype("datetime64[D]")
+    return days.astype("datetime64[M]").astype(np.int64)
+
+
+def _month_of(index):
+    return int(index // 12 + 1970), int(index % 12 + 1)
+
+
+def analyze(cols, today=None):
+    """
+    Insights relativos ao mês de `today` (mês corrente, parcial).
+    Devolve dicts só com ids/valores (nomes são resolvidos fora do cache).
+    """
+    today = today or localdate()
+    cur = int(month_index([today.toordinal()])[0])
+    months = month_index(cols.date)
+    result = {"month": _month_of(cur), "rows": len(cols), "categories": [], "outliers": [], "recurring": []}
+
+    # despesas até o mês corrente
+    exp = (cols.cents < 0) & (months <= cur)
+    if not exp.any():
+        return result
+    spend = -cols.cents[exp]
+    e_months = months[exp]
+    e_dates = cols.date[exp]
+    e_ids = cols.id[exp]
+    cats, cat_code = np.unique(cols.category[exp], return_inverse=True)
+    m0 = int(e_months.min())
+    n_m = cur - m0 + 1
+    n_c = len(cats)
+
+    # ---- gasto por (categoria, mês): uma matriz n_c x n_m
+    matrix = np.bincount(
+        cat_code * n_m + (e_months - m0), weights=spend, minlength=n_c * n_m
+    ).reshape(n_c, n_m)
+    padded = np.concatenate([np.zeros((n_c, ROLLING_MONTHS + 1)), matrix], axis=1)
+    csum = np.cumsum(padded, axis=1)
+    # média dos ROLLING_MONTHS meses anteriores a cada mês (coluna i = mês i)
+    rolling = (csum[:, ROLLING_MONTHS:-1] - csum[:, :-ROLLING_MONTHS - 1]) / ROLLING_MONTHS
+    current = matrix[:, -1]
+    previous = matrix[:, -2] if n_m > 1 else np.zeros(n_c)
+    avg = rolling[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mom_pct = np.where(previous > 0, (current - previous) * 100 / previous, np.nan)
+        avg_pct = np.where(avg > 0, (current - avg) * 100 / avg, np.nan)
+    series_from = max(0, n_m - SERIES_MONTHS)
+    active = np.flatnonzero((current > 0) | (previous > 0) | (avg > 0))
+    order = active[np.argsort(-np.abs(current - previous)[active], kind="stable")]
+    result["series_months"] = [_month_of(m0 + i) for i in range(series_from, n_m)]
+    result["categories"] = [
+        {
+            "category_id": int(cats[i]),
+            "current": _cents(current[i]),
+            "previous": _cents(previous[i]),
+            "delta": _cents(current[i] - previous[i]),
+            "delta_pct": _pct(mom_pct[i]),
+            "rolling_avg": _cents(avg[i]),
+            "vs_avg_pct": _pct(avg_pct[i]),
+            "series": [_cents(v) for v in matrix[i, series_from:]],
+            "rolling_series": [_cents(v) for v in rolling[i, series_from:]],
+        }
+        for i in order
+    ]
+
+    # ---- fora da curva: z-score do valor dentro da categoria (histórico todo)
+    count = np.bincount(cat_code, minlength=n_c)
+    total = np.bincount(cat_code, weights=spend, minlength=n_c)
+    sq = np.bincount(cat_code, weights=spend.astype(np.float64) ** 2, minlength=n_c)
+    mean = total / np.maximum(count, 1)
+    std = np.sqrt(np.maximum(sq / np.maximum(count, 1) - mean ** 2, 0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (spend - mean[cat_code]) / std[cat_code]
+    flagged = np.flatnonzero(
+        (count[cat_code] >= OUTLIER_MIN_COUNT)
+        & (std[cat_code] > 0)
+        & (z >= OUTLIER_Z)
+        & (e_months > cur - OUTLIER_RECENT_MONTHS)
+    )
+    if len(flagged):
+        top = flagged[np.argsort(-z[flagged], kind="stable")[:TOP]]
+        result["outliers"] = [
+            {
+                "id": int(e_ids[i]),
+                "date": date.fromordinal(int(e_dates[i])),
+                "amount": _cents(spend[i]),
+                "category_id": int(cats[cat_code[i]]),
+                "category_mean": _cents(mean[cat_code[i]]),
+                "z": round(float(z[i]), 1),
+            }
+            for i in top
+        ]
+
+    # ---- recorrentes sem flag is_fixed: mesma descrição, ~1x por mês, valor estável
+    n_d = len(cols.descriptions)
+    fixed_desc = np.zeros(n_d, dtype=bool)
+    fixed_desc[cols.desc[cols.fixed]] = True
+    cand = (
+        exp & ~cols.fixed & ~cols.installment
+        & (months > cur - RECURRING_WINDOW)
+    )
+    cand &= ~fixed_desc[cols.desc]
+    if cand.any():
+        d_code = cols.desc[cand].astype(np.int64)
+        c_months = months[cand]
+        c_spend = -cols.cents[cand].astype(np.float64)
+        pairs = np.unique(d_code * (RECURRING_WINDOW + 1) + (c_months - (cur - RECURRING_WINDOW)))
+        distinct = np.bincount(pairs // (RECURRING_WINDOW + 1), minlength=n_d)
+        n = np.bincount(d_code, minlength=n_d)
+        s = np.bincount(d_code, weights=c_spend, minlength=n_d)
+        s2 = np.bincount(d_code, weights=c_spend ** 2, minlength=n_d)
+        recent = np.zeros(n_d, dtype=bool)
+        recent[d_code[c_months >= cur - 1]] = True
+        last = np.zeros(n_d, dtype=np.int64)
+        np.maximum.at(last, d_code, cols.date[cand].astype(np.int64))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            m = s / n
+            cv = np.sqrt(np.maximum(s2 / n - m ** 2, 0)) / m
+        hits = np.flatnonzero(
+            (distinct >= RECURRING_MIN_MONTHS)
+            & (n <= distinct * 1.5)          # ~uma cobrança por mês, não compras avulsas
+            & recent
+            & (cv <= RECURRING_MAX_CV)
+        )
+        hits = hits[np.argsort(-m[hits], kind="stable")[:TOP]]
+        result["recurring"] = [
+            {
+                "description": cols.descriptions[i],
+                "months": int(distinct[i]),
+                "avg_amount": _cents(m[i]),
+                "last_date": date.fromordinal(int(last[i])),
+            }
+            for i in hits
+        ]
+    return result
+
+
+def _cents(value):
+    return round(float(value) / 100, 2)
+
+
+def _pct(value):
+    return None if np.isnan(value) else round(float(value), 1)
+
+
+# --------------------------------------------
+# Cache por usuário (até a próxima escrita)
+# --------------------------------------------
+
+_CACHE = OrderedDict()    # user_id -> (carimbo, resultado)
+_CACHE_SIZE = 256
+_CACHE_LOCK = threading.Lock()   # workers com threads compartilham o módulo
+
+
+def _stamp(user, today):
+    """Carimbo do cache, ou None se ainda não dá para cachear (journal.owner_position)."""
+    position = journal.owner_position(user)
+    if position is None:
+        return None
+    return (
+        position,
+        ArchiveFile.objects.aggregate(s=Max("id"))["s"],
+        today.year, today.month,
+    )
+
+
+def insights_for(user, today=None):
+    """Insights do usuário, recalculados só se houve escrita desde o último cálculo."""
+    today = today or localdate()
+    stamp = _stamp(user, today)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(user.pk)
+        if cached and stamp is not None and cached[0] == stamp:
+            _CACHE.move_to_end(user.pk)
+            data = cached[1]
+        else:
+            data = None
+    if data is None:
+        data = analyze(load_columns(user), today)
+        if stamp is not None:
+            with _CACHE_LOCK:
+                _CACHE[user.pk] = (stamp, data)
+                _CACHE.move_to_end(user.pk)
+                while len(_CACHE) > _CACHE_SIZE:
+                    _CACHE.popitem(last=False)
+
+    # cópias: o resultado em cache não é alterado por quem o lê
+    data = {
+        **data,
+        "categories": [dict(row) for row in data["categories"]],
+        "outliers": [dict(row) for row in data["outliers"]],
+    }
+    names = dict(Category.objects.filter(
+        id__in={c["category_id"] for c in data["categories"]} | {o["category_id"] for o in data["outliers"]}
+    ).values_list("id", "name"))
+    for row in data["categories"] + data["outliers"]:
+        row["category"] = names.get(row["category_id"], "?")
+    return data
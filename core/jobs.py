@@ -0,0 +1,158 @@
+"""
+Fila de jobs em banco (sem broker externo).
+
+Handlers são registrados por nome com @register("nome") e recebem
+(job, **params). `enqueue` grava o Job; com JOBS_ASYNC=False (padrão de
+desenvolvimento) ele roda na hora, no próprio request. Em produção o comando
+`run_worker` consome a fila com SELECT ... FOR UPDATE SKIP LOCKED
+(PostgreSQL) ou com UPDATE condicional (SQLite). Jobs RUNNING de um worker
+que morreu voltam para a fila: na partida do worker (processos mortos do
+mesmo host) e periodicamente, pelos sem heartbeat há mais de --stale-after
+(o worker renova `heartbeat_at` dos seus jobs a cada HEARTBEAT_INTERVAL;
+`Job.set_progress` também conta). Um job só é concluído pelo worker que
+ainda o detém — se ele foi devolvido à fila no meio, o resultado é descartado.
+"""
+import os
+import traceback
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from .models import Job, JobStatus
+
+_HANDLERS = {}
+
+HEARTBEAT_INTERVAL = 30   # s; --stale-after precisa ser bem maior
+
+
+def register(name):
+    def deco(fn):
+        _HANDLERS[name] = fn
+        return fn
+    return deco
+
+
+def handler_names():
+    return sorted(_HANDLERS)
+
+
+def enqueue(name, owner=None, **params):
+    if name not in _HANDLERS:
+        raise KeyError(f"Job desconhecido: {name}")
+    job = Job.objects.create(name=name, owner=owner, params=params)
+    if not getattr(settings, "JOBS_ASYNC", False):
+        if claim_job(job.pk, "inline"):
+            run_job(job.pk)
+        job.refresh_from_db()
+    return job
+
+
+def claim_job(job_id, worker):
+    """Marca o job como RUNNING se ainda estiver na fila (UPDATE condicional)."""
+    t = now()
+    return Job.objects.filter(pk=job_id, status=JobStatus.QUEUED).update(
+        status=JobStatus.RUNNING, worker=worker, started_at=t, heartbeat_at=t
+    ) == 1
+
+
+def claim(worker, limit=1):
+    """Reserva até `limit` jobs da fila para este worker; devolve os ids."""
+    queued = Job.objects.filter(status=JobStatus.QUEUED).order_by("id")
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(
+                queued.select_for_update(skip_locked=True).values_list("id", flat=True)[:limit]
+            )
+            t = now()
+            Job.objects.filter(pk__in=ids).update(
+                status=JobStatus.RUNNING, worker=worker, started_at=t, heartbeat_at=t
+            )
+        return ids
+
+    # SQLite: sem row locks; o UPDATE condicional garante que só um worker vence
+    ids = []
+    for job_id in queued.values_list("id", flat=True)[:limit * 2]:
+        if claim_job(job_id, worker):
+            ids.append(job_id)
+            if len(ids) == limit:
+                break
+    return ids
+
+
+def _owned(job_id, worker):
+    """O job, enquanto ainda RUNNING com este worker (não foi devolvido à fila)."""
+    return Job.objects.filter(pk=job_id, status=JobStatus.RUNNING, worker=worker)
+
+
+def run_job(job_id):
+    """Executa um job já reservado e grava resultado/erro (só se ainda for dono dele)."""
+    job = Job.objects.select_related("owner").get(pk=job_id)
+    if job.status != JobStatus.RUNNING:
+        return False
+    handler = _HANDLERS.get(job.name)
+    try:
+        if handler is None:
+            raise KeyError(f"Job desconhecido: {job.name}")
+        result = handler(job, **job.params)
+    except Exception:
+        fail(job.pk, job.worker, traceback.format_exc(limit=5))
+        return False
+    return _owned(job.pk, job.worker).update(
+        status=JobStatus.DONE, result=result, finished_at=now()
+    ) == 1
+
+
+def fail(job_id, worker, error):
+    """Marca como FAILED um job ainda deste worker (ex.: o processo do pool morreu)."""
+    return _owned(job_id, worker).update(
+        status=JobStatus.FAILED, error=error, finished_at=now()
+    ) == 1
+
+
+def heartbeat(worker):
+    """Renova o heartbeat dos jobs RUNNING deste worker."""
+    return Job.objects.filter(status=JobStatus.RUNNING, worker=worker).update(heartbeat_at=now())
+
+
+def requeue_stale(worker_prefix=None, older_than=None, worker=None):
+    """
+    Devolve à fila jobs RUNNING abandonados (worker morto). `older_than`: último
+    heartbeat antes deste instante (sem heartbeat: vale o started_at).
+    """
+    qs = Job.objects.filter(status=JobStatus.RUNNING)
+    if worker:
+        qs = qs.filter(worker=worker)
+    if worker_prefix:
+        qs = qs.filter(worker__startswith=worker_prefix)
+    if older_than is not None:
+        qs = qs.filter(
+            Q(heartbeat_at__lt=older_than) | Q(heartbeat_at__isnull=True, started_at__lt=older_than)
+        )
+    return qs.update(status=JobStatus.QUEUED, worker="", started_at=None, heartbeat_at=None)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def requeue_dead(host):
+    """Devolve à fila os jobs RUNNING de workers "host:pid" cujo processo não existe mais."""
+    workers = (
+        Job.objects.filter(status=JobStatus.RUNNING, worker__startswith=f"{host}:")
+        .order_by().values_list("worker", flat=True).distinct()
+    )
+    n = 0
+    for worker in workers:
+        pid = worker.rpartition(":")[2]
+        if pid.isdigit() and not _pid_alive(int(pid)):
+            n += requeue_stale(worker=worker)
+    return n
@@ -0,0 +1,346 @@
+"""
+Journal de alterações (append-only).
+
+Cada insert/update/delete de Account, Category e Transaction grava uma linha
+em `Change`, na MESMA transação de banco da escrita. O `seq` (auto incremento)
+funciona como cursor para sincronização incremental (`/api/changes/?since=`).
+
+O seq é distribuído no INSERT, mas a linha só aparece no COMMIT: no
+PostgreSQL uma transação com seq menor pode commitar depois que o cliente já
+passou dele. Por isso lá cada linha guarda o xid da transação (`txid`) e a
+leitura só entrega linhas de transações abaixo do xmin do snapshot (todas já
+terminadas), em ordem (txid, seq); o cursor vira "txid.seq". No SQLite há um
+escritor por vez, então a ordem do seq já é a ordem de commit.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connection, models, transaction
+from django.db.models import BigIntegerField, Func, Q
+
+
+def entity_name(model) -> str:
+    """Nome curto da entidade no journal ('transaction', 'account', ...)."""
+    return model._meta.model_name
+
+
+def row_payload(obj) -> dict:
+    """Snapshot compacto (attname -> valor) de todos os campos concretos."""
+    return {
+        f.attname: getattr(obj, f.attname)
+        for f in obj._meta.concrete_fields
+        if not f.primary_key
+    }
+
+
+class CurrentTxid(Func):
+    """xid (64 bits) da transação corrente — PostgreSQL 13+."""
+    template = "pg_current_xact_id()::text::bigint"
+    output_field = BigIntegerField()
+
+
+def _commit_ordered():
+    return connection.vendor == "postgresql"
+
+
+def record(model, op, rows):
+    """
+    Grava as alterações no journal.
+    rows: iterável de (object_id, owner_id, data).
+    """
+    from .models import Change
+
+    entity = entity_name(model)
+    txid = CurrentTxid() if _commit_ordered() else None
+    Change.objects.bulk_create([
+        Change(entity=entity, object_id=pk, owner_id=owner_id, op=op, data=data, txid=txid)
+        for pk, owner_id, data in rows
+    ])
+
+
+def parse_cursor(value):
+    """'seq' ou 'txid.seq' -> (txid|None, seq). ValueError se inválido."""
+    txid, _, seq = str(value or "0").rpartition(".")
+    return (int(txid) if txid else None), int(seq)
+
+
+def changes_page(owner, since, limit):
+    """
+    Alterações do usuário (+ globais) depois do cursor `since`, até `limit`.
+    Devolve (linhas (seq, entity, op, object_id, data), próximo cursor, has_more).
+    Um cursor só-seq (antigo) no PostgreSQL pode reentregar alterações já
+    vistas — a aplicação no cliente é idempotente.
+    """
+    from .models import Change
+
+    txid, seq = parse_cursor(since)
+    qs = Change.objects.filter(Q(owner=owner) | Q(owner__isnull=True))
+    if _commit_ordered():
+        qs = qs.filter(txid__lt=_snapshot_xmin())
+        if txid is None:
+            qs = qs.filter(seq__gt=seq)
+        else:
+            qs = qs.filter(Q(txid__gt=txid) | Q(txid=txid, seq__gt=seq))
+        qs = qs.order_by("txid", "seq")
+    else:
+        qs = qs.filter(seq__gt=seq).order_by("seq")
+
+    rows = list(qs.values_list("seq", "entity", "op", "object_id", "data", "txid")[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        next_cursor = since or 0
+    elif _commit_ordered():
+        next_cursor = f"{rows[-1][5]}.{rows[-1][0]}"
+    else:
+        next_cursor = rows[-1][0]
+    return [r[:5] for r in rows], next_cursor, has_more
+
+
+def _snapshot_xmin():
+    """PostgreSQL: menor xid ainda em andamento; abaixo dele todas as transações terminaram."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        return cursor.fetchone()[0]
+
+
+def mark():
+    """
+    Marca do journal "agora", para `changed_since`. PostgreSQL: xmin do
+    snapshot (transações ainda abertas ficam acima dela); SQLite: último seq.
+    """
+    from .models import Change
+
+    if _commit_ordered():
+        return _snapshot_xmin()
+    return Change.objects.order_by("-seq").values_list("seq", flat=True).first() or 0
+
+
+def owner_position(owner):
+    """
+    Posição do journal do usuário para invalidar caches: muda a cada alteração
+    commitada dele. PostgreSQL: (txid, seq) da última linha já em ordem de
+    commit (txid < xmin), ou None enquanto ele tiver linhas visíveis acima do
+    xmin — uma transação mais antiga ainda pode commitar antes delas.
+    SQLite: (None, último seq).
+    """
+    from .models import Change
+
+    qs = Change.objects.filter(owner=owner)
+    if not _commit_ordered():
+        return None, qs.order_by("-seq").values_list("seq", flat=True).first() or 0
+    xmin = _snapshot_xmin()
+    if qs.filter(txid__gte=xmin).exists():
+        return None
+    return qs.filter(txid__lt=xmin).order_by("-txid", "-seq").values_list("txid", "seq").first() or (0, 0)
+
+
+def changed_since(owner, value):
+    """True se o usuário tem alterações no journal depois de `mark()` (conservador no PostgreSQL)."""
+    from .models import Change
+
+    qs = Change.objects.filter(owner=owner)
+    if _commit_ordered():
+        return qs.filter(txid__gte=value).exists()
+    return qs.filter(seq__gt=value).exists()
+
+
+def record_instances(objs, op, *, full=True, fields=None):
+    """Registra instâncias (save / bulk_create). `full=False` grava só o diff."""
+    rows = []
+    for obj in objs:
+        if obj.pk is None:  # ex.: bulk_create com ignore_conflicts
+            continue
+        data = row_payload(obj) if full else obj.journal_diff(fields)
+        rows.append((obj.pk, obj.journal_owner_id(), data))
+    if rows:
+        record(type(objs[0]), op, rows)
+
+
+def record_pks(model, op, pks, fields=None):
+    """
+    Registra alterações feitas por SQL em lote (update/bulk_update): relê as
+    linhas afetadas e grava apenas os campos alterados (ou todos, se None).
+    """
+    if not pks:
+        return
+    attnames = [
+        f.attname for f in model._meta.concrete_fields
+        if not f.primary_key and (fields is None or f.name in fields or f.attname in fields)
+    ]
+    qs = model._base_manager.filter(pk__in=pks)
+    owner_path = model.journal_owner_path
+    if owner_path:
+        qs = qs.annotate(_journal_owner=models.F(owner_path))
+        values = qs.values("pk", "_journal_owner", *attnames)
+    else:
+        values = qs.values("pk", *attnames)
+
+    record(model, op, [
+        (r["pk"], r.get("_journal_owner"), {a: r[a] for a in attnames})
+        for r in values.iterator()
+    ])
+
+
+class JournaledQuerySet(models.QuerySet):
+    """QuerySet que registra no journal também as escritas em lote."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .models import ChangeOp
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            if objs:
+                record_instances(objs, ChangeOp.INSERT)
+        return objs
+
+    def update(self, **kwargs):
+        from .models import ChangeOp
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            pks = list(self.values_list("pk", flat=True))
+            rows = super().update(**kwargs)
+            # auto_now (updated_at) não entra no UPDATE em lote; só os kwargs
+            record_pks(self.model, ChangeOp.UPDATE, pks, kwargs.keys())
+        return rows
+
+    def delete(self):
+        with batched_deletes(self.db):
+            return super().delete()
+
+    # bulk_update() roda um update() por lote (QuerySet.bulk_update), já coberto acima.
+    # delete() (inclusive cascata) é coberto pelo sinal post_delete em models.py,
+    # que roda dentro da transação atômica do Collector e acumula no DeleteBatch.
+
+
+class DeleteBatch:
+    """
+    Exclusões de um delete (em lote ou em cascata) acumuladas pelo post_delete
+    e gravadas no fim, na mesma transação: um bulk_create no journal por
+    modelo, em vez de um INSERT por linha.
+    """
+
+    def __init__(self):
+        self.rows = defaultdict(list)   # modelo -> [(pk, owner_id, None)]
+        self._owners = {}
+        self._state = {}
+        self._flush = []
+
+    def owner_of(self, obj):
+        """journal_owner_id() com cache pelo 1º FK do caminho (uma query por conta, não por linha)."""
+        path = obj.journal_owner_path
+        if not path or "__" not in path:
+            return obj.journal_owner_id()
+        key = (type(obj), getattr(obj, f"{path.split('__', 1)[0]}_id"))
+        if key not in self._owners:
+            self._owners[key] = obj.journal_owner_id()
+        return self._owners[key]
+
+    def state(self, key, factory, flush):
+        """Estado auxiliar do lote (ex.: deltas de orçamento); `flush(estado)` roda no fim."""
+        if key not in self._state:
+            self._state[key] = factory()
+            self._flush.append((flush, key))
+        return self._state[key]
+
+    def write(self):
+        from .models import ChangeOp
+
+        for model, rows in self.rows.items():
+            record(model, ChangeOp.DELETE, rows)
+        for flush, key in self._flush:
+            flush(self._state[key])
+
+
+_DELETE_BATCH = ContextVar("journal_delete_batch", default=None)
+
+
+def delete_batch():
+    """DeleteBatch aberto (batched_deletes) ou None."""
+    return _DELETE_BATCH.get()
+
+
+@contextmanager
+def batched_deletes(using=None):
+    """Abre um DeleteBatch (o de fora vale, se aninhado) e grava tudo no fim do delete."""
+    if _DELETE_BATCH.get() is not None:
+        yield _DELETE_BATCH.get()
+        return
+    batch = DeleteBatch()
+    token = _DELETE_BATCH.set(batch)
+    try:
+        # atomic de fora: o Collector comitaria sozinho antes do write()
+        with transaction.atomic(using=using, savepoint=False):
+            yield batch
+            batch.write()
+    finally:
+        _DELETE_BATCH.reset(token)
+
+
+class JournaledModel(models.Model):
+    """
+    Base para modelos com journal.
+    `journal_owner_path`: caminho até o User dono (None = global, ex.: Category).
+    """
+    journal_owner_path = None
+
+    objects = JournaledQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        obj = super().from_db(db, field_names, values)
+        obj._journal_loaded = {name: obj.__dict__[name] for name in field_names}
+        return obj
+
+    def delete(self, *args, **kwargs):
+        with batched_deletes(kwargs.get("using")):
+            return super().delete(*args, **kwargs)
+
+    def journal_owner_id(self):
+        if not self.journal_owner_path:
+            return None
+        obj = self
+        *path, last = self.journal_owner_path.split("__")
+        for part in path:
+            obj = getattr(obj, part)
+        return getattr(obj, f"{last}_id")
+
+    def loaded_state(self):
+        """Valores (attname -> valor) como estavam no banco, ou None se desconhecido."""
+        return getattr(self, "_journal_loaded", None)
+
+    def journal_diff(self, fields=None) -> dict:
+        """Campos alterados desde o carregamento (ou todos, se desconhecido)."""
+        loaded = self.loaded_state()
+        if loaded is None and fields is None:
+            return row_payload(self)
+        loaded = loaded or {}
+        deferred = self.get_deferred_fields()
+        return {
+            f.attname: getattr(self, f.attname)
+            for f in self._meta.concrete_fields
+            if not f.primary_key
+            and f.attname not in deferred
+            and (fields is None or f.name in fields or f.attname in fields)
+            and (f.attname not in loaded or loaded[f.attname] != getattr(self, f.attname))
+        }
+
+    def save(self, *args, **kwargs):
+        from .models import ChangeOp
+
+        adding = self._state.adding
+        with transaction.atomic(using=kwargs.get("using"), savepoint=False):
+            super().save(*args, **kwargs)
+            if adding:
+                record_instances([self], ChangeOp.INSERT)
+            else:
+                record_instances(
+                    [self], ChangeOp.UPDATE, full=False, fields=kwargs.get("update_fields")
+                )
+        self._journal_loaded = {
+            f.attname: getattr(self, f.attname) for f in self._meta.concrete_fields
+        }
@@ -0,0 +1,682 @@
+"""
+Gerador de carga local (WSGI / ASGI) com cenários mistos.
+
+Usuários virtuais (threads no modo WSGI/URL, corrotinas no ASGI) repetem um mix
+ponderado de ações — dashboard, filtro de transações, nova transação parcelada,
+toggle de status e importação de fixas — até o fim da duração, com tempo de
+pensar aleatório entre as requisições.
+
+Modos:
+  wsgi  sobe `controle_financeiro.wsgi` num servidor HTTP com threads (stdlib)
+        em 127.0.0.1 e dispara requisições HTTP de verdade;
+  asgi  chama `controle_financeiro.asgi` em processo (sem socket), como faria um
+        servidor ASGI — mostra o efeito das views síncronas sob ASGI;
+  url   aponta para um servidor já rodando (gunicorn/uvicorn...). As sessões
+        são criadas no banco configurado, que precisa ser o mesmo do alvo.
+
+Nos modos em processo, cada query é cronometrada por endpoint (execute
+wrapper + header X-Loadtest-Endpoint) e as esperas por lock são medidas:
+no PostgreSQL por amostragem de pg_stat_activity (wait_event_type = 'Lock'),
+no SQLite pelos erros "database is locked".
+
+Os resultados são gravados em JSON (`write_report`) e dois JSONs podem ser
+comparados (`compare`).
+"""
+import asyncio
+import contextvars
+import http.client
+import importlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.db import OperationalError, close_old_connections, connection, connections
+from django.db.backends.signals import connection_created
+from django.middleware.csrf import CSRF_ALLOWED_CHARS
+from django.utils.crypto import get_random_string
+
+from .models import Account, Category, Transaction, TransactionStatus
+
+USER_PREFIX = "loadtest_"
+ENDPOINT_HEADER = "X-Loadtest-Endpoint"
+LOCK_SAMPLE_INTERVAL = 0.02   # s, amostragem de pg_stat_activity
+
+# --------------------------------------------
+# Cenários
+# --------------------------------------------
+
+SCENARIOS = {
+    "mixed": {
+        "users": 200, "duration": 60, "ramp_up": 10, "think_time": [0.5, 2.0],
+        "mix": {"dashboard": 35, "transactions": 30, "new_installments": 10,
+                "toggle_status": 20, "import_fixed": 5},
+    },
+    "read-heavy": {
+        "users": 300, "duration": 60, "ramp_up": 10, "think_time": [0.5, 2.0],
+        "mix": {"dashboard": 50, "transactions": 45, "toggle_status": 5},
+    },
+    "write-heavy": {
+        "users": 100, "duration": 60, "ramp_up": 5, "think_time": [0.2, 1.0],
+        "mix": {"dashboard": 10, "new_installments": 40, "toggle_status": 40, "import_fixed": 10},
+    },
+}
+
+
+def load_scenario(name_or_path, **overrides):
+    """Cenário embutido ou arquivo JSON (mesmas chaves); overrides não-None prevalecem."""
+    if name_or_path in SCENARIOS:
+        scenario = dict(SCENARIOS[name_or_path], name=name_or_path)
+    else:
+        path = Path(name_or_path)
+        scenario = dict(SCENARIOS["mixed"], name=path.stem)
+        try:
+            data = json.loads(path.read_text())
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path}: JSON inválido ({e})") from None
+        if not isinstance(data, dict):
+            raise ValueError(f"{path}: o cenário deve ser um objeto JSON.")
+        scenario.update(data)
+    scenario.update({k: v for k, v in overrides.items() if v is not None})
+    unknown = set(scenario["mix"]) - set(ACTIONS)
+    if unknown:
+        raise ValueError(f"Ações desconhecidas no mix: {', '.join(sorted(unknown))}")
+    return scenario
+
+
+# --------------------------------------------
+# Massa de dados e sessões
+# --------------------------------------------
+
+@dataclass
+class VirtualUser:
+    username: str
+    cookies: str
+    csrf: str
+    year: int
+    accounts: list
+    categories: dict          # kind -> [ids]
+    tx_ids: list = field(default_factory=list)
+
+
+def seed(n_users, tx_per_user=300, year=None):
+    """Garante N usuários `loadtest_*` com contas, categorias e transações do ano."""
+    User = get_user_model()
+    year = year or date.today().year
+    ex, _ = Category.objects.get_or_create(name="Carga: Despesa", kind=Category.EXPENSE)
+    inc, _ = Category.objects.get_or_create(name="Carga: Receita", kind=Category.INCOME)
+    rng = random.Random(n_users)
+    for i in range(n_users):
+        user, created = User.objects.get_or_create(username=f"{USER_PREFIX}{i:04d}")
+        if not created and Account.objects.filter(owner=user).exists():
+            continue
+        user.set_unusable_password()
+        user.save()
+        accs = Account.objects.bulk_create([
+            Account(name="Conta corrente", owner=user, initial_balance=Decimal("1000")),
+            Account(name="Cartão", owner=user),
+        ])
+        rows = []
+        for n in range(tx_per_user):
+            is_income = n % 10 == 0
+            rows.append(Transaction(
+                date=date(year, rng.randint(1, 12), rng.randint(1, 28)),
+                description=rng.choice(["mercado", "aluguel", "uber", "farmácia", "salário", "internet"]),
+                account=rng.choice(accs),
+                category=inc if is_income else ex,
+                amount=Decimal(rng.randint(100, 50000)).scaleb(-2) * (1 if is_income else -1),
+                status=rng.choice(TransactionStatus.values),
+                is_fixed=n % 15 == 0,
+            ))
+        Transaction.objects.bulk_create(rows, batch_size=1000)
+    return year
+
+
+def cleanup():
+    """Remove os usuários `loadtest_*` (e, em cascata, contas/transações)."""
+    User = get_user_model()
+    n, _ = User.objects.filter(username__startswith=USER_PREFIX).delete()
+    return n
+
+
+def _session_cookie(user):
+    """Sessão autenticada criada direto no SessionStore (sem passar pelo login)."""
+    store = importlib.import_module(settings.SESSION_ENGINE).SessionStore()
+    store[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    store.create()
+    return store.session_key
+
+
+def virtual_users(year, max_tx_ids=200):
+    """Um VirtualUser (sessão + ids úteis) por usuário `loadtest_*` existente."""
+    User = get_user_model()
+    cats = defaultdict(list)
+    for pk, kind in Category.objects.filter(name__startswith="Carga: ").values_list("id", "kind"):
+        cats[kind].append(pk)
+    out = []
+    for user in User.objects.filter(username__startswith=USER_PREFIX).order_by("username"):
+        csrf = get_random_string(32, CSRF_ALLOWED_CHARS)
+        cookies = f"{settings.SESSION_COOKIE_NAME}={_session_cookie(user)}; {settings.CSRF_COOKIE_NAME}={csrf}"
+        out.append(VirtualUser(
+            username=user.username,
+            cookies=cookies,
+            csrf=csrf,
+            year=year,
+            accounts=list(Account.objects.filter(owner=user).values_list("id", flat=True)),
+            categories=dict(cats),
+            tx_ids=list(
+                Transaction.objects.filter(account__owner=user, date__year=year)
+                .values_list("id", flat=True)[:max_tx_ids]
+            ),
+        ))
+    return out
+
+
+# --------------------------------------------
+# Ações (uma requisição cada)
+# --------------------------------------------
+
+@dataclass
+class Request:
+    label: str
+    method: str
+    path: str
+    body: dict = None
+    expect: int = 200
+
+
+def _month(vu, rng):
+    return {"year": vu.year, "month": rng.randint(1, 12)}
+
+
+def _dashboard(vu, rng):
+    return Request("dashboard", "GET", f"/?{urlencode(_month(vu, rng))}")
+
+
+def _transactions(vu, rng):
+    params = _month(vu, rng)
+    if rng.random() < 0.5:
+        params["status"] = rng.choice(TransactionStatus.values)
+    if rng.random() < 0.3:
+        params["account"] = rng.choice(vu.accounts)
+    if rng.random() < 0.3:
+        params["q"] = rng.choice(["merc", "uber", "alug"])
+    return Request("transactions", "GET", f"/transacoes/?{urlencode(params)}")
+
+
+def _new_installments(vu, rng):
+    d = date(vu.year, rng.randint(1, 12), rng.randint(1, 28))
+    return Request("new_installments", "POST", "/transacoes/nova/", {
+        "account": rng.choice(vu.accounts),
+        "category": rng.choice(vu.categories[Category.EXPENSE]),
+        "amount": f"{rng.randint(1000, 300000) / 100:.2f}",
+        "description": "Compra parcelada (carga)",
+        "date": d.isoformat(),
+        "installments": rng.randint(2, 12),
+        "status": TransactionStatus.PENDING,
+        "idempotency_key": uuid.uuid4().hex,
+    }, expect=302)
+
+
+def _toggle_status(vu, rng):
+    return Request("toggle_status", "POST", f"/transacoes/{rng.choice(vu.tx_ids)}/toggle/", {}, expect=302)
+
+
+def _import_fixed(vu, rng):
+    return Request("import_fixed", "POST", "/fixas/importar/EX/", _month(vu, rng), expect=302)
+
+
+ACTIONS = {
+    "dashboard": _dashboard,
+    "transactions": _transactions,
+    "new_installments": _new_installments,
+    "toggle_status": _toggle_status,
+    "import_fixed": _import_fixed,
+}
+
+
+def _headers(vu, req):
+    headers = {
+        "Cookie": vu.cookies,
+        "X-CSRFToken": vu.csrf,
+        ENDPOINT_HEADER: req.label,
+    }
+    body = b""
+    if req.method == "POST":
+        body = urlencode(req.body or {}).encode()
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+    headers["Content-Length"] = str(len(body))
+    return headers, body
+
+
+# --------------------------------------------
+# Instrumentação do banco (modos em processo)
+# --------------------------------------------
+
+_endpoint = contextvars.ContextVar("loadtest_endpoint", default=None)
+
+
+class DbStats:
+    """Tempo de banco, nº de queries e esperas por lock por endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = Counter()
+        self.db_time = Counter()
+        self.lock_errors = Counter()
+        self.lock_wait = Counter()
+        self.running = {}        # backend pid -> endpoint (PostgreSQL)
+
+    def __call__(self, execute, sql, params, many, context):
+        label = _endpoint.get()
+        if label is None:
+            return execute(sql, params, many, context)
+        pid = _backend_pid(context["connection"])
+        if pid is not None:
+            self.running[pid] = label
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as e:
+            if "locked" in str(e):
+                with self.lock:
+                    self.lock_errors[label] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - t0
+            if pid is not None:
+                self.running.pop(pid, None)
+            with self.lock:
+                self.queries[label] += 1
+                self.db_time[label] += elapsed
+
+    def install(self):
+        for conn in connections.all():
+            if self not in conn.execute_wrappers:
+                conn.execute_wrappers.append(self)
+        connection_created.connect(self._on_connect, weak=False)
+
+    def uninstall(self):
+        connection_created.disconnect(self._on_connect)
+        for conn in connections.all():
+            if self in conn.execute_wrappers:
+                conn.execute_wrappers.remove(self)
+
+    def _on_connect(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def sample_locks(self, stop):
+        """Thread de amostragem: soma o intervalo a cada backend esperando lock."""
+        if connection.vendor != "postgresql":
+            return
+        sql = (
+            "SELECT pid FROM pg_stat_activity "
+            "WHERE datname = current_database() AND wait_event_type = 'Lock'"
+        )
+        try:
+            while not stop.wait(LOCK_SAMPLE_INTERVAL):
+                with connection.cursor() as cur:
+                    cur.execute(sql)
+                    waiting = [pid for (pid,) in cur.fetchall()]
+                with self.lock:
+                    for pid in waiting:
+                        label = self.running.get(pid)
+                        if label:
+                            self.lock_wait[label] += LOCK_SAMPLE_INTERVAL
+        finally:
+            connection.close()
+
+
+def _backend_pid(wrapper):
+    raw = wrapper.connection
+    if wrapper.vendor != "postgresql" or raw is None:
+        return None
+    if hasattr(raw, "get_backend_pid"):       # psycopg2
+        return raw.get_backend_pid()
+    return raw.info.backend_pid               # psycopg 3
+
+
+def instrument_wsgi(app):
+    def wrapped(environ, start_response):
+        token = _endpoint.set(environ.get("HTTP_X_LOADTEST_ENDPOINT"))
+        try:
+            return app(environ, start_response)
+        finally:
+            _endpoint.reset(token)
+    return wrapped
+
+
+# --------------------------------------------
+# Coleta
+# --------------------------------------------
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.statuses = defaultdict(Counter)
+
+    def add(self, label, seconds, status, expected):
+        with self.lock:
+            self.latencies[label].append(seconds)
+            self.statuses[label][str(status)] += 1
+            if status != expected:
+                self.errors[label] += 1
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # nearest-rank
+    k = math.ceil(pct / 100 * len(sorted_values)) - 1
+    return sorted_values[max(0, min(k, len(sorted_values) - 1))]
+
+
+def _pick(mix, rng):
+    labels = list(mix)
+    return rng.choices(labels, weights=[mix[k] for k in labels])[0]
+
+
+# --------------------------------------------
+# Drivers
+# --------------------------------------------
+
+def _http_send(base, vu, req):
+    parts = urlsplit(base)
+    conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    conn = conn_cls(parts.hostname, parts.port, timeout=60)
+    headers, body = _headers(vu, req)
+    try:
+        conn.request(req.method, parts.path.rstrip("/") + req.path, body=body or None, headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        return resp.status
+    except OSError:
+        return 0
+    finally:
+        conn.close()
+
+
+def _run_threads(scenario, users, send, recorder):
+    mix, (think_lo, think_hi) = scenario["mix"], scenario["think_time"]
+    n = scenario["users"]
+    start = time.perf_counter()
+    deadline = start + scenario["duration"]
+
+    def loop(i):
+        vu = users[i % len(users)]
+        rng = random.Random(i)
+        time.sleep(scenario["ramp_up"] * i / n)
+        while time.perf_counter() < deadline:
+            req = ACTIONS[_pick(mix, rng)](vu, rng)
+            t0 = time.perf_counter()
+            status = send(vu, req)
+            recorder.add(req.label, time.perf_counter() - t0, status, req.expect)
+            time.sleep(rng.uniform(think_lo, think_hi))
+
+    threads = [threading.Thread(target=loop, args=(i,), daemon=True) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+
+def _serve_wsgi(app):
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+    class Server(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    httpd = make_server("127.0.0.1", 0, app, server_class=Server, handler_class=QuietHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+async def _asgi_send(app, vu, req):
+    path, _, query = req.path.partition("?")
+    headers, body = _headers(vu, req)
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": req.method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"127.0.0.1")] + [
+            (k.lower().encode(), v.encode()) for k, v in headers.items()
+        ],
+        "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80),
+    }
+    done = asyncio.Event()
+    result = {"status": 0}
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()   # Django escuta o disconnect em paralelo à view
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    token = _endpoint.set(req.label)
+    try:
+        await app(scope, receive, send)
+    finally:
+        _endpoint.reset(token)
+        done.set()
+    return result["status"]
+
+
+def _run_asgi(scenario, users, app, recorder):
+    mix, (think_lo, think_hi) = scenario["mix"], scenario["think_time"]
+    n = scenario["users"]
+
+    async def main():
+        start = time.perf_counter()
+        deadline = start + scenario["duration"]
+
+        async def loop(i):
+            vu = users[i % len(users)]
+            rng = random.Random(i)
+            await asyncio.sleep(scenario["ramp_up"] * i / n)
+            while time.perf_counter() < deadline:
+                req = ACTIONS[_pick(mix, rng)](vu, rng)
+                t0 = time.perf_counter()
+                status = await _asgi_send(app, vu, req)
+                recorder.add(req.label, time.perf_counter() - t0, status, req.expect)
+                await asyncio.sleep(rng.uniform(think_lo, think_hi))
+
+        await asyncio.gather(*(loop(i) for i in range(n)))
+        return time.perf_counter() - start
+
+    return asyncio.run(main())
+
+
+def run(scenario, server="wsgi", url=None, year=None):
+    """Executa o cenário e devolve o relatório (dict serializável em JSON)."""
+    year = year or date.today().year
+    users = virtual_users(year)
+    if not users:
+        raise ValueError("Nenhum usuário de carga; rode com --seed primeiro.")
+    missing = [
+        label for label, check in (
+            ("toggle_status", lambda vu: vu.tx_ids),
+            ("new_installments", lambda vu: vu.categories.get(Category.EXPENSE)),
+        )
+        if scenario["mix"].get(label) and not all(check(vu) for vu in users)
+    ]
+    if missing:
+        raise ValueError(f"Massa de dados insuficiente para: {', '.join(missing)} (rode --seed).")
+    close_old_connections()
+
+    recorder = Recorder()
+    db = None
+    stop = threading.Event()
+    sampler = None
+    if server in ("wsgi", "asgi"):
+        db = DbStats()
+        db.install()
+        sampler = threading.Thread(target=db.sample_locks, args=(stop,), daemon=True)
+        sampler.start()
+    try:
+        if server == "wsgi":
+            from controle_financeiro.wsgi import application
+
+            httpd = _serve_wsgi(instrument_wsgi(application))
+            base = f"http://127.0.0.1:{httpd.server_address[1]}"
+            try:
+                elapsed = _run_threads(scenario, users, lambda vu, req: _http_send(base, vu, req), recorder)
+            finally:
+                httpd.shutdown()
+                httpd.server_close()
+        elif server == "asgi":
+            from controle_financeiro.asgi import application
+
+            elapsed = _run_asgi(scenario, users, application, recorder)
+        elif server == "url":
+            if not url:
+                raise ValueError("Informe --url para o modo url.")
+            elapsed = _run_threads(scenario, users, lambda vu, req: _http_send(url, vu, req), recorder)
+        else:
+            raise ValueError(f"Servidor desconhecido: {server}")
+    finally:
+        stop.set()
+        if sampler is not None:
+            sampler.join()
+        if db is not None:
+            db.uninstall()
+    return build_report(scenario, server, elapsed, recorder, db)
+
+
+# --------------------------------------------
+# Relatório / comparação
+# --------------------------------------------
+
+def build_report(scenario, server, elapsed, recorder, db=None):
+    endpoints = {}
+    all_latencies = []
+    for label, values in sorted(recorder.latencies.items()):
+        values.sort()
+        all_latencies.extend(values)
+        n = len(values)
+        row = {
+            "requests": n,
+            "errors": recorder.errors[label],
+            "rps": round(n / elapsed, 2),
+            "p50_ms": round(_percentile(values, 50) * 1000, 1),
+            "p95_ms": round(_percentile(values, 95) * 1000, 1),
+            "p99_ms": round(_percentile(values, 99) * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1),
+            "statuses": dict(recorder.statuses[label]),
+        }
+        if db is not None:
+            row.update({
+                "queries_per_req": round(db.queries[label] / n, 1),
+                "db_ms_per_req": round(db.db_time[label] * 1000 / n, 1),
+                "lock_wait_ms": round(db.lock_wait[label] * 1000, 1),
+                "lock_errors": db.lock_errors[label],
+            })
+        endpoints[label] = row
+    all_latencies.sort()
+    total = sum(len(v) for v in recorder.latencies.values())
+    return {
+        "meta": {
+            "scenario": scenario,
+            "server": server,
+            "db_vendor": connection.vendor,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - elapsed)),
+            "elapsed_s": round(elapsed, 2),
+        },
+        "total": {
+            "requests": total,
+            "errors": sum(recorder.errors.values()),
+            "rps": round(total / elapsed, 2) if elapsed else 0,
+            "p50_ms": round((_percentile(all_latencies, 50) or 0) * 1000, 1),
+            "p95_ms": round((_percentile(all_latencies, 95) or 0) * 1000, 1),
+            "p99_ms": round((_percentile(all_latencies, 99) or 0) * 1000, 1),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def write_report(report, path):
+    Path(path).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+def read_report(path):
+    return json.loads(Path(path).read_text())
+
+
+def format_report(report):
+    cols = ["requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+    if any("db_ms_per_req" in r for r in report["endpoints"].values()):
+        cols += ["queries_per_req", "db_ms_per_req", "lock_wait_ms", "lock_errors"]
+    meta = report["meta"]
+    lines = [
+        f"cenário {meta['scenario']['name']} • {meta['server']} • {meta['db_vendor']} • "
+        f"{meta['scenario']['users']} usuários • {meta['elapsed_s']}s",
+        _table(["endpoint"] + cols, [
+            [label] + [r.get(c, "") for c in cols] for label, r in report["endpoints"].items()
+        ] + [["TOTAL"] + [report["total"].get(c, "") for c in cols]]),
+    ]
+    return "\n".join(lines)
+
+
+COMPARE_METRICS = ("rps", "p50_ms", "p95_ms", "p99_ms", "errors", "lock_wait_ms")
+
+
+def compare(base, new):
+    """Tabela endpoint x métrica: base, novo e variação (%)."""
+    rows = []
+    labels = list(dict.fromkeys([*base["endpoints"], *new["endpoints"]]))
+    for label in labels + ["TOTAL"]:
+        a = base["total"] if label == "TOTAL" else base["endpoints"].get(label, {})
+        b = new["total"] if label == "TOTAL" else new["endpoints"].get(label, {})
+        for metric in COMPARE_METRICS:
+            if metric not in a and metric not in b:
+                continue
+            va, vb = a.get(metric), b.get(metric)
+            delta = ""
+            if va not in (None, 0) and vb is not None:
+                delta = f"{(vb - va) * 100 / va:+.1f}%"
+            rows.append([label, metric, "" if va is None else va, "" if vb is None else vb, delta])
+    header = (
+        f"base: {base['meta']['scenario']['name']}/{base['meta']['server']} ({base['meta']['started_at']})  "
+        f"novo: {new['meta']['scenario']['name']}/{new['meta']['server']} ({new['meta']['started_at']})"
+    )
+    return header + "\n" + _table(["endpoint", "métrica", "base", "novo", "Δ"], rows)
+
+
+def _table(header, rows):
+    rows = [[str(c) for c in r] for r in rows]
+    widths = [max(len(str(h)), *(len(r[i]) for r in rows)) if rows else len(str(h)) for i, h in enumerate(header)]
+
+    def fmt(r):
+        return "  ".join(c.ljust(w) if i == 0 else c.rjust(w) for i, (c, w) in enumerate(zip(r, widths)))
+
+    return "\n".join([fmt([str(h) for h in header]), fmt(["-" * w for w in widths])] + [fmt(r) for r in rows])
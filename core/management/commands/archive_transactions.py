@@ -0,0 +1,40 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import archive
+from core.models import Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Move os anos anteriores a --before para arquivos colunares comprimidos "
+        "(ARCHIVE_DIR) e os remove de core_transaction. Saldos e análises "
+        "continuam considerando os anos arquivados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", type=int, required=True,
+                            help="Ano de corte: arquiva todos os anos < before.")
+        parser.add_argument("--dir", default=None, help="Diretório de saída (padrão: ARCHIVE_DIR).")
+        parser.add_argument("--dry-run", action="store_true", help="Só lista os anos e quantidades.")
+
+    def handle(self, *args, before, dir, dry_run, **opts):
+        if before > date.today().year:
+            raise CommandError("--before não pode ser um ano futuro.")
+
+        years = [
+            d.year for d in
+            Transaction.objects.filter(date__lt=date(before, 1, 1)).dates("date", "year")
+        ]
+        if not years:
+            self.stdout.write("Nada para arquivar.")
+            return
+
+        for year in years:
+            if dry_run:
+                n = Transaction.objects.filter(date__year=year).count()
+                self.stdout.write(f"{year}: {n} transações")
+                continue
+            arq = archive.archive_year(year, dir)
+            self.stdout.write(self.style.SUCCESS(f"{year}: {arq.row_count} transações -> {arq.path}"))
@@ -0,0 +1,135 @@
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core import archive, insights
+from core.models import Account, Category, Transaction
+
+MERCHANTS = [
+    "mercado", "uber", "ifood", "farmacia", "posto", "padaria", "restaurante",
+    "cinema", "loja", "pix", "amazon", "mercado livre",
+]
+SUBSCRIPTIONS = ["netflix", "spotify", "academia", "icloud", "seguro celular", "jornal"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark do motor de insights: análise vetorizada sobre colunas sintéticas e "
+        "load_columns + analyze sobre o banco — um usuário temporário semeado com "
+        "--db-rows linhas (parte arquivada), desfeito no fim, ou o usuário real de --user."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--n", type=int, default=1_000_000, help="Nº de transações (padrão: 1M).")
+        parser.add_argument("--years", type=int, default=10, help="Anos de histórico.")
+        parser.add_argument("--categories", type=int, default=40)
+        parser.add_argument("--repeat", type=int, default=5, help="Execuções (vale a melhor).")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--db-rows", type=int, default=300_000,
+                            help="Linhas do usuário temporário no banco (0 = só a análise).")
+        parser.add_argument("--archived-years", type=int, default=2,
+                            help="Anos mais antigos do usuário temporário movidos para o arquivo frio. "
+                                 "Arquiva o ano inteiro (todos os usuários); tudo é desfeito no fim.")
+        parser.add_argument("--user", help="username: mede load_columns + analyze com dados reais.")
+
+    def handle(self, *args, n, years, categories, repeat, seed, user, db_rows, archived_years, **opts):
+        rng = np.random.default_rng(seed)
+        today = date.today()
+        start = date(today.year - years, today.month, 1).toordinal()
+
+        descriptions = [f"{m} #" for m in MERCHANTS] + SUBSCRIPTIONS
+        n_sub = len(SUBSCRIPTIONS)
+        dates = rng.integers(start, today.toordinal() + 1, n, dtype=np.int32)
+        cents = -rng.lognormal(8, 1, n).astype(np.int64)
+        cents[rng.random(n) < 0.05] *= -20          # receitas
+        desc = rng.integers(0, len(MERCHANTS), n, dtype=np.int32)
+        # assinaturas: ~1 por mês cada, valor fixo, nunca marcadas como fixas
+        months = (today.year - years) * 12 + today.month - 1 + np.arange(years * 12 + 1)
+        sub_rows = min(n, len(months) * n_sub)
+        sub_idx = np.arange(sub_rows)
+        desc[:sub_rows] = len(MERCHANTS) + sub_idx % n_sub
+        dates[:sub_rows] = [date(int(m // 12), int(m % 12) + 1, 5).toordinal() for m in months[sub_idx // n_sub]]
+        cents[:sub_rows] = -(2990 + 1000 * (sub_idx % n_sub))
+        cols = insights.Columns(
+            id=np.arange(1, n + 1, dtype=np.int64),
+            date=dates,
+            cents=cents,
+            category=rng.integers(1, categories + 1, n, dtype=np.int64),
+            account=rng.integers(1, 4, n, dtype=np.int64),
+            fixed=np.zeros(n, dtype=bool),
+            installment=rng.random(n) < 0.03,
+            desc=desc,
+            descriptions=descriptions,
+        )
+
+        elapsed, result = self._best(repeat, lambda: insights.analyze(cols, today))
+        self.stdout.write(
+            f"{n:,} transações ({years} anos, {categories} categorias): análise em "
+            f"{elapsed * 1000:.0f} ms (melhor de {repeat}) -> "
+            f"{len(result['categories'])} categorias, {len(result['outliers'])} fora da curva, "
+            f"{len(result['recurring'])} recorrentes"
+        )
+
+        if user:
+            try:
+                u = get_user_model().objects.get(username=user)
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Usuário '{user}' não encontrado.")
+            self._measure(user, u, repeat, today)
+        elif db_rows > 0:
+            self._seeded(cols, min(db_rows, n), categories, archived_years, repeat, today)
+
+    def _measure(self, label, user, repeat, today):
+        load_s, real = self._best(repeat, lambda: insights.load_columns(user))
+        analyze_s, _ = self._best(repeat, lambda: insights.analyze(real, today))
+        self.stdout.write(
+            f"{label}: {len(real):,} transações — carga {load_s * 1000:.0f} ms + "
+            f"análise {analyze_s * 1000:.0f} ms = {(load_s + analyze_s) * 1000:.0f} ms"
+        )
+
+    def _seeded(self, cols, rows, categories, archived_years, repeat, today, batch=5000):
+        self.stdout.write(f"semeando {rows:,} transações num usuário temporário…")
+        with tempfile.TemporaryDirectory() as directory, transaction.atomic():
+            u = get_user_model().objects.create(username="bench_insights_tmp")
+            accounts = Account.objects.bulk_create([Account(name=f"Conta {i}", owner=u) for i in range(3)])
+            cats = Category.objects.bulk_create([
+                Category(name=f"Bench {i}", kind=Category.EXPENSE) for i in range(categories)
+            ])
+            account_ids = [a.pk for a in accounts]
+            category_ids = [c.pk for c in cats]
+            # carga sintética: direto no manager base (sem journal nem contadores)
+            for start in range(0, rows, batch):
+                Transaction._base_manager.bulk_create([
+                    Transaction(
+                        date=date.fromordinal(int(cols.date[i])),
+                        description=cols.descriptions[cols.desc[i]].replace("#", str(i % 97)),
+                        account_id=account_ids[cols.account[i] - 1],
+                        category_id=category_ids[cols.category[i] - 1],
+                        amount=Decimal(int(cols.cents[i])).scaleb(-2),
+                        installment_no=1 if cols.installment[i] else None,
+                    )
+                    for i in range(start, min(start + batch, rows))
+                ])
+            first = date.fromordinal(int(cols.date[:rows].min())).year
+            for year in range(first, first + archived_years):
+                archive.archive_year(year, directory)
+            live = Transaction.objects.filter(account__owner=u).count()
+            self.stdout.write(f"  {live:,} no banco, {rows - live:,} arquivadas")
+            self._measure("banco", u, repeat, today)
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _best(repeat, fn):
+        best, result = None, None
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
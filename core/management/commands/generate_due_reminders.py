@@ -0,0 +1,95 @@
+from datetime import date
+from decimal import Decimal
+
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.timezone import localdate, now
+
+from core import due
+from core.models import DueReminder
+
+BATCH = 1000
+MAX_ITEMS = 50   # itens guardados/enviados por lembrete
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera o resumo diário de vencimentos (vencidas + próximos dias) de todos os "
+        "usuários numa única passada pelas transações pendentes. Reexecutar no mesmo "
+        "dia atualiza os resumos (e remove os de quem não tem mais vencimentos); com "
+        "--email envia só os ainda não enviados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", dest="ref_date", help="Data de referência (YYYY-MM-DD, padrão: hoje).")
+        parser.add_argument("--days", type=int, default=due.UPCOMING_DAYS, help="Horizonte dos próximos vencimentos.")
+        parser.add_argument("--email", action="store_true", help="Envia os resumos por e-mail (usuários com e-mail).")
+        parser.add_argument("--dry-run", action="store_true", help="Só mostra as contagens.")
+
+    def handle(self, *args, ref_date, days, email, dry_run, **opts):
+        try:
+            today = date.fromisoformat(ref_date) if ref_date else localdate()
+        except ValueError:
+            raise CommandError(f"Data inválida: {ref_date}")
+
+        rows = []
+        for owner_id, late, soon in due.iter_due_by_owner(today, days):
+            rows.append(DueReminder(
+                owner_id=owner_id,
+                date=today,
+                overdue_count=len(late),
+                overdue_total=sum((i["amount"] for i in late), Decimal("0")),
+                upcoming_count=len(soon),
+                upcoming_total=sum((i["amount"] for i in soon), Decimal("0")),
+                items=(late + soon)[:MAX_ITEMS],
+            ))
+
+        if dry_run:
+            for r in rows:
+                self.stdout.write(f"usuário {r.owner_id}: {r.overdue_count} vencidas, {r.upcoming_count} próximas")
+            self.stdout.write(f"{len(rows)} usuários com vencimentos")
+            return
+
+        with transaction.atomic():
+            # quem tinha lembrete hoje e já não tem vencimentos (pagou tudo desde a última execução)
+            existing = set(DueReminder.objects.filter(date=today).values_list("owner_id", flat=True))
+            stale = sorted(existing - {r.owner_id for r in rows})
+            for i in range(0, len(stale), BATCH):
+                DueReminder.objects.filter(date=today, owner_id__in=stale[i:i + BATCH]).delete()
+            DueReminder.objects.bulk_create(
+                rows,
+                batch_size=BATCH,
+                update_conflicts=True,
+                unique_fields=["owner", "date"],
+                update_fields=["overdue_count", "overdue_total", "upcoming_count", "upcoming_total", "items"],
+            )
+        self.stdout.write(self.style.SUCCESS(f"{len(rows)} lembretes gerados para {today:%d/%m/%Y}"))
+        if stale:
+            self.stdout.write(f"{len(stale)} lembretes sem vencimentos removidos")
+
+        if email:
+            self.stdout.write(f"{self._send(today)} e-mails enviados")
+
+    def _send(self, today):
+        pending = (
+            DueReminder.objects
+            .filter(date=today, sent_at__isnull=True)
+            .exclude(owner__email="")
+            .select_related("owner")
+        )
+        sent = 0
+        for r in pending.iterator():
+            lines = [
+                f"{date.fromisoformat(i['date']):%d/%m} • {i['description']} • R$ {Decimal(i['amount']):.2f}"
+                for i in r.items
+            ]
+            send_mail(
+                subject=f"Vencimentos: {r.overdue_count} vencidas, {r.upcoming_count} nos próximos dias",
+                message="\n".join(lines),
+                from_email=None,
+                recipient_list=[r.owner.email],
+            )
+            DueReminder.objects.filter(pk=r.pk).update(sent_at=now())
+            sent += 1
+        return sent
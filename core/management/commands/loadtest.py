@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga local: sobe o app (WSGI ou ASGI) e simula usuários concorrentes "
+        "com um mix de leituras/escritas. Reporta throughput, p50/p95/p99 e esperas por "
+        "lock por endpoint; grava JSON e compara execuções. Use um banco de teste."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenario", default="mixed",
+                            help=f"Cenário embutido ({', '.join(loadtest.SCENARIOS)}) ou arquivo JSON.")
+        parser.add_argument("--server", choices=["wsgi", "asgi", "url"], default="wsgi")
+        parser.add_argument("--url", help="Base do servidor alvo (modo url), ex.: http://127.0.0.1:8000")
+        parser.add_argument("--users", type=int, help="Usuários virtuais concorrentes.")
+        parser.add_argument("--duration", type=float, help="Duração em segundos.")
+        parser.add_argument("--ramp-up", type=float, help="Segundos até todos os usuários estarem ativos.")
+        parser.add_argument("--year", type=int, help="Ano da massa de dados (padrão: ano atual).")
+        parser.add_argument("--seed", type=int, metavar="N",
+                            help="Cria (se faltarem) N usuários loadtest_* com dados antes de rodar.")
+        parser.add_argument("--seed-tx", type=int, default=300, help="Transações por usuário semeado.")
+        parser.add_argument("--out", help="Grava o relatório JSON neste caminho.")
+        parser.add_argument("--compare", metavar="BASE_JSON", help="Compara com uma execução anterior.")
+        parser.add_argument("--against", metavar="NEW_JSON",
+                            help="Com --compare: só compara dois JSONs, sem rodar carga.")
+        parser.add_argument("--cleanup", action="store_true", help="Remove os usuários loadtest_* e sai.")
+        parser.add_argument("--force", action="store_true", help="Permite semear/limpar com DEBUG=False.")
+
+    def handle(self, *args, **opts):
+        if opts["against"]:
+            if not opts["compare"]:
+                raise CommandError("--against exige --compare.")
+            self.stdout.write(loadtest.compare(
+                loadtest.read_report(opts["compare"]), loadtest.read_report(opts["against"])
+            ))
+            return
+
+        if (opts["cleanup"] or opts["seed"]) and not settings.DEBUG and not opts["force"]:
+            raise CommandError("DEBUG=False: semear/limpar usuários de carga exige --force.")
+        if opts["cleanup"]:
+            n = loadtest.cleanup()
+            self.stdout.write(f"{n} registros removidos.")
+            return
+
+        try:
+            scenario = loadtest.load_scenario(
+                opts["scenario"],
+                users=opts["users"], duration=opts["duration"], ramp_up=opts["ramp_up"],
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        year = opts["year"]
+        if opts["seed"]:
+            year = loadtest.seed(opts["seed"], opts["seed_tx"], year)
+            self.stdout.write(f"Massa de dados pronta ({opts['seed']} usuários).")
+
+        self.stdout.write(
+            f"Rodando '{scenario['name']}' ({opts['server']}): {scenario['users']} usuários, "
+            f"{scenario['duration']}s..."
+        )
+        try:
+            report = loadtest.run(scenario, opts["server"], opts["url"], year)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(loadtest.format_report(report))
+        if opts["out"]:
+            loadtest.write_report(report, opts["out"])
+            self.stdout.write(self.style.SUCCESS(f"Relatório gravado em {opts['out']}"))
+        if opts["compare"]:
+            self.stdout.write("")
+            self.stdout.write(loadtest.compare(loadtest.read_report(opts["compare"]), report))
@@ -0,0 +1,113 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "PostgreSQL: converte core_transaction em tabela particionada por ano "
+        "(RANGE em date) e/ou cria as partições dos próximos anos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--convert", action="store_true",
+                            help="Converte a tabela atual (copia os dados; rodar em janela de manutenção).")
+        parser.add_argument("--ahead", type=int, default=2,
+                            help="Cria partições até o ano atual + N (padrão: 2).")
+
+    def handle(self, *args, convert, ahead, **opts):
+        if connection.vendor != "postgresql":
+            raise CommandError("Particionamento só é suportado no PostgreSQL.")
+
+        self.table = Transaction._meta.db_table
+        if convert:
+            if self._is_partitioned():
+                self.stdout.write("Tabela já particionada.")
+            else:
+                self._convert()
+        elif not self._is_partitioned():
+            raise CommandError("Tabela não particionada. Use --convert.")
+
+        last = date.today().year + ahead
+        with connection.cursor() as cur:
+            cur.execute(f'SELECT MIN("date") FROM "{self.table}"')
+            first = (cur.fetchone()[0] or date.today()).year
+        created = [y for y in range(first, last + 1) if self._ensure_partition(y)]
+        self.stdout.write(self.style.SUCCESS(
+            f"Partições criadas: {', '.join(map(str, created))}" if created else "Partições em dia."
+        ))
+
+    # --------------------------------------------
+
+    def _is_partitioned(self):
+        with connection.cursor() as cur:
+            cur.execute("SELECT relkind FROM pg_class WHERE relname = %s", [self.table])
+            row = cur.fetchone()
+        return bool(row and row[0] == "p")
+
+    def _ensure_partition(self, year):
+        name = f"{self.table}_y{year}"
+        with connection.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s)", [name])
+            if cur.fetchone()[0]:
+                return False
+            cur.execute(
+                f'CREATE TABLE "{name}" PARTITION OF "{self.table}" '
+                f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+            )
+        return True
+
+    @transaction.atomic
+    def _convert(self):
+        t = self.table
+        legacy = f"{t}_legacy"
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT conrelid::regclass::text FROM pg_constraint "
+                "WHERE confrelid = %s::regclass AND contype = 'f'", [t]
+            )
+            refs = [r[0] for r in cur.fetchall()]
+            if refs:
+                raise CommandError(f"Tabelas com FK para {t} impedem a conversão: {', '.join(refs)}")
+
+            # índices e FKs atuais (recriados com os mesmos nomes no pai particionado)
+            cur.execute(
+                "SELECT indexdef FROM pg_indexes WHERE tablename = %s "
+                "AND indexname NOT IN (SELECT conname FROM pg_constraint "
+                "WHERE conrelid = %s::regclass AND contype = 'p')", [t, t]
+            )
+            index_defs = [r[0] for r in cur.fetchall()]
+            cur.execute(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = %s::regclass AND contype = 'f'", [t]
+            )
+            fks = cur.fetchall()
+            cur.execute(f'SELECT EXTRACT(YEAR FROM MIN("date"))::int, EXTRACT(YEAR FROM MAX("date"))::int, '
+                        f'COALESCE(MAX(id), 0) FROM "{t}"')
+            first, last, max_id = cur.fetchone()
+
+            cur.execute(f'ALTER TABLE "{t}" RENAME TO "{legacy}"')
+            cur.execute(
+                f'CREATE TABLE "{t}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING IDENTITY '
+                f'INCLUDING CONSTRAINTS) PARTITION BY RANGE ("date")'
+            )
+            # a chave de partição precisa fazer parte da PK
+            cur.execute(f'ALTER TABLE "{t}" ADD PRIMARY KEY ("id", "date")')
+            cur.execute(f'ALTER TABLE "{t}" ALTER COLUMN "id" RESTART WITH {max_id + 1}')
+            cur.execute(f'CREATE TABLE "{t}_default" PARTITION OF "{t}" DEFAULT')
+            if first is not None:
+                for year in range(first, last + 1):
+                    self._ensure_partition(year)
+
+            cur.execute(f'INSERT INTO "{t}" SELECT * FROM "{legacy}"')
+            cur.execute(f'DROP TABLE "{legacy}"')
+
+            for index_def in index_defs:
+                cur.execute(index_def)
+            for name, definition in fks:
+                cur.execute(f'ALTER TABLE "{t}" ADD CONSTRAINT "{name}" {definition}')
+
+        self.stdout.write(self.style.SUCCESS(f"{t} convertida para particionamento anual."))
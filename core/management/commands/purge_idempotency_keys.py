@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from core.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Remove as chaves de idempotência vencidas (rodar periodicamente, ex.: cron diário)."
+
+    def handle(self, *args, **opts):
+        self.stdout.write(f"{purge_expired()} chaves removidas")
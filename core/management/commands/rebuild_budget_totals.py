@@ -0,0 +1,20 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.budgets import rebuild_totals
+
+
+class Command(BaseCommand):
+    help = "Recalcula os contadores de realizado (CategoryMonthTotal) a partir das transações (vivas + arquivadas)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="username (padrão: todos).")
+
+    def handle(self, *args, user, **opts):
+        target = None
+        if user:
+            target = get_user_model().objects.filter(username=user).first()
+            if target is None:
+                raise CommandError(f"Usuário não encontrado: {user}")
+        n = rebuild_totals(target)
+        self.stdout.write(f"{n} contadores recalculados")
@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import periods
+from core.categorize import matcher_for
+from core.models import Transaction
+
+BATCH = 2000
+
+
+class Command(BaseCommand):
+    help = (
+        "Reaplica as regras de categorização (CategoryRule) às transações existentes. "
+        "Meses fechados ficam de fora (os snapshots não mudam)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="username (padrão: todos os usuários com regras).")
+        parser.add_argument("--since", help="Só transações a partir desta data (YYYY-MM-DD).")
+        parser.add_argument("--dry-run", action="store_true", help="Só conta o que mudaria.")
+
+    def handle(self, *args, user, since, dry_run, **opts):
+        User = get_user_model()
+        if user:
+            users = User.objects.filter(username=user)
+            if not users:
+                raise CommandError(f"Usuário não encontrado: {user}")
+        else:
+            users = User.objects.filter(category_rules__is_active=True).distinct()
+
+        for u in users:
+            matcher = matcher_for(u)
+            if not matcher:
+                continue
+            qs = Transaction.objects.filter(account__owner=u).order_by()
+            if since:
+                qs = qs.filter(date__gte=since)
+
+            # meses fechados: totais por categoria congelados em PeriodSnapshot
+            closed = periods.closed_months(u, qs.dates("date", "month"))
+
+            changed = scanned = skipped = 0
+            batch = []
+            rows = qs.values_list("id", "date", "description", "amount", "account_id", "category_id")
+            for pk, d, desc, amount, account_id, category_id in rows.iterator(chunk_size=BATCH):
+                if (d.year, d.month) in closed:
+                    skipped += 1
+                    continue
+                scanned += 1
+                new_cat = matcher.match(desc, amount, account_id)
+                if new_cat is None or new_cat == category_id:
+                    continue
+                changed += 1
+                batch.append(Transaction(pk=pk, category_id=new_cat))
+                if len(batch) >= BATCH and not dry_run:
+                    Transaction.objects.bulk_update(batch, ["category"])
+                    batch = []
+            if batch and not dry_run:
+                Transaction.objects.bulk_update(batch, ["category"])
+
+            verb = "mudariam" if dry_run else "recategorizadas"
+            msg = f"{u.username}: {scanned} lidas, {changed} {verb}"
+            if skipped:
+                msg += f", {skipped} em meses fechados (ignoradas)"
+            self.stdout.write(msg)
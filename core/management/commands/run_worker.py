@@ -0,0 +1,135 @@
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, BrokenExecutor, wait, FIRST_COMPLETED
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.utils.timezone import now
+
+from core import jobs
+
+
+def _run(job_id):
+    """Executa um job num thread/processo do pool, com conexão própria."""
+    close_old_connections()
+    try:
+        return jobs.run_job(job_id)
+    finally:
+        connections.close_all()
+
+
+def _pool(mode, concurrency):
+    if mode == "process":
+        # com spawn/forkserver (macOS; Linux a partir do Python 3.14) o filho
+        # nasce sem o Django configurado
+        return ProcessPoolExecutor(max_workers=concurrency, initializer=django.setup)
+    return ThreadPoolExecutor(max_workers=concurrency)
+
+
+def _beat(worker, stop):
+    """Thread de heartbeat: renova heartbeat_at dos jobs deste worker."""
+    while not stop.wait(jobs.HEARTBEAT_INTERVAL):
+        try:
+            jobs.heartbeat(worker)
+        except Exception:
+            pass   # banco fora do ar: tenta de novo no próximo ciclo
+        finally:
+            connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Consome a fila de jobs (core.Job) com N execuções simultâneas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=2, help="Jobs simultâneos (padrão: 2).")
+        parser.add_argument("--mode", choices=("thread", "process"), default="thread",
+                            help="Pool de threads (padrão) ou de processos.")
+        parser.add_argument("--poll", type=float, default=1.0, help="Intervalo de polling em segundos.")
+        parser.add_argument("--once", action="store_true", help="Esvazia a fila e sai.")
+        parser.add_argument("--stale-after", type=float, default=300,
+                            help="Segundos sem heartbeat após os quais um job RUNNING é tido como "
+                                 "abandonado e volta para a fila (padrão: 300; 0 desliga).")
+
+    def handle(self, *args, concurrency, mode, poll, once, stale_after, **opts):
+        if 0 < stale_after < 3 * jobs.HEARTBEAT_INTERVAL:
+            raise CommandError(f"--stale-after precisa ser ao menos {3 * jobs.HEARTBEAT_INTERVAL}s "
+                               f"(heartbeat a cada {jobs.HEARTBEAT_INTERVAL}s).")
+        host = socket.gethostname()
+        worker = f"{host}:{os.getpid()}"
+        self.worker = worker
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        # conexões não podem ser herdadas pelos processos filhos
+        connections.close_all()
+        self.stdout.write(f"Worker {worker}: {concurrency} {mode}(s), handlers: {', '.join(jobs.handler_names())}")
+
+        # jobs de workers deste host que morreram no meio
+        n = jobs.requeue_dead(host)
+        if n:
+            self.stdout.write(f"{n} job(s) de workers mortos devolvidos à fila.")
+        last_sweep = time.monotonic()
+
+        stop_beat = threading.Event()
+        threading.Thread(target=_beat, args=(worker, stop_beat), daemon=True).start()
+
+        running = {}
+        pool = _pool(mode, concurrency)
+        try:
+            while not self.stopping:
+                if stale_after and time.monotonic() - last_sweep >= min(stale_after, 60):
+                    last_sweep = time.monotonic()
+                    n = jobs.requeue_stale(older_than=now() - timedelta(seconds=stale_after))
+                    if n:
+                        self.stdout.write(f"{n} job(s) sem heartbeat há mais de {stale_after:.0f}s devolvidos à fila.")
+
+                free = concurrency - len(running)
+                ids = jobs.claim(worker, free) if free else []
+                for job_id in ids:
+                    try:
+                        fut = pool.submit(_run, job_id)
+                    except BrokenExecutor:
+                        # um processo filho morreu: o pool inteiro fica inutilizável
+                        pool.shutdown(wait=False)
+                        pool = _pool(mode, concurrency)
+                        fut = pool.submit(_run, job_id)
+                    running[fut] = job_id
+
+                if not running:
+                    if once:
+                        break
+                    close_old_connections()
+                    time.sleep(poll)
+                    continue
+
+                done, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    self._finish(fut, running.pop(fut))
+
+            # deixa terminar o que já começou
+            for fut in list(running):
+                wait([fut])
+                self._finish(fut, running.pop(fut))
+        finally:
+            pool.shutdown(wait=True)
+            stop_beat.set()
+
+        connections.close_all()
+
+    def _finish(self, fut, job_id):
+        exc = fut.exception()
+        if exc is not None:
+            # o job não chegou a gravar o próprio resultado (ex.: processo morto)
+            jobs.fail(job_id, self.worker, "".join(traceback.format_exception(exc, limit=5)))
+        ok = exc is None and fut.result()
+        self.stdout.write(f"job #{job_id}: {'ok' if ok else 'falhou'}")
+
+    def _stop(self, *args):
+        self.stopping = True
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_transaction_group_id_transaction_installment_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='is_fixed',
+            field=models.BooleanField(default=False, verbose_name='Despesa/Receita fixa'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['is_fixed'], name='core_transa_is_fixe_f30cbd_idx'),
+        ),
+    ]
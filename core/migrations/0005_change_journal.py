@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:24
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_transaction_is_fixed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('entity', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('op', models.CharField(choices=[('I', 'Inclusão'), ('U', 'Alteração'), ('D', 'Exclusão')], max_length=1)),
+                ('data', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['seq'],
+                'indexes': [models.Index(fields=['owner', 'seq'], name='core_change_owner_i_c0c15f_idx')],
+            },
+        ),
+    ]
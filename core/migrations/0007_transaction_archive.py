@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_month_close'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(db_index=True)),
+                ('path', models.CharField(max_length=255)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['year', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedAccountTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_totals', to='core.account')),
+                ('archive', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='account_totals', to='core.archivefile')),
+            ],
+        ),
+    ]
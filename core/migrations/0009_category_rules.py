@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_job_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('match_type', models.CharField(choices=[('KW', 'Palavra-chave'), ('RE', 'Regex')], default='KW', max_length=2)),
+                ('pattern', models.CharField(blank=True, max_length=200)),
+                ('min_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('max_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('priority', models.SmallIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.account')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.category')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_rules', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-priority', 'id'],
+                'indexes': [models.Index(fields=['owner', 'is_active'], name='core_catego_owner_i_6a7908_idx')],
+            },
+        ),
+    ]
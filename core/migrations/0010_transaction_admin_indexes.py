@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:33
+
+from django.db import migrations, models
+
+
+# busca por prefixo do admin (description__istartswith) no PostgreSQL:
+# UPPER("description"::text) LIKE UPPER('abc%') precisa de text_pattern_ops
+PREFIX_INDEX = "core_tx_desc_upper_prefix_idx"
+
+
+def create_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS "{PREFIX_INDEX}" '
+        f'ON "core_transaction" (UPPER("description"::text) text_pattern_ops)'
+    )
+
+
+def drop_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS "{PREFIX_INDEX}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_category_rules'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['date', 'id'], name='core_tx_date_id_idx'),
+        ),
+        migrations.RunPython(create_prefix_index, drop_prefix_index),
+    ]
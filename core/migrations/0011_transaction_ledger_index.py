@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:05
+
+from django.db import migrations
+
+
+# extrato por conta (core/statement.py): filtro por conta + ordem (date, id);
+# no PostgreSQL o INCLUDE (amount) permite somar o saldo só pelo índice
+LEDGER_INDEX = "core_tx_ledger_idx"
+
+
+def create_ledger_index(apps, schema_editor):
+    include = ' INCLUDE ("amount")' if schema_editor.connection.vendor == "postgresql" else ""
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS "{LEDGER_INDEX}" '
+        f'ON "core_transaction" ("account_id", "date", "id"){include}'
+    )
+
+
+def drop_ledger_index(apps, schema_editor):
+    schema_editor.execute(f'DROP INDEX IF EXISTS "{LEDGER_INDEX}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_transaction_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_ledger_index, drop_ledger_index),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def backfill_totals(apps, schema_editor):
+    # carga inicial dos contadores; daí em diante são mantidos a cada escrita
+    Transaction = apps.get_model("core", "Transaction")
+    CategoryMonthTotal = apps.get_model("core", "CategoryMonthTotal")
+    rows = (
+        Transaction.objects.order_by()
+        .values_list("account__owner_id", "category_id", ExtractYear("date"), ExtractMonth("date"))
+        .annotate(s=Sum("amount"), n=Count("id"))
+    )
+    CategoryMonthTotal.objects.bulk_create(
+        [
+            CategoryMonthTotal(owner_id=o, category_id=c, year=y, month=m, total=s, count=n)
+            for o, c, y, m, s, n in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_transaction_ledger_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Budget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('limit', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.category')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budgets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-year', '-month', 'category'],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'category', 'year', 'month'), name='uniq_budget')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CategoryMonthTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.category')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('owner', 'year', 'month', 'category'), name='uniq_category_month_total')],
+            },
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
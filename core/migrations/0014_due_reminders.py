@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:44
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_idempotency_and_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DueReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('overdue_count', models.PositiveIntegerField(default=0)),
+                ('overdue_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('upcoming_count', models.PositiveIntegerField(default=0)),
+                ('upcoming_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('items', models.JSONField(blank=True, default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status', 'PEN')), fields=['account', 'date'], name='core_tx_pending_idx'),
+        ),
+        migrations.AddField(
+            model_name='duereminder',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='due_reminders', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='duereminder',
+            constraint=models.UniqueConstraint(fields=('owner', 'date'), name='uniq_due_reminder'),
+        ),
+    ]
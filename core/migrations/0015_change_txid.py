@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_txid(apps, schema_editor):
+    # linhas existentes já estão commitadas: txid 0 as mantém em ordem de seq, antes das novas
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    apps.get_model("core", "Change").objects.filter(txid__isnull=True).update(txid=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_due_reminders'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='change',
+            name='txid',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['owner', 'txid', 'seq'], name='core_change_owner_i_79ddc0_idx'),
+        ),
+        migrations.RunPython(backfill_txid, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,20 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import budgets, journal
+from .journal import JournaledModel, record
 
 User = get_user_model()
 
-class Account(models.Model):
+class Account(JournaledModel):
+    journal_owner_path = "owner"
+
     name = models.CharField(max_length=80)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
     initial_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
@@ -13,7 +23,7 @@ class Account(models.Model):
         return self.name
 
 
-class Category(models.Model):
+class Category(JournaledModel):
     INCOME = "IN"
     EXPENSE = "EX"
 
@@ -34,7 +44,11 @@ class TransactionStatus(models.TextChoices):
     PAID    = "PAG", "Paga"
 
 
-class Transaction(models.Model):
+class Transaction(JournaledModel):
+    journal_owner_path = "account__owner"
+
+    objects = budgets.BudgetedQuerySet.as_manager()
+
     date = models.DateField()
     description = models.CharField(max_length=140)
     account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="transactions")
@@ -57,11 +71,406 @@ class Transaction(models.Model):
     # NOVO: Flag para recorrência simples (sem parcelas)
     is_fixed = models.BooleanField(default=False, verbose_name="Despesa/Receita fixa")
 
+    # concorrência otimista: incrementada no banco a cada save() e a cada QuerySet.update()
+    version = models.PositiveIntegerField(default=0, editable=False)
+
     class Meta:
         ordering = ["-date", "-id"]
         indexes = [
             models.Index(fields=["is_fixed"]),
+            models.Index(fields=["date", "id"], name="core_tx_date_id_idx"),  # ordering / paginação por cursor
+            # vencimentos (core/due.py): só as pendentes entram no índice
+            models.Index(
+                fields=["account", "date"],
+                condition=models.Q(status="PEN"),
+                name="core_tx_pending_idx",
+            ),
         ]
 
     def __str__(self):
         return f"{self.date} • {self.description} • {self.amount}"
+
+    def clean(self):
+        from . import periods
+
+        if self.account_id and self.date:
+            try:
+                periods.ensure_open(self._month_keys(None if self._state.adding else budgets.stored_entry(self)))
+            except periods.MonthClosedError as e:
+                raise ValidationError(str(e))
+
+    def _month_keys(self, old):
+        """(dono, ano, mês) que a escrita toca: posição nova + a antiga (`stored_entry`)."""
+        (owner_id, _cat, year, month), _amount = budgets.entry(self)
+        keys = [(owner_id, year, month)]
+        if old is not None:
+            keys.append((old[0][0], old[0][2], old[0][3]))
+        return keys
+
+    def save(self, *args, **kwargs):
+        from . import periods
+
+        # mês fechado bloqueado (antes do atomic: não invalida a transação de
+        # quem chamou) + contadores de orçamento na mesma transação da escrita
+        periods.ensure_open(self._month_keys(None if self._state.adding else budgets.stored_entry(self)))
+        fields = kwargs.get("update_fields")
+        with transaction.atomic(using=kwargs.get("using"), savepoint=False):
+            counted = budgets.touches(fields)
+            # linha relida (travada): a instância pode estar desatualizada
+            old = budgets.stored_entry(self, lock=True) if counted and not self._state.adding else None
+            version = self.version
+            if not self._state.adding:
+                # incremento no próprio UPDATE: uma instância desatualizada não
+                # regrava a versão que outra escrita já usou (ver save_base)
+                self.version = models.F("version") + 1
+                if fields is not None:
+                    kwargs["update_fields"] = {*fields, "version"}
+            try:
+                super().save(*args, **kwargs)
+            except Exception:
+                self.version = version
+                raise
+            if counted:
+                budgets.on_save(old, self, fields)
+
+    def save_base(self, *args, **kwargs):
+        super().save_base(*args, **kwargs)
+        if isinstance(self.version, models.expressions.Combinable):
+            # antes do journal (JournaledModel.save) ler o diff
+            self.refresh_from_db(fields=["version"])
+
+    def delete(self, *args, **kwargs):
+        from . import periods
+
+        periods.ensure_open(self._month_keys(budgets.stored_entry(self)))
+        with transaction.atomic(using=kwargs.get("using"), savepoint=False):
+            # contadores descontam o que está no banco, não os valores em memória
+            self._budget_entry = budgets.stored_entry(self, lock=True)
+            return super().delete(*args, **kwargs)
+
+    def save_if_unchanged(self, version, fields):
+        """
+        UPDATE condicional (concorrência otimista): grava `fields` só se a linha
+        ainda está na `version` lida. Devolve False se outra escrita chegou antes.
+        Passa por Transaction.objects.update(): journal, contadores e `version`.
+        """
+        values = {name: getattr(self, name) for name in fields}
+        values["updated_at"] = timezone.now()
+        updated = Transaction.objects.filter(pk=self.pk, version=version).update(**values)
+        if not updated:
+            return False
+        self.version = version + 1
+        self.updated_at = values["updated_at"]
+        return True
+
+
+# --------------------------------------------
+# Journal de alterações (sincronização incremental)
+# --------------------------------------------
+
+class ChangeOp(models.TextChoices):
+    INSERT = "I", "Inclusão"
+    UPDATE = "U", "Alteração"
+    DELETE = "D", "Exclusão"
+
+
+class Change(models.Model):
+    """Linha append-only do journal; `seq` é o cursor de sincronização."""
+    seq = models.BigAutoField(primary_key=True)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name="+")  # None = global (Category)
+    entity = models.CharField(max_length=20)   # transaction | account | category
+    object_id = models.BigIntegerField()
+    op = models.CharField(max_length=1, choices=ChangeOp.choices)
+    data = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)  # insert: linha; update: só o diff
+    txid = models.BigIntegerField(null=True, blank=True, editable=False)  # PostgreSQL: xid da transação (ordem de commit)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["seq"]
+        indexes = [
+            models.Index(fields=["owner", "seq"]),
+            models.Index(fields=["owner", "txid", "seq"]),
+        ]
+
+    def __str__(self):
+        return f"#{self.seq} {self.op} {self.entity}:{self.object_id}"
+
+
+def _is_user_delete(origin):
+    if isinstance(origin, models.QuerySet):
+        return issubclass(origin.model, User)
+    return isinstance(origin, User)
+
+
+@receiver(post_delete, sender=Account)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Transaction)
+def _journal_delete(sender, instance, origin=None, **kwargs):
+    # roda dentro do atomic() do Collector -> mesma transação do DELETE (inclusive cascata)
+    if _is_user_delete(origin):
+        # o próprio dono está sendo removido: o journal e os contadores dele
+        # (Change, CategoryMonthTotal) já foram coletados para a cascata, e
+        # linhas novas apontando para ele quebrariam a FK no commit
+        return
+    batch = journal.delete_batch()
+    try:
+        owner_id = instance.journal_owner_id() if batch is None else batch.owner_of(instance)
+    except Account.DoesNotExist:
+        owner_id = None
+    if batch is None:
+        record(sender, ChangeOp.DELETE, [(instance.pk, owner_id, None)])
+    else:
+        batch.rows[sender].append((instance.pk, owner_id, None))
+    if sender is Transaction:
+        budgets.on_delete(instance, owner_id, batch)
+
+
+# --------------------------------------------
+# Fechamento de mês (snapshots imutáveis)
+# --------------------------------------------
+
+class MonthClose(models.Model):
+    """Mês fechado: totais congelados em PeriodSnapshot; edições bloqueadas até reabrir."""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="closed_months")
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    closed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-year", "-month"]
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "year", "month"], name="uniq_month_close"),
+        ]
+
+    def __str__(self):
+        return f"{self.month:02d}/{self.year} • {self.owner}"
+
+
+class PeriodSnapshot(models.Model):
+    """Total congelado de um mês fechado por (conta, categoria, status)."""
+    period = models.ForeignKey(MonthClose, on_delete=models.CASCADE, related_name="snapshots")
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="+")
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name="+")
+    status = models.CharField(max_length=3, choices=TransactionStatus.choices)
+    total = models.DecimalField(max_digits=14, decimal_places=2)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.period} • {self.account} • {self.category} • {self.total}"
+
+
+# --------------------------------------------
+# Arquivo frio (anos antigos fora de core_transaction)
+# --------------------------------------------
+
+class ArchiveFile(models.Model):
+    """Arquivo colunar com as transações de um ano (ver core/archive.py)."""
+    year = models.PositiveSmallIntegerField(db_index=True)
+    path = models.CharField(max_length=255)
+    row_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["year", "id"]
+
+    def __str__(self):
+        return f"{self.year} • {self.path}"
+
+
+class ArchivedAccountTotal(models.Model):
+    """Soma arquivada por conta — mantém o saldo correto sem reler o arquivo."""
+    archive = models.ForeignKey(ArchiveFile, on_delete=models.CASCADE, related_name="account_totals")
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="archived_totals")
+    total = models.DecimalField(max_digits=14, decimal_places=2)
+    count = models.PositiveIntegerField(default=0)
+
+
+# --------------------------------------------
+# Fila de jobs em banco (ver core/jobs.py)
+# --------------------------------------------
+
+class JobStatus(models.TextChoices):
+    QUEUED  = "QUE", "Na fila"
+    RUNNING = "RUN", "Executando"
+    DONE    = "OK",  "Concluído"
+    FAILED  = "ERR", "Falhou"
+
+
+class Job(models.Model):
+    name = models.CharField(max_length=60)   # nome do handler registrado
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name="jobs")
+    params = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=3, choices=JobStatus.choices, default=JobStatus.QUEUED)
+
+    progress_done = models.PositiveIntegerField(default=0)
+    progress_total = models.PositiveIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+
+    worker = models.CharField(max_length=80, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)   # sinal de vida do worker (jobs.heartbeat)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-id"]
+        indexes = [
+            # só a fila pendente é varrida pelo worker
+            models.Index(fields=["id"], condition=models.Q(status="QUE"), name="core_job_queued_idx"),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.name} ({self.get_status_display()})"
+
+    @property
+    def progress_pct(self):
+        if self.status == JobStatus.DONE:
+            return 100
+        if not self.progress_total:
+            return 0
+        return min(100, int(self.progress_done * 100 / self.progress_total))
+
+    def set_progress(self, done, total=None):
+        """Atualiza o progresso sem tocar nos demais campos (chamado pelos handlers); vale como heartbeat."""
+        fields = {"progress_done": done, "heartbeat_at": timezone.now()}
+        if total is not None:
+            fields["progress_total"] = total
+        Job.objects.filter(pk=self.pk).update(**fields)
+        for k, v in fields.items():
+            setattr(self, k, v)
+
+
+# --------------------------------------------
+# Regras de categorização automática (ver core/categorize.py)
+# --------------------------------------------
+
+class CategoryRule(models.Model):
+    KEYWORD = "KW"
+    REGEX = "RE"
+
+    MATCH_CHOICES = (
+        (KEYWORD, "Palavra-chave"),
+        (REGEX, "Regex"),
+    )
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="category_rules")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="+")
+    match_type = models.CharField(max_length=2, choices=MATCH_CHOICES, default=KEYWORD)
+    pattern = models.CharField(max_length=200, blank=True)   # vazio = só filtros de valor/conta
+
+    # filtros opcionais (valor comparado em absoluto)
+    min_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    max_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+
+    priority = models.SmallIntegerField(default=0)   # maior vence
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-priority", "id"]
+        indexes = [
+            models.Index(fields=["owner", "is_active"]),
+        ]
+
+    def __str__(self):
+        return f"{self.pattern or '*'} → {self.category}"
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .categorize import validate_pattern
+
+        if self.match_type == self.REGEX and self.pattern:
+            error = validate_pattern(self.pattern)
+            if error:
+                raise ValidationError({"pattern": error})
+        if not self.pattern and self.min_amount is None and self.max_amount is None and self.account_id is None:
+            raise ValidationError("Informe um padrão ou ao menos um filtro (valor/conta).")
+
+
+# --------------------------------------------
+# Orçamentos por categoria (ver core/budgets.py)
+# --------------------------------------------
+
+class Budget(models.Model):
+    """Limite mensal de uma categoria para um usuário."""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="budgets")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="+")
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    limit = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        ordering = ["-year", "-month", "category"]
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "category", "year", "month"], name="uniq_budget"),
+        ]
+
+    def __str__(self):
+        return f"{self.month:02d}/{self.year} • {self.category} • {self.limit}"
+
+
+class CategoryMonthTotal(models.Model):
+    """Realizado por (dono, categoria, mês), mantido por deltas a cada escrita em Transaction."""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="+")
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # com sinal (despesa < 0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "year", "month", "category"], name="uniq_category_month_total"),
+        ]
+
+    def __str__(self):
+        return f"{self.month:02d}/{self.year} • {self.category} • {self.total}"
+
+
+# --------------------------------------------
+# Idempotência de formulários de criação (ver core/idempotency.py)
+# --------------------------------------------
+
+class IdempotencyKey(models.Model):
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    scope = models.CharField(max_length=40)     # ex.: "new_transaction"
+    key = models.CharField(max_length=64)
+    response = models.CharField(max_length=500, blank=True)   # URL devolvida ao primeiro envio
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "scope", "key"], name="uniq_idempotency_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
+
+
+# --------------------------------------------
+# Lembretes de vencimento (ver core/due.py + generate_due_reminders)
+# --------------------------------------------
+
+class DueReminder(models.Model):
+    """Resumo diário de vencidos/próximos por usuário (um por dia)."""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="due_reminders")
+    date = models.DateField()
+    overdue_count = models.PositiveIntegerField(default=0)
+    overdue_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    upcoming_count = models.PositiveIntegerField(default=0)
+    upcoming_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    items = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-date"]
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "date"], name="uniq_due_reminder"),
+        ]
+
+    def __str__(self):
+        return f"{self.date} • {self.owner} • {self.overdue_count} vencidas / {self.upcoming_count} próximas"
@@ -0,0 +1,127 @@
+"""
+Fechamento de mês.
+
+Um mês fechado tem seus totais por (conta, categoria, status) congelados em
+PeriodSnapshot. Dashboard / Receitas / Despesas leem os agregados do snapshot
+(sem varrer Transaction; os lançamentos do mês ficam em Transações) e as
+escritas nesse mês ficam bloqueadas até reabrir — no próprio modelo
+(Transaction.save / delete e o QuerySet de Transaction), então admin, jobs e
+comandos também respeitam o fechamento.
+"""
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Sum, Count, Q
+
+from .models import Transaction, MonthClose, PeriodSnapshot
+
+
+class MonthClosedError(ValueError):
+    """Escrita em mês fechado."""
+
+    def __init__(self, year, month):
+        self.year, self.month = year, month
+        super().__init__(f"O mês {month:02d}/{year} está fechado. Reabra-o para alterar lançamentos.")
+
+
+def _ym(value):
+    if isinstance(value, date):
+        return value.year, value.month
+    return value
+
+
+def is_closed(user, when) -> bool:
+    """`when`: date ou (ano, mês)."""
+    year, month = _ym(when)
+    return MonthClose.objects.filter(owner=user, year=year, month=month).exists()
+
+
+def closed_months(user, dates):
+    """Subconjunto de (ano, mês) fechados entre as datas informadas (uma consulta)."""
+    wanted = {_ym(d) for d in dates}
+    if not wanted:
+        return set()
+    years = {y for y, _ in wanted}
+    closed = MonthClose.objects.filter(owner=user, year__in=years).values_list("year", "month")
+    return wanted & set(closed)
+
+
+def ensure_open(keys):
+    """
+    keys: iterável de (owner_id, ano, mês). Levanta MonthClosedError se algum
+    estiver fechado (uma consulta).
+    """
+    q = Q()
+    for owner_id, year, month in set(keys):
+        if owner_id is not None:
+            q |= Q(owner_id=owner_id, year=year, month=month)
+    if not q:
+        return
+    hit = MonthClose.objects.filter(q).order_by("year", "month").values_list("year", "month").first()
+    if hit:
+        raise MonthClosedError(*hit)
+
+
+@transaction.atomic
+def close_month(user, year, month):
+    """Congela os totais do mês. Idempotente: se já fechado, devolve o existente."""
+    period, created = MonthClose.objects.get_or_create(owner=user, year=year, month=month)
+    if not created:
+        return period
+
+    rows = (
+        Transaction.objects
+        .filter(date__year=year, date__month=month, account__owner=user)
+        .order_by()
+        .values("account_id", "category_id", "status")
+        .annotate(total=Sum("amount"), count=Count("id"))
+    )
+    PeriodSnapshot.objects.bulk_create([
+        PeriodSnapshot(
+            period=period,
+            account_id=r["account_id"],
+            category_id=r["category_id"],
+            status=r["status"],
+            total=r["total"],
+            count=r["count"],
+        )
+        for r in rows
+    ])
+    return period
+
+
+def reopen_month(user, year, month):
+    """Reabre o mês (apaga o fechamento e seus snapshots)."""
+    MonthClose.objects.filter(owner=user, year=year, month=month).delete()
+
+
+def month_totals(user, year, month):
+    """
+    Totais do mês por (conta, categoria, status).
+    Devolve (linhas, fechado): linhas = dicts com account_id, category_id,
+    category__name, category__kind, status, total.
+    Mês fechado -> snapshot; aberto -> agregado em Transaction.
+    """
+    period = MonthClose.objects.filter(owner=user, year=year, month=month).first()
+    if period is not None:
+        return list(
+            period.snapshots
+            .values("account_id", "category_id", "category__name", "category__kind", "status", "total")
+        ), True
+
+    return list(
+        Transaction.objects
+        .filter(date__year=year, date__month=month, account__owner=user)
+        .order_by()
+        .values("account_id", "category_id", "category__name", "category__kind", "status")
+        .annotate(total=Sum("amount"))
+    ), False
+
+
+def snapshot_category_totals(user, year, month):
+    """{category_id: (total, qtd)} do snapshot, ou None se o mês estiver aberto."""
+    period = MonthClose.objects.filter(owner=user, year=year, month=month).first()
+    if period is None:
+        return None
+    rows = period.snapshots.order_by().values("category_id").annotate(total=Sum("total"), n=Sum("count"))
+    return {r["category_id"]: (r["total"], r["n"]) for r in rows}
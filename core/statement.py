@@ -0,0 +1,139 @@
+"""
+Extrato por conta com saldo corrente.
+
+Cada página tem no máximo `limit` linhas e o saldo linha a linha vem do banco:
+SUM(amount) OVER (ORDER BY date, id) sobre as linhas da página + o saldo
+anterior à página (seed). Os cursores (assinados) carregam a posição (data,
+id), o saldo nessa fronteira e uma marca do journal (journal.mark): se o dono
+não escreveu nada desde a marca, o seed da próxima página sai do saldo do
+cursor e das linhas da própria página, sem somar o histórico; se escreveu
+(inserção/edição/exclusão retroativa, saldo inicial), o seed é recalculado
+com balance_before (index-only em (account, date, id) INCLUDE amount).
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.core import signing
+from django.db.models import F, Q, Sum, Window
+
+from . import journal
+from .models import Transaction, ArchivedAccountTotal
+
+PAGE_SIZE = 50
+CENT = Decimal("0.01")
+MAX_PAGE_SIZE = 500
+_SALT = "core.statement"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def make_cursor(account, d, pk, balance, mark):
+    """`balance`: saldo na fronteira (antes da 1ª linha / até a última); `mark`: journal.mark()."""
+    return signing.dumps([account.pk, d.isoformat(), pk, str(balance), mark], salt=_SALT, compress=True)
+
+
+def read_cursor(account, token):
+    """(data, id, saldo|None, marca|None). Cursores antigos não trazem marca: saldo None."""
+    try:
+        values = signing.loads(token, salt=_SALT)
+        account_id, d, pk = values[:3]
+        if account_id != account.pk:
+            raise ValueError("cursor de outra conta")
+        balance, mark = (Decimal(values[3]), int(values[4])) if len(values) >= 5 else (None, None)
+        return date.fromisoformat(d), int(pk), balance, mark
+    except (signing.BadSignature, ValueError, TypeError, ArithmeticError) as e:
+        raise InvalidCursor("Cursor inválido.") from e
+
+
+def _before(d, pk):
+    return Q(date__lt=d) | Q(date=d, id__lt=pk)
+
+
+def _after(d, pk):
+    return Q(date__gt=d) | Q(date=d, id__gt=pk)
+
+
+def opening_balance(account):
+    """Saldo inicial da conta + anos arquivados."""
+    archived = (
+        ArchivedAccountTotal.objects.filter(account=account)
+        .aggregate(s=Sum("total"))["s"] or Decimal("0")
+    )
+    return account.initial_balance + archived
+
+
+def balance_before(account, d, pk):
+    """Saldo imediatamente antes de (d, pk) — o seed de cada página."""
+    s = (
+        Transaction.objects.filter(account=account).filter(_before(d, pk))
+        .order_by().aggregate(s=Sum("amount"))["s"] or Decimal("0")
+    )
+    return opening_balance(account) + s
+
+
+def statement_page(account, before=None, after=None, limit=PAGE_SIZE):
+    """
+    Página do extrato em ordem cronológica.
+    Sem cursor: as transações mais recentes. `before`/`after`: cursores
+    devolvidos por uma página anterior (older / newer).
+    Devolve dict com rows (date, description, amount, status, balance, ...),
+    older/newer (cursores ou None) e closing_balance.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    base = Transaction.objects.filter(account=account)
+
+    carried = mark = None
+    if after or before:
+        d, pk, carried, mark = read_cursor(account, after or before)
+        if carried is not None and journal.changed_since(account.owner_id, mark):
+            carried = None   # algo mudou desde o cursor: recalcula
+    if carried is None:
+        mark = journal.mark()   # antes do seed: escrita concorrente cai depois da marca
+
+    if after:
+        page = base.filter(_after(d, pk)).order_by("date", "id")
+    elif before:
+        page = base.filter(_before(d, pk)).order_by("-date", "-id")
+    else:
+        page = base.order_by("-date", "-id")
+    page_ids = list(page.values_list("id", flat=True)[:limit + 1])
+    has_more = len(page_ids) > limit
+    page_ids = page_ids[:limit]
+
+    if not page_ids:
+        return {"rows": [], "older": None, "newer": None, "closing_balance": None}
+
+    running = Window(Sum("amount"), order_by=[F("date").asc(), F("id").asc()])
+    rows = list(
+        Transaction.objects
+        .filter(pk__in=page_ids)
+        .annotate(running=running)
+        .order_by("date", "id")
+        .values(
+            "id", "date", "description", "amount", "status",
+            "category__name", "category__kind", "installment_no", "installment_count", "running",
+        )
+    )
+    for r in rows:
+        r["running"] = r["running"].quantize(CENT)   # SQLite devolve a soma como float
+    if carried is None:
+        seed = balance_before(account, rows[0]["date"], rows[0]["id"])
+    elif after:
+        seed = carried                             # saldo até a linha do cursor
+    else:
+        seed = carried - rows[-1]["running"]       # saldo antes do cursor - linhas da página
+    for r in rows:
+        r["balance"] = (seed + r.pop("running")).quantize(CENT)
+
+    first, last = rows[0], rows[-1]
+    # mais antigas existem se viemos de `after`, ou se a consulta desc achou mais
+    has_older = bool(after) or has_more
+    has_newer = bool(before) or (bool(after) and has_more)
+    return {
+        "rows": rows,
+        "older": make_cursor(account, first["date"], first["id"], seed, mark) if has_older else None,
+        "newer": make_cursor(account, last["date"], last["id"], last["balance"], mark) if has_newer else None,
+        "closing_balance": last["balance"],
+    }
@@ -0,0 +1,170 @@
+"""
+Operações longas (importação de fixas, parcelamentos, fechamento, arquivo).
+Cada uma é uma função comum, usada direto pelas views, e também um handler
+de job registrado em core.jobs para rodar no `run_worker`.
+"""
+import calendar
+import uuid
+from datetime import date
+from decimal import Decimal, ROUND_DOWN
+
+from django.db import transaction
+
+from dateutil.relativedelta import relativedelta
+
+from . import archive, periods
+from .jobs import register
+from .models import Transaction, Account, Category, TransactionStatus
+
+PROGRESS_EVERY = 500
+
+
+def _ensure_open(user, dates):
+    closed = sorted(periods.closed_months(user, dates))
+    if closed:
+        raise periods.MonthClosedError(*closed[0])
+
+
+# --------------------------------------------
+# Parcelamento
+# --------------------------------------------
+
+def split_installments(total, n):
+    """Divide `total` em n parcelas; os centavos de diferença vão nas primeiras."""
+    base = (total / n).quantize(Decimal("0.01"), rounding=ROUND_DOWN)
+    diff = total - (base * n)
+    parts = []
+    for _ in range(n):
+        part = base
+        if diff != 0:
+            step = Decimal("0.01") if diff > 0 else Decimal("-0.01")
+            part = base + step
+            diff -= step
+        parts.append(part)
+    return parts
+
+
+def create_installments(account, category, amount, description, start_date, n, status):
+    """Cria as n parcelas de um mesmo grupo num único INSERT em lote."""
+    group = uuid.uuid4()
+    desc_base = description or category.name
+    objs = [
+        Transaction(
+            date=start_date + relativedelta(months=i),
+            description=f"{desc_base} ({i+1}/{n})",
+            account=account,
+            category=category,
+            amount=part,
+            status=(status if i == 0 else TransactionStatus.PENDING),
+            group_id=group,
+            installment_no=i + 1,
+            installment_count=n,
+            is_fixed=False,  # parcelas nunca são "fixas"
+        )
+        for i, part in enumerate(split_installments(amount, n))
+    ]
+    Transaction.objects.bulk_create(objs)
+    return group
+
+
+@register("create_installments")
+def create_installments_job(job, account_id, category_id, amount, description, start_date, n, status):
+    acc = Account.objects.get(id=account_id, owner=job.owner)
+    cat = Category.objects.get(id=category_id)
+    start = date.fromisoformat(start_date)
+    # o mês pode ter sido fechado depois do enqueue
+    _ensure_open(job.owner, [start + relativedelta(months=i) for i in range(n)])
+    job.set_progress(0, n)
+    group = create_installments(acc, cat, Decimal(amount), description, start, n, status)
+    job.set_progress(n, n)
+    return {"created": n, "group_id": str(group)}
+
+
+# --------------------------------------------
+# Importar fixas do mês anterior
+# --------------------------------------------
+
+def import_fixed(user, kind, year, month, progress=None):
+    """
+    Copia as transações FIXAS (não parceladas) do mês anterior para year/month,
+    sempre PENDENTE, pulando as que já existem. Devolve quantas foram criadas.
+    """
+    first_prev = date(year, month, 1) - relativedelta(months=1)
+    prev_qs = (
+        Transaction.objects
+        .filter(
+            account__owner=user,
+            date__year=first_prev.year,
+            date__month=first_prev.month,
+            category__kind=kind,
+            is_fixed=True,
+            installment_count__isnull=True,   # <<— verificação por campo, não por título
+        )
+        .order_by("date", "id")
+    )
+    last_day_curr = calendar.monthrange(year, month)[1]
+
+    # o que já existe no mês alvo (uma consulta, em vez de um exists() por linha)
+    existing = set(
+        Transaction.objects
+        .filter(
+            account__owner=user,
+            date__year=year,
+            date__month=month,
+            is_fixed=True,
+            installment_count__isnull=True,
+        )
+        .values_list("date", "account_id", "category_id", "description", "amount")
+    )
+
+    to_create = []
+    prev = list(prev_qs)
+    for i, t in enumerate(prev, 1):
+        # mesmo dia (ajustando para meses mais curtos)
+        target_date = date(year, month, min(t.date.day, last_day_curr))
+        key = (target_date, t.account_id, t.category_id, t.description, t.amount)
+        if key in existing:
+            continue
+        existing.add(key)
+        to_create.append(Transaction(
+            date=target_date,
+            description=t.description,       # mantém “(51/360)” se existir — sem heurística
+            account_id=t.account_id,
+            category_id=t.category_id,
+            amount=t.amount,                 # mantém sinal (despesa negativa)
+            status=TransactionStatus.PENDING,
+            is_fixed=True,
+            installment_no=None,
+            installment_count=None,
+        ))
+        if progress and i % PROGRESS_EVERY == 0:
+            progress(i, len(prev))
+
+    with transaction.atomic():
+        Transaction.objects.bulk_create(to_create)
+    if progress:
+        progress(len(prev), len(prev))
+    return len(to_create)
+
+
+@register("import_fixed")
+def import_fixed_job(job, kind, year, month):
+    _ensure_open(job.owner, [(year, month)])
+    created = import_fixed(job.owner, kind, year, month, progress=job.set_progress)
+    return {"created": created, "kind": kind, "year": year, "month": month}
+
+
+# --------------------------------------------
+# Recomputações / manutenção
+# --------------------------------------------
+
+@register("close_month")
+def close_month_job(job, year, month):
+    periods.close_month(job.owner, year, month)
+    return {"year": year, "month": month}
+
+
+@register("archive_year")
+def archive_year_job(job, year):
+    arq = archive.archive_year(year)
+    return {"year": year, "rows": arq.row_count, "path": arq.path}
@@ -1,3 +1,978 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+
+from . import archive, budgets, categorize, due, insights, jobs, journal, loadtest, periods, statement
+from .admin import TransactionAdmin
+from .models import Account, Budget, Category, CategoryMonthTotal, CategoryRule, Change, ChangeOp, DueReminder, IdempotencyKey, Job, JobStatus, Transaction, TransactionStatus
+
+User = get_user_model()
+CENT = Decimal("0.01")
+
+
+class BaseData(TestCase):
+    """Usuário com uma conta e categorias de despesa/receita."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("ana", password="pw")
+        cls.account = Account.objects.create(name="Conta", owner=cls.user)
+        cls.food = Category.objects.create(name="Mercado", kind="EX")
+        cls.salary = Category.objects.create(name="Salário", kind="IN")
+
+    def tx(self, amount="-10", d=None, category=None, **kw):
+        return Transaction.objects.create(
+            date=d or date(2025, 3, 10), description=kw.pop("description", "compra"),
+            account=kw.pop("account", self.account), category=category or self.food,
+            amount=Decimal(amount), **kw,
+        )
+
+
+class JournalTests(BaseData):
+    def test_delete_user_cascades_without_new_changes(self):
+        t = self.tx()
+        user_id = self.user.pk
+        self.user.delete()
+        connection.check_constraints()
+        self.assertFalse(Change.objects.filter(owner_id=user_id).exists())
+        self.assertFalse(Transaction.objects.filter(pk=t.pk).exists())
+
+    def test_delete_account_is_journaled(self):
+        t = self.tx()
+        account_id = self.account.pk
+        self.account.delete()
+        ops = set(Change.objects.filter(owner=self.user, op=ChangeOp.DELETE).values_list("entity", "object_id"))
+        self.assertEqual(ops, {("transaction", t.pk), ("account", account_id)})
+
+    def test_changes_api_pages_with_cursor(self):
+        for i in range(3):
+            self.tx(description=f"c{i}")
+        self.client.force_login(self.user)
+        seen, since = [], 0
+        while True:
+            data = self.client.get("/api/changes/", {"since": since, "limit": 2}).json()
+            seen += [(c["entity"], c["op"]) for c in data["changes"]]
+            since = data["next"]
+            if not data["has_more"]:
+                break
+        self.assertEqual(seen.count(("transaction", "I")), 3)
+        self.assertEqual(self.client.get("/api/changes/", {"since": since}).json()["changes"], [])
+        self.assertEqual(self.client.get("/api/changes/", {"since": "x"}).status_code, 400)
+
+    def test_parse_cursor(self):
+        self.assertEqual(journal.parse_cursor(0), (None, 0))
+        self.assertEqual(journal.parse_cursor("15"), (None, 15))
+        self.assertEqual(journal.parse_cursor("900.15"), (900, 15))
+        with self.assertRaises(ValueError):
+            journal.parse_cursor("a.b")
+
+
+class ClosedMonthTests(BaseData):
+    def setUp(self):
+        self.t = self.tx(d=date(2025, 3, 10))
+        periods.close_month(self.user, 2025, 3)
+
+    def test_writes_in_closed_month_are_refused(self):
+        self.t.amount = Decimal("-99")
+        with self.assertRaises(periods.MonthClosedError):
+            self.t.save()
+        with self.assertRaises(periods.MonthClosedError):
+            self.tx(d=date(2025, 3, 1))
+        with self.assertRaises(periods.MonthClosedError):
+            Transaction.objects.filter(pk=self.t.pk).update(status="PAG")
+        with self.assertRaises(periods.MonthClosedError):
+            Transaction.objects.bulk_create([Transaction(
+                date=date(2025, 3, 2), description="x", account=self.account, category=self.food, amount=-1,
+            )])
+        with self.assertRaises(periods.MonthClosedError):
+            Transaction.objects.filter(pk=self.t.pk).delete()
+        self.assertEqual(Transaction.objects.get(pk=self.t.pk).amount, Decimal("-10"))
+
+    def test_moving_into_closed_month_is_refused(self):
+        other = self.tx(d=date(2025, 4, 1))
+        with self.assertRaises(periods.MonthClosedError):
+            Transaction.objects.filter(pk=other.pk).update(date=date(2025, 3, 5))
+        other.date = date(2025, 3, 5)
+        with self.assertRaises(ValidationError):
+            other.clean()
+
+    def test_reopen_allows_writes(self):
+        periods.reopen_month(self.user, 2025, 3)
+        self.t.amount = Decimal("-99")
+        self.t.save()
+        self.t.delete()
+
+    def test_closed_month_pages_do_not_read_transactions(self):
+        self.client.force_login(self.user)
+        for url in ("/despesas/", "/receitas/"):
+            with CaptureQueriesContext(connection) as ctx:
+                r = self.client.get(url, {"year": 2025, "month": 3})
+            self.assertEqual(r.status_code, 200)
+            table = Transaction._meta.db_table
+            self.assertFalse([q for q in ctx.captured_queries if f'FROM "{table}"' in q["sql"]], url)
+        r = self.client.get("/despesas/", {"year": 2025, "month": 3})
+        section = next(s for s in r.context["sections"] if s["category"] == self.food)
+        self.assertEqual((section["total"], section["count"]), (Decimal("-10"), 1))
+
+
+class ArchiveTests(BaseData):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def test_archive_removes_exactly_the_archived_rows(self):
+        kept = self.tx(d=date(2024, 6, 1), amount="-5")
+        self.tx(d=date(2023, 2, 1), amount="-7")
+        self.tx(d=date(2023, 9, 1), amount="-3")
+        late = []
+
+        def write_then_insert(*args, **kwargs):
+            # escrita que chega depois da leitura do ano: não pode sumir sem ser arquivada
+            result = write_year(*args, **kwargs)
+            late.append(self.tx(d=date(2023, 12, 31), amount="-100"))
+            return result
+
+        write_year = archive.write_year
+        with mock.patch.object(archive, "write_year", write_then_insert):
+            arq = archive.archive_year(2023, self.dir)
+
+        self.assertEqual(arq.row_count, 2)
+        self.assertEqual(archive.archived_account_totals(self.user), {self.account.pk: Decimal("-10")})
+        live = set(Transaction.objects.values_list("pk", flat=True))
+        self.assertEqual(live, {kept.pk, late[0].pk})
+        archived = archive.read_columns(arq.path, ["amount_cents"])["amount_cents"]
+        self.assertEqual(sorted(archived), [-700, -300])
+
+    def test_budget_counters_keep_archived_months_and_rebuild_agrees(self):
+        bia = User.objects.create_user("bia")
+        temp = Category.objects.create(name="Temporária", kind="EX")
+        self.tx(d=date(2023, 2, 1), amount="-7")
+        self.tx(d=date(2023, 2, 20), amount="-3")
+        self.tx(d=date(2023, 9, 1), amount="-2", category=temp)
+        self.tx(d=date(2023, 9, 1), amount="-4", account=Account.objects.create(name="B", owner=bia))
+        self.tx(d=date(2024, 6, 1), amount="-5")
+
+        def counters():
+            return set(CategoryMonthTotal.objects.values_list("owner_id", "category_id", "year", "month", "total", "count"))
+
+        before = counters()
+        archive.archive_year(2023, self.dir)
+        self.assertEqual(counters(), before)
+        self.assertIn((self.user.pk, self.food.pk, 2023, 2, Decimal("-10"), 2), before)
+
+        # categoria apagada depois de arquivar: o contador some junto e o rebuild não o recria
+        temp.delete()
+        before = counters()
+        budgets.rebuild_totals()
+        self.assertEqual(counters(), before)
+        budgets.rebuild_totals(bia)
+        self.assertEqual(counters(), before)
+
+    def test_members_per_owner(self):
+        other = User.objects.create_user("bia")
+        other_account = Account.objects.create(name="Outra", owner=other)
+        mine = self.tx(d=date(2023, 2, 1), amount="-1.50")
+        theirs = self.tx(d=date(2023, 1, 5), account=other_account, amount="-4")
+        arq = archive.archive_year(2023, self.dir)
+
+        with zipfile.ZipFile(arq.path) as zf:
+            self.assertIn(f"{other.pk}/amount_cents.bin", zf.namelist())
+        cols = archive.read_columns(arq.path, ["id", "amount_cents"], owner_id=self.user.pk)
+        self.assertEqual((list(cols["id"]), list(cols["amount_cents"])), ([mine.pk], [-150]))
+        self.assertEqual(sorted(archive.read_columns(arq.path, ["id"])["id"]), sorted([mine.pk, theirs.pk]))
+        self.assertEqual([r["id"] for r in archive.iter_rows(other.pk)], [theirs.pk])
+        self.assertEqual(archive.read_columns(arq.path, ["id"], owner_id=0)["id"].tolist(), [])
+
+    def test_reads_version_1_files(self):
+        path = os.path.join(self.dir, "v1.zip")
+        with zipfile.ZipFile(path, "w") as zf:
+            zf.writestr("manifest.json", json.dumps({
+                "version": 1, "year": 2020, "rows": 3,
+                "columns": {"id": "i8", "owner_id": "i8", "description": "str"},
+            }))
+            zf.writestr("id.bin", archive._encode("i8", [1, 2, 3]))
+            zf.writestr("owner_id.bin", archive._encode("i8", [7, 8, 7]))
+            zf.writestr("description.bin", archive._encode("str", ["a", "b", "c"]))
+        cols = archive.read_columns(path, ["id", "description"], owner_id=7)
+        self.assertEqual((cols["id"].tolist(), cols["description"]), ([1, 3], ["a", "c"]))
+        self.assertEqual(archive.read_columns(path)["owner_id"].tolist(), [7, 8, 7])
+
+
+class InsightsLoadTests(BaseData):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def test_live_and_archived_rows(self):
+        old = self.tx(d=date(2023, 6, 30), amount="-12.34", description="Mercado 12", is_fixed=True)
+        self.tx(d=date(2023, 7, 1), account=Account.objects.create(name="X", owner=User.objects.create_user("bia")))
+        archive.archive_year(2023, self.dir)
+        new = self.tx(d=date(2025, 1, 31), amount="99.90", description="mercado  7", installment_no=2, installment_count=3)
+
+        cols = insights.load_columns(self.user)
+        self.assertEqual(cols.id.tolist(), [new.pk, old.pk])
+        self.assertEqual([date.fromordinal(d) for d in cols.date.tolist()], [date(2025, 1, 31), date(2023, 6, 30)])
+        self.assertEqual(cols.cents.tolist(), [9990, -1234])
+        self.assertEqual(cols.category.tolist(), [self.food.pk] * 2)
+        self.assertEqual(cols.account.tolist(), [self.account.pk] * 2)
+        self.assertEqual(cols.fixed.tolist(), [False, True])
+        self.assertEqual(cols.installment.tolist(), [True, False])
+        self.assertEqual(cols.desc.tolist(), [0, 0])
+        self.assertEqual(cols.descriptions, ["mercado #"])
+
+
+class InsightsAnalyzeTests(TestCase):
+    FOOD, TRANSPORT, MARKET, SUBS, RIDES, TV, SALARY = range(1, 8)
+
+    def cols(self, rows):
+        """rows: (data, centavos, categoria, descrição[, is_fixed[, parcela]])."""
+        descriptions = sorted({r[3] for r in rows})
+        rows = [(*r, False, False)[:6] for r in rows]
+        return insights.Columns(
+            id=np.arange(1, len(rows) + 1, dtype=np.int64),
+            date=np.array([r[0].toordinal() for r in rows], dtype=np.int32),
+            cents=np.array([r[1] for r in rows], dtype=np.int64),
+            category=np.array([r[2] for r in rows], dtype=np.int64),
+            account=np.ones(len(rows), dtype=np.int64),
+            fixed=np.array([r[4] for r in rows], dtype=bool),
+            installment=np.array([r[5] for r in rows], dtype=bool),
+            desc=np.array([descriptions.index(r[3]) for r in rows], dtype=np.int32),
+            descriptions=descriptions,
+        )
+
+    def setUp(self):
+        rows = [(date(2025, m, 10), -10000 * (m - 1), self.FOOD, "feira") for m in range(2, 7)]
+        rows.append((date(2025, 5, 3), -5000, self.TRANSPORT, "posto"))
+        rows += [(date(2025, m, d), -5000, self.MARKET, "mercado") for m in range(1, 6) for d in (1, 8, 15, 22)]
+        self.outlier_id = len(rows) + 1
+        rows.append((date(2025, 6, 20), -100000, self.MARKET, "mercado"))
+        rows += [(date(2025, m, 5), -3990, self.SUBS, "netflix") for m in range(3, 7)]
+        rows += [(date(2025, m, 6), -1990, self.SUBS, "spotify", m == 3) for m in range(3, 7)]
+        rows += [(date(2025, m, d), -500 * d, self.RIDES, "uber") for m in range(4, 7) for d in range(2, 7)]
+        rows += [(date(2025, m, 1), -50000, self.TV, "tv #/#", False, True) for m in range(4, 7)]
+        rows.append((date(2025, 6, 1), 900000, self.SALARY, "salario"))
+        rows.append((date(2025, 7, 1), -70000, self.FOOD, "feira"))   # mês futuro
+        self.data = insights.analyze(self.cols(rows), date(2025, 6, 15))
+
+    def test_monthly_series_rolling_average_and_month_over_month(self):
+        data = self.data
+        self.assertEqual(data["month"], (2025, 6))
+        self.assertEqual(data["series_months"], [(2025, m) for m in range(1, 7)])
+        # maior |variação| primeiro; empates na ordem da categoria
+        self.assertEqual([c["category_id"] for c in data["categories"]],
+                         [self.MARKET, self.FOOD, self.TRANSPORT, self.SUBS, self.RIDES, self.TV])
+        by_id = {c["category_id"]: c for c in data["categories"]}
+        self.assertEqual(by_id[self.FOOD], {
+            "category_id": self.FOOD,
+            "current": 500.0, "previous": 400.0, "delta": 100.0, "delta_pct": 25.0,
+            "rolling_avg": 300.0, "vs_avg_pct": 66.7,
+            "series": [0.0, 100.0, 200.0, 300.0, 400.0, 500.0],
+            "rolling_series": [0.0, 0.0, 33.33, 100.0, 200.0, 300.0],
+        })
+        self.assertEqual(by_id[self.TRANSPORT], {
+            "category_id": self.TRANSPORT,
+            "current": 0.0, "previous": 50.0, "delta": -50.0, "delta_pct": -100.0,
+            "rolling_avg": 16.67, "vs_avg_pct": -100.0,
+            "series": [0.0, 0.0, 0.0, 0.0, 50.0, 0.0],
+            "rolling_series": [0.0, 0.0, 0.0, 0.0, 0.0, 16.67],
+        })
+
+    def test_first_month_has_no_percentages(self):
+        data = insights.analyze(self.cols([(date(2025, 6, 1), -1000, self.FOOD, "feira")]), date(2025, 6, 15))
+        row = data["categories"][0]
+        self.assertEqual((row["current"], row["previous"], row["rolling_avg"]), (10.0, 0.0, 0.0))
+        self.assertIsNone(row["delta_pct"])
+        self.assertIsNone(row["vs_avg_pct"])
+
+    def test_outliers(self):
+        self.assertEqual(self.data["outliers"], [{
+            "id": self.outlier_id, "date": date(2025, 6, 20), "amount": 1000.0,
+            "category_id": self.MARKET, "category_mean": 95.24, "z": 4.5,
+        }])
+
+    def test_recurring_ignores_fixed_installments_and_one_off_purchases(self):
+        self.assertEqual(self.data["recurring"], [{
+            "description": "netflix", "months": 4, "avg_amount": 39.9, "last_date": date(2025, 6, 5),
+        }])
+
+    def test_no_expenses(self):
+        data = insights.analyze(self.cols([(date(2025, 6, 1), 1000, self.SALARY, "salario")]), date(2025, 6, 15))
+        self.assertEqual(data, {"month": (2025, 6), "rows": 1, "categories": [], "outliers": [], "recurring": []})
+
+
+class InsightsCacheTests(BaseData):
+    def setUp(self):
+        insights._CACHE.clear()
+        self.addCleanup(insights._CACHE.clear)
+
+    def test_cached_until_the_next_write(self):
+        self.tx(d=date(2025, 6, 1), amount="-10.00")
+        today = date(2025, 6, 15)
+        with mock.patch.object(insights, "analyze", wraps=insights.analyze) as analyze:
+            first = insights.insights_for(self.user, today)
+            insights.insights_for(self.user, today)
+            self.assertEqual(analyze.call_count, 1)
+            self.tx(d=date(2025, 6, 2), amount="-5.00")
+            second = insights.insights_for(self.user, today)
+            self.assertEqual(analyze.call_count, 2)
+        self.assertEqual(first["categories"][0]["current"], 10.0)
+        self.assertEqual(second["categories"][0]["current"], 15.0)
+        # nomes são resolvidos numa cópia; o resultado em cache fica só com ids
+        self.assertEqual(second["categories"][0]["category"], self.food.name)
+        self.assertNotIn("category", insights._CACHE[self.user.pk][1]["categories"][0])
+
+    def test_not_cached_while_the_journal_position_is_unsettled(self):
+        today = date(2025, 6, 15)
+        with mock.patch.object(journal, "owner_position", return_value=None), \
+                mock.patch.object(insights, "analyze", wraps=insights.analyze) as analyze:
+            insights.insights_for(self.user, today)
+            insights.insights_for(self.user, today)
+        self.assertEqual(analyze.call_count, 2)
+        self.assertNotIn(self.user.pk, insights._CACHE)
+
+
+class JobPageTests(BaseData):
+    def test_next_must_be_local(self):
+        job = Job.objects.create(owner=self.user, name="import_fixed", params={})
+        self.client.force_login(self.user)
+        url = reverse("job_detail", args=[job.pk])
+        for bad in ("javascript:alert(document.cookie)", "https://evil.example/", "//evil.example/"):
+            r = self.client.get(url, {"next": bad})
+            self.assertEqual(r.context["next"], reverse("dashboard"), bad)
+        r = self.client.get(url, {"next": "/despesas/?year=2025&month=3"})
+        self.assertEqual(r.context["next"], "/despesas/?year=2025&month=3")
+
+
+class JobQueueTests(BaseData):
+    def test_requeue_dead_local_workers(self):
+        proc = subprocess.Popen([sys.executable, "-c", "pass"])
+        proc.wait()
+        dead = Job.objects.create(name="import_fixed", status=JobStatus.RUNNING, worker=f"h1:{proc.pid}")
+        alive = Job.objects.create(name="import_fixed", status=JobStatus.RUNNING, worker=f"h1:{os.getpid()}")
+        other_host = Job.objects.create(name="import_fixed", status=JobStatus.RUNNING, worker=f"h2:{proc.pid}")
+        self.assertEqual(jobs.requeue_dead("h1"), 1)
+        statuses = dict(Job.objects.values_list("pk", "status"))
+        self.assertEqual(statuses[dead.pk], JobStatus.QUEUED)
+        self.assertEqual(statuses[alive.pk], JobStatus.RUNNING)
+        self.assertEqual(statuses[other_host.pk], JobStatus.RUNNING)
+
+    def test_requeue_by_heartbeat_age(self):
+        old = now() - timedelta(hours=2)
+        alive = Job.objects.create(name="import_fixed", status=JobStatus.RUNNING, worker="h:1",
+                                   started_at=old, heartbeat_at=now())
+        silent = Job.objects.create(name="import_fixed", status=JobStatus.RUNNING, worker="h:2",
+                                    started_at=old, heartbeat_at=old)
+        self.assertEqual(jobs.requeue_stale(older_than=now() - timedelta(minutes=5)), 1)
+        self.assertEqual(Job.objects.get(pk=alive.pk).status, JobStatus.RUNNING)
+        self.assertEqual(Job.objects.get(pk=silent.pk).status, JobStatus.QUEUED)
+
+    def test_requeued_job_is_not_finished_by_the_old_worker(self):
+        job = Job.objects.create(name="slow", params={})
+        self.assertTrue(jobs.claim_job(job.pk, "h:1"))
+
+        def slow(job):
+            # enquanto roda, outro worker o dá como abandonado e o pega de novo
+            jobs.requeue_stale(worker="h:1")
+            jobs.claim_job(job.pk, "h:2")
+            return {"n": 1}
+
+        with mock.patch.dict(jobs._HANDLERS, {"slow": slow}):
+            self.assertFalse(jobs.run_job(job.pk))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.result), (JobStatus.RUNNING, "h:2", None))
+
+    def test_worker_marks_crashed_job_failed(self):
+        job = Job.objects.create(name="import_fixed", params={})
+        with mock.patch("core.management.commands.run_worker._run", side_effect=RuntimeError("morreu")), \
+                mock.patch("signal.signal"):
+            call_command("run_worker", "--once", "--poll", "0.01", stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertIn("morreu", job.error)
+
+    def test_queued_import_into_month_closed_later_fails(self):
+        self.tx(d=date(2025, 2, 5), is_fixed=True)
+        job = Job.objects.create(name="import_fixed", owner=self.user, params={"kind": "EX", "year": 2025, "month": 3})
+        periods.close_month(self.user, 2025, 3)
+        self.assertTrue(jobs.claim_job(job.pk, "t"))
+        self.assertFalse(jobs.run_job(job.pk))
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertIn("MonthClosedError", job.error)
+        self.assertFalse(Transaction.objects.filter(date__year=2025, date__month=3).exists())
+
+
+class CategorizeTests(BaseData):
+    def rule(self, pk, pattern, priority=0, match_type=CategoryRule.REGEX, **kw):
+        return CategoryRule(id=pk, owner=self.user, category_id=1000 + pk, pattern=pattern,
+                            match_type=match_type, priority=priority, **kw)
+
+    def test_unsupported_constructs_are_rejected(self):
+        for pattern in ("(?i)netflix", "(?P<x>a)", r"(a)\1", "(?(1)a|b)", "a("):
+            self.assertIsNotNone(categorize.validate_pattern(pattern), pattern)
+        self.assertIsNone(categorize.validate_pattern("(?i:netflix)|uber.*"))
+
+    def test_invalid_stored_rule_does_not_break_matcher(self):
+        matcher = categorize.RuleMatcher([
+            self.rule(1, "(?i)netflix"), self.rule(2, "(?P<x>a)"), self.rule(3, "(?P<x>b)"), self.rule(4, "abc"),
+        ])
+        self.assertEqual(matcher.match("xabc"), 1004)
+
+    def test_filtered_regex_does_not_hide_lower_priority_regex(self):
+        matcher = categorize.RuleMatcher([
+            self.rule(1, "uber", priority=5, max_amount=Decimal("50")),
+            self.rule(2, "uber.*", priority=1),
+            self.rule(3, "trip", priority=0),
+        ])
+        self.assertEqual(matcher.match("UBER trip", Decimal("10")), 1001)
+        self.assertEqual(matcher.match("UBER trip", Decimal("100")), 1002)
+        self.assertEqual(matcher.match("trip", Decimal("100")), 1003)
+
+    def test_recategorize_skips_closed_months(self):
+        other = Category.objects.create(name="Transporte", kind="EX")
+        CategoryRule.objects.create(owner=self.user, category=other, pattern="uber", match_type=CategoryRule.KEYWORD)
+        closed = self.tx(d=date(2025, 3, 10), description="UBER 1")
+        open_ = self.tx(d=date(2025, 4, 10), description="UBER 2")
+        periods.close_month(self.user, 2025, 3)
+        call_command("recategorize", user=self.user.username, stdout=io.StringIO())
+        self.assertEqual(Transaction.objects.get(pk=closed.pk).category, self.food)
+        self.assertEqual(Transaction.objects.get(pk=open_.pk).category, other)
+
+
+class StatementTests(BaseData):
+    def setUp(self):
+        self.account.initial_balance = Decimal("100")
+        self.account.save()
+        for i in range(7):
+            self.tx(d=date(2025, 1, 1 + i), amount=str(-(i + 1)))
+
+    def walk_back(self, limit=3):
+        """Páginas do mais recente para o mais antigo; devolve [(data, saldo)] em ordem cronológica."""
+        page = statement.statement_page(self.account, limit=limit)
+        rows = page["rows"]
+        while page["older"]:
+            page = statement.statement_page(self.account, before=page["older"], limit=limit)
+            rows = page["rows"] + rows
+        return rows
+
+    def test_running_balance_across_pages(self):
+        rows = self.walk_back()
+        balances = [r["balance"] for r in rows]
+        expected, bal = [], Decimal("100")
+        for i in range(7):
+            bal -= i + 1
+            expected.append(bal)
+        self.assertEqual(balances, expected)
+
+        page = statement.statement_page(self.account, limit=3)
+        older = statement.statement_page(self.account, before=page["older"], limit=3)
+        newer = statement.statement_page(self.account, after=older["newer"], limit=3)
+        self.assertEqual([r["balance"] for r in newer["rows"]], [r["balance"] for r in page["rows"]])
+
+    def test_pages_reuse_the_cursor_balance(self):
+        expected = [r["balance"] for r in self.walk_back()]
+        with mock.patch.object(statement, "balance_before", wraps=statement.balance_before) as seed:
+            rows = self.walk_back(limit=2)
+            page = statement.statement_page(self.account, limit=2)
+            older = statement.statement_page(self.account, before=page["older"], limit=2)
+            newer = statement.statement_page(self.account, after=older["newer"], limit=2)
+        self.assertEqual([r["balance"] for r in rows], expected)
+        self.assertEqual([r["balance"] for r in newer["rows"]], [r["balance"] for r in page["rows"]])
+        self.assertEqual(seed.call_count, 2)   # só as primeiras páginas (sem cursor)
+
+    def test_old_cursor_reflects_backdated_writes(self):
+        page = statement.statement_page(self.account, limit=3)
+        cursor = page["older"]
+        self.tx(d=date(2024, 12, 1), amount="-1000")
+        older = statement.statement_page(self.account, before=cursor, limit=3)
+        # linhas 2..4 de janeiro: 100 - 1000 - (1+2+3+4) no fim
+        self.assertEqual(older["rows"][-1]["balance"], Decimal("-910"))
+        self.assertEqual(older["rows"][-1]["balance"], self.walk_back()[4]["balance"])
+
+    def test_tampered_cursor_is_rejected(self):
+        page = statement.statement_page(self.account, limit=3)
+        with self.assertRaises(statement.InvalidCursor):
+            statement.statement_page(self.account, before=page["older"] + "x")
+
+
+class BudgetViewTests(BaseData):
+    def post(self, limit):
+        return self.client.post(reverse("set_budget"), {
+            "year": 2025, "month": 3, "category": self.food.pk, "limit": limit,
+        })
+
+    def test_invalid_limits_are_rejected(self):
+        self.client.force_login(self.user)
+        for bad in ("NaN", "sNaN", "Infinity", "-1", "1e20", "abc"):
+            self.assertEqual(self.post(bad).status_code, 302, bad)
+        self.assertFalse(Budget.objects.exists())
+
+    def test_limit_is_stored_in_cents(self):
+        self.client.force_login(self.user)
+        self.post("150,555")
+        self.assertEqual(Budget.objects.get().limit, Decimal("150.56"))
+        self.post("")
+        self.assertFalse(Budget.objects.exists())
+
+
+class DueDateTests(BaseData):
+    def test_dashboard_uses_local_date(self):
+        # 01:30 UTC de 1º/abr ainda é 31/mar em America/Sao_Paulo
+        due_today = self.tx(d=date(2025, 3, 31))
+        self.client.force_login(self.user)
+        utc = datetime(2025, 4, 1, 1, 30, tzinfo=dt_timezone.utc)
+        with self.settings(TIME_ZONE="America/Sao_Paulo"), mock.patch("django.utils.timezone.now", return_value=utc):
+            r = self.client.get(reverse("dashboard"))
+        self.assertEqual(r.context["overdue_count"], 0)
+        self.assertEqual([t["id"] for t in r.context["upcoming"]], [due_today.pk])
+
+
+class DueReminderCommandTests(BaseData):
+    def run_command(self, *args):
+        call_command("generate_due_reminders", "--date", "2025-03-10", *args, stdout=io.StringIO())
+
+    def test_rerun_updates_and_drops_owners_without_dues(self):
+        bia = User.objects.create_user("bia", email="bia@example.com")
+        other = self.tx(d=date(2025, 3, 12), account=Account.objects.create(name="B", owner=bia))
+        late = self.tx(d=date(2025, 3, 1), amount="-20")
+        soon = self.tx(d=date(2025, 3, 11))
+        self.tx(d=date(2025, 3, 20))                      # além do horizonte de 7 dias
+        self.run_command()
+        mine = DueReminder.objects.get(owner=self.user)
+        self.assertEqual((mine.overdue_count, mine.overdue_total), (1, Decimal("-20")))
+        self.assertEqual((mine.upcoming_count, mine.upcoming_total), (1, Decimal("-10")))
+        self.assertEqual([i["id"] for i in mine.items], [late.pk, soon.pk])
+
+        Transaction.objects.filter(pk=other.pk).update(status=TransactionStatus.PAID)
+        late.status = TransactionStatus.PAID
+        late.save()
+        self.run_command()
+        self.assertEqual(list(DueReminder.objects.values_list("owner__username", "overdue_count", "upcoming_count")),
+                         [("ana", 0, 1)])
+
+    def test_other_days_are_kept(self):
+        self.tx(d=date(2025, 3, 11))
+        self.run_command()
+        DueReminder.objects.update(date=date(2025, 3, 9))
+        Transaction.objects.update(status=TransactionStatus.PAID)
+        self.run_command()
+        self.assertEqual(list(DueReminder.objects.values_list("date", flat=True)), [date(2025, 3, 9)])
+
+    def test_email_is_sent_once(self):
+        self.user.email = "ana@example.com"
+        self.user.save()
+        self.tx(d=date(2025, 3, 11))
+        self.run_command("--email")
+        self.run_command("--email")
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("0 vencidas, 1 nos próximos dias", mail.outbox[0].subject)
+
+
+class MonthCalendarTests(BaseData):
+    def grid(self, year, month):
+        weeks = due.month_calendar(self.user, year, month)
+        self.assertTrue(all(len(w) == 7 and w[0]["date"].weekday() == 0 for w in weeks))
+        return {d["date"]: d for w in weeks for d in w}
+
+    def test_weeks_spill_into_neighbour_months(self):
+        # março/2025 começa num sábado e termina numa segunda
+        for d in (date(2025, 2, 23), date(2025, 2, 24), date(2025, 3, 31), date(2025, 4, 6), date(2025, 4, 7)):
+            self.tx(d=d)
+        self.tx(d=date(2025, 3, 31), amount="-5")
+        self.tx(d=date(2025, 3, 15), status=TransactionStatus.PAID)
+        days = self.grid(2025, 3)
+        self.assertEqual((min(days), max(days)), (date(2025, 2, 24), date(2025, 4, 6)))
+        self.assertFalse(days[date(2025, 2, 24)]["in_month"])
+        self.assertEqual(len(days[date(2025, 2, 24)]["items"]), 1)
+        self.assertEqual(len(days[date(2025, 4, 6)]["items"]), 1)
+        self.assertTrue(days[date(2025, 3, 31)]["in_month"])
+        self.assertEqual(days[date(2025, 3, 31)]["total"], Decimal("-15"))
+        self.assertEqual(days[date(2025, 3, 15)]["items"], [])
+        self.assertEqual(sum(len(d["items"]) for d in days.values()), 4)
+
+    def test_december_runs_into_january(self):
+        self.tx(d=date(2026, 1, 4))
+        self.tx(d=date(2026, 1, 5))
+        days = self.grid(2025, 12)
+        self.assertEqual((min(days), max(days)), (date(2025, 12, 1), date(2026, 1, 4)))
+        self.assertFalse(days[date(2026, 1, 4)]["in_month"])
+        self.assertEqual([i["date"] for d in days.values() for i in d["items"]], [date(2026, 1, 4)])
+
+
+class WritePathTests(BaseData):
+    """Contadores (CategoryMonthTotal) e journal (Change) em todos os caminhos de escrita."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.fun = Category.objects.create(name="Lazer", kind="EX")
+        cls.other = Account.objects.create(name="Outra", owner=cls.user)
+
+    def assertCountersMatch(self):
+        expected = {
+            key: (Decimal(str(s)).quantize(CENT), n)
+            for key, (s, n) in budgets.grouped(Transaction.objects.all()).items()
+        }
+        actual = {
+            (o, c, y, m): (Decimal(str(t)).quantize(CENT), n)
+            for o, c, y, m, t, n in CategoryMonthTotal.objects.values_list(
+                "owner_id", "category_id", "year", "month", "total", "count",
+            )
+            if n or t
+        }
+        self.assertEqual(actual, expected)
+
+    def changes(self, since):
+        return list(
+            Change.objects.filter(seq__gt=since, entity="transaction")
+            .order_by("seq").values_list("op", "object_id")
+        )
+
+    def last_seq(self):
+        return Change.objects.order_by("-seq").values_list("seq", flat=True).first() or 0
+
+    def test_save_paths(self):
+        seq = self.last_seq()
+        t = self.tx(amount="-10")
+        self.assertEqual(self.changes(seq), [(ChangeOp.INSERT, t.pk)])
+        self.assertCountersMatch()
+
+        seq = self.last_seq()
+        t.amount, t.date, t.category = Decimal("-25"), date(2025, 4, 2), self.fun
+        t.save()
+        self.assertEqual(self.changes(seq), [(ChangeOp.UPDATE, t.pk)])
+        self.assertCountersMatch()
+
+        seq = self.last_seq()
+        t.account = self.other
+        t.save(update_fields=["account"])
+        self.assertEqual(self.changes(seq), [(ChangeOp.UPDATE, t.pk)])
+        self.assertCountersMatch()
+
+        seq = self.last_seq()
+        fresh = Transaction.objects.get(pk=t.pk)
+        fresh.amount = Decimal("-7")
+        self.assertTrue(fresh.save_if_unchanged(fresh.version, ["amount"]))
+        self.assertEqual(self.changes(seq), [(ChangeOp.UPDATE, t.pk)])
+        self.assertCountersMatch()
+
+        # `t` ficou desatualizada (amount -25 em memória, -7 no banco)
+        t.amount = Decimal("-30")
+        t.save(update_fields=["amount"])
+        self.assertCountersMatch()
+        Transaction.objects.filter(pk=t.pk).update(amount=Decimal("-2"), date=date(2025, 4, 20))
+        t.date = date(2025, 7, 1)
+        t.save(update_fields=["category"])   # só a categoria vai para o banco
+        self.assertCountersMatch()
+        Transaction.objects.filter(pk=t.pk).update(amount=Decimal("-9"))
+
+        seq = self.last_seq()
+        pk = t.pk
+        t.delete()
+        self.assertEqual(self.changes(seq), [(ChangeOp.DELETE, pk)])
+        self.assertCountersMatch()
+
+    def test_bulk_paths(self):
+        seq = self.last_seq()
+        objs = Transaction.objects.bulk_create([
+            Transaction(date=date(2025, 3, d), description=f"b{d}", account=self.account,
+                        category=self.food, amount=Decimal(-d))
+            for d in range(1, 6)
+        ])
+        pks = [o.pk for o in objs]
+        self.assertEqual(self.changes(seq), [(ChangeOp.INSERT, pk) for pk in pks])
+        self.assertCountersMatch()
+
+        seq = self.last_seq()
+        Transaction.objects.filter(pk__in=pks[:2]).update(amount=Decimal("-50"), category=self.fun)
+        self.assertEqual(sorted(self.changes(seq)), [(ChangeOp.UPDATE, pk) for pk in pks[:2]])
+        self.assertCountersMatch()
+
+        seq = self.last_seq()
+        for i, o in enumerate(objs):
+            o.date = date(2025, 5, 1 + i)
+            o.amount = Decimal(-i - 100)
+        Transaction.objects.bulk_update(objs, ["date", "amount"], batch_size=2)
+        # um registro por linha (bulk_update passa por update() por lote)
+        self.assertEqual(sorted(self.changes(seq)), [(ChangeOp.UPDATE, pk) for pk in pks])
+        self.assertCountersMatch()
+
+        seq = self.last_seq()
+        Transaction.objects.filter(pk__in=pks[3:]).delete()
+        self.assertEqual(sorted(self.changes(seq)), [(ChangeOp.DELETE, pk) for pk in pks[3:]])
+        self.assertCountersMatch()
+
+        seq = self.last_seq()
+        self.account.delete()
+        self.assertEqual(sorted(self.changes(seq)), [(ChangeOp.DELETE, pk) for pk in pks[:3]])
+        self.assertCountersMatch()
+
+    def test_bulk_and_cascade_deletes_do_not_scale_with_rows(self):
+        def queries(n, delete):
+            account = Account.objects.create(name=f"C{n}", owner=self.user)
+            for i in range(n):
+                self.tx(d=date(2025, 1 + i % 6, 1 + i % 28), account=account)
+            with CaptureQueriesContext(connection) as ctx:
+                delete(account)
+            self.assertCountersMatch()
+            return len(ctx)
+
+        by_qs = lambda a: Transaction.objects.filter(account=a).delete()
+        self.assertEqual(queries(6, by_qs), queries(60, by_qs))   # mesmos 6 meses
+        self.assertEqual(queries(6, Account.delete), queries(60, Account.delete))
+        self.assertEqual(Change.objects.filter(entity="transaction", op=ChangeOp.DELETE).count(), 132)
+
+    def test_bulk_writes_bump_version(self):
+        t = self.tx()
+        stale = Transaction.objects.get(pk=t.pk)
+        Transaction.objects.filter(pk=t.pk).update(description="lote")
+        t.refresh_from_db()
+        self.assertEqual(t.version, stale.version + 1)
+        stale.amount = Decimal("-1")
+        self.assertFalse(stale.save_if_unchanged(stale.version, ["amount"]))
+
+        t.description = "bulk"
+        Transaction.objects.bulk_update([t], ["description"])
+        fresh = Transaction.objects.get(pk=t.pk)
+        self.assertEqual(fresh.version, stale.version + 2)
+        self.assertFalse(t.save_if_unchanged(t.version, ["description"]))
+        self.assertTrue(fresh.save_if_unchanged(fresh.version, ["description"]))
+        self.assertEqual(Transaction.objects.get(pk=t.pk).version, stale.version + 3)
+
+    def test_stale_saves_do_not_reuse_a_version(self):
+        t = self.tx()
+        a = Transaction.objects.get(pk=t.pk)
+        b = Transaction.objects.get(pk=t.pk)
+        a.description = "a"
+        a.save()
+        b.description = "b"
+        b.save()                      # desatualizada, mas a versão sobe no banco
+        self.assertEqual((a.version, b.version), (t.version + 1, t.version + 2))
+        c = Transaction.objects.get(pk=t.pk)
+        c.description = "c"
+        self.assertFalse(c.save_if_unchanged(a.version, ["description"]))
+        self.assertTrue(c.save_if_unchanged(b.version, ["description"]))
+        last = Change.objects.filter(entity="transaction", object_id=t.pk).order_by("-seq").first()
+        self.assertEqual(last.data["version"], t.version + 3)
+
+    def test_rebuild_matches_incremental(self):
+        self.tx(amount="-3")
+        self.tx(amount="-4", d=date(2025, 6, 1), category=self.fun)
+        before = set(CategoryMonthTotal.objects.values_list("owner_id", "category_id", "year", "month", "total", "count"))
+        budgets.rebuild_totals(self.user)
+        after = set(CategoryMonthTotal.objects.values_list("owner_id", "category_id", "year", "month", "total", "count"))
+        self.assertEqual(before, after)
+
+
+class IdempotencyTests(BaseData):
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post(self, key, installments=1):
+        return self.client.post(reverse("new_transaction"), {
+            "account": self.account.pk, "category": self.food.pk, "amount": "90",
+            "description": "TV", "date": "2025-03-10", "installments": installments,
+            "next": "/despesas/", "idempotency_key": key,
+        })
+
+    def test_double_submit_inline_installments(self):
+        first, second = self.post("k1", installments=3), self.post("k1", installments=3)
+        self.assertRedirects(first, "/despesas/", fetch_redirect_response=False)
+        self.assertRedirects(second, "/despesas/", fetch_redirect_response=False)
+        self.assertEqual(Transaction.objects.count(), 3)
+        self.assertEqual(Transaction.objects.values("group_id").distinct().count(), 1)
+
+    @override_settings(JOBS_ASYNC=True, JOBS_INSTALLMENTS_THRESHOLD=2)
+    def test_double_submit_installments_job(self):
+        first, second = self.post("k1", installments=3), self.post("k1", installments=3)
+        job = Job.objects.get()
+        self.assertEqual(job.name, "create_installments")
+        self.assertEqual(first.url, second.url)
+        self.assertTrue(second.url.startswith(reverse("job_detail", args=[job.pk])))
+
+    @override_settings(JOBS_INSTALLMENTS_THRESHOLD=2)
+    def test_failed_inline_job_releases_the_key(self):
+        with mock.patch("core.tasks.create_installments", side_effect=RuntimeError("falhou")):
+            self.post("k1", installments=3)
+        self.assertEqual(Job.objects.get().status, JobStatus.FAILED)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertRedirects(self.post("k1", installments=3), "/despesas/", fetch_redirect_response=False)
+        self.assertEqual(Transaction.objects.count(), 3)
+
+    def test_expired_key_is_processed_again(self):
+        self.post("k1")
+        self.post("k1")
+        self.assertEqual(Transaction.objects.count(), 1)
+        IdempotencyKey.objects.update(expires_at=now() - timedelta(minutes=1))
+        self.post("k1")
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.post("k1")
+        self.assertEqual(Transaction.objects.count(), 2)
+
+
+class TransactionAdminTests(BaseData):
+    def setUp(self):
+        admin_user = User.objects.create_superuser("root", password="pw")
+        self.client.force_login(admin_user)
+        # datas repetidas: o desempate por id tem de valer entre páginas
+        for i in range(12):
+            self.tx(d=date(2025, 3, 1 + i // 3), description=f"{'Mercado' if i % 2 else 'Posto'} {i}")
+        patcher = mock.patch.object(TransactionAdmin, "list_per_page", 5)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = reverse("admin:core_transaction_changelist")
+
+    def pages(self, **params):
+        """Segue os cursores até a última página; devolve os ids de cada página."""
+        pages = []
+        while True:
+            r = self.client.get(self.url, params)
+            self.assertEqual(r.status_code, 200)
+            cl = r.context["cl"]
+            pages.append([t.pk for t in cl.result_list])
+            if not cl.next_cursor:
+                return pages
+            params = dict(QueryDict(cl.next_cursor_url()[1:]).items())
+
+    def test_cursor_pages_without_duplicates_or_gaps(self):
+        pages = self.pages()
+        self.assertEqual([len(p) for p in pages], [5, 5, 2])
+        expected = list(Transaction.objects.order_by("-date", "-id").values_list("pk", flat=True))
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_search_keeps_paging_by_cursor(self):
+        pages = self.pages(q="merc")
+        self.assertEqual([len(p) for p in pages], [5, 1])
+        expected = list(Transaction.objects.filter(description__startswith="Mercado")
+                        .order_by("-date", "-id").values_list("pk", flat=True))
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_sorting_by_column_drops_the_cursor(self):
+        cl = self.client.get(self.url).context["cl"]
+        r = self.client.get(self.url, {"k": cl.next_cursor, "o": "1"})
+        cl = r.context["cl"]
+        self.assertIsNone(cl.cursor)
+        self.assertFalse(cl.keyset)
+        # ordenação da coluna (data crescente) + desempate -pk do admin
+        expected = list(Transaction.objects.order_by("date", "-id").values_list("pk", flat=True)[:5])
+        self.assertEqual([t.pk for t in cl.result_list], expected)
+
+    def test_malformed_cursor_shows_the_first_page(self):
+        first = [t.pk for t in self.client.get(self.url).context["cl"].result_list]
+        for bad in ("x", "2025-03-01", "2025-13-01_5", "2025-03-01_abc", "_"):
+            r = self.client.get(self.url, {"k": bad})
+            self.assertEqual(r.status_code, 200, bad)
+            self.assertIsNone(r.context["cl"].cursor)
+            self.assertEqual([t.pk for t in r.context["cl"].result_list], first, bad)
+
+
+class LoadtestTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def scenario_file(self, text):
+        path = os.path.join(self.dir, "pico.json")
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_percentile_nearest_rank(self):
+        values = [i / 10 for i in range(1, 11)]
+        self.assertIsNone(loadtest._percentile([], 50))
+        self.assertEqual(loadtest._percentile([0.7], 99), 0.7)
+        self.assertEqual(loadtest._percentile(values, 0), 0.1)
+        self.assertEqual(loadtest._percentile(values, 50), 0.5)
+        self.assertEqual(loadtest._percentile(values, 95), 1.0)
+        self.assertEqual(loadtest._percentile(values, 100), 1.0)
+
+    def test_load_scenario_file_and_overrides(self):
+        path = self.scenario_file('{"users": 5, "mix": {"dashboard": 1}}')
+        scenario = loadtest.load_scenario(path, users=None, duration=7)
+        self.assertEqual(scenario["name"], "pico")
+        self.assertEqual((scenario["users"], scenario["duration"]), (5, 7))
+        self.assertEqual(scenario["mix"], {"dashboard": 1})
+        self.assertEqual(scenario["think_time"], loadtest.SCENARIOS["mixed"]["think_time"])
+        self.assertEqual(loadtest.load_scenario("read-heavy", users=3)["users"], 3)
+
+    def test_load_scenario_rejects_bad_files(self):
+        for text in ("{users: 5", "[1, 2]", '{"mix": {"dashboard": 1, "pix": 2}}'):
+            with self.assertRaises(ValueError, msg=text):
+                loadtest.load_scenario(self.scenario_file(text))
+        with self.assertRaises(CommandError):
+            call_command("loadtest", scenario=self.scenario_file("{users: 5"), stdout=io.StringIO())
+
+    def recorder(self):
+        recorder = loadtest.Recorder()
+        for seconds in (0.3, 0.1, 0.2):
+            recorder.add("dashboard", seconds, 200, 200)
+        recorder.add("toggle_status", 0.5, 409, 200)
+        return recorder
+
+    def test_build_and_format_report(self):
+        scenario = loadtest.load_scenario("mixed", users=4)
+        report = loadtest.build_report(scenario, "wsgi", 2.0, self.recorder())
+        self.assertEqual(report["endpoints"]["dashboard"], {
+            "requests": 3, "errors": 0, "rps": 1.5, "p50_ms": 200.0, "p95_ms": 300.0,
+            "p99_ms": 300.0, "max_ms": 300.0, "statuses": {"200": 3},
+        })
+        self.assertEqual(report["endpoints"]["toggle_status"]["errors"], 1)
+        self.assertEqual(report["endpoints"]["toggle_status"]["statuses"], {"409": 1})
+        self.assertEqual(report["total"], {
+            "requests": 4, "errors": 1, "rps": 2.0, "p50_ms": 200.0, "p95_ms": 500.0, "p99_ms": 500.0,
+        })
+        self.assertEqual(report["meta"]["elapsed_s"], 2.0)
+
+        lines = loadtest.format_report(report).splitlines()
+        self.assertEqual(lines[0], f"cenário mixed • wsgi • {connection.vendor} • 4 usuários • 2.0s")
+        self.assertEqual(lines[1].split(), ["endpoint", "requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+        self.assertEqual(lines[3].split(), ["dashboard", "3", "0", "1.5", "200.0", "300.0", "300.0", "300.0"])
+        self.assertEqual(lines[-1].split(), ["TOTAL", "4", "1", "2.0", "200.0", "500.0", "500.0"])
+
+    def test_report_with_db_stats(self):
+        db = loadtest.DbStats()
+        db.queries["dashboard"] = 12
+        db.db_time["dashboard"] = 0.03
+        db.lock_wait["toggle_status"] = 0.25
+        db.lock_errors["toggle_status"] = 1
+        report = loadtest.build_report(loadtest.load_scenario("mixed"), "asgi", 2.0, self.recorder(), db)
+        row = report["endpoints"]["dashboard"]
+        self.assertEqual((row["queries_per_req"], row["db_ms_per_req"], row["lock_wait_ms"]), (4.0, 10.0, 0))
+        row = report["endpoints"]["toggle_status"]
+        self.assertEqual((row["lock_wait_ms"], row["lock_errors"]), (250.0, 1))
+        header = loadtest.format_report(report).splitlines()[1].split()
+        self.assertEqual(header[-4:], ["queries_per_req", "db_ms_per_req", "lock_wait_ms", "lock_errors"])
+
+    def test_compare(self):
+        scenario = loadtest.load_scenario("mixed")
+        base = loadtest.build_report(scenario, "wsgi", 2.0, self.recorder())
+        recorder = self.recorder()
+        recorder.add("import_fixed", 0.4, 200, 200)
+        new = loadtest.build_report(scenario, "asgi", 1.0, recorder)
+        rows = {tuple(line.split()[:2]): line.split()[2:] for line in loadtest.compare(base, new).splitlines()[3:]}
+        self.assertEqual(rows[("dashboard", "rps")], ["1.5", "3.0", "+100.0%"])
+        self.assertEqual(rows[("TOTAL", "p95_ms")], ["500.0", "500.0", "+0.0%"])
+        self.assertEqual(rows[("dashboard", "errors")], ["0", "0"])          # base 0: sem variação
+        self.assertEqual(rows[("import_fixed", "rps")], ["1.0"])              # só no novo
+        self.assertNotIn(("dashboard", "lock_wait_ms"), rows)                 # sem DbStats nos dois
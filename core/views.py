@@ -1,22 +1,30 @@
 import calendar
-import uuid
-from datetime import datetime, timedelta, date
-from decimal import Decimal, ROUND_DOWN
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from urllib.parse import quote
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.db.models import Sum, Count
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
-from django.utils.timezone import now
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.utils.timezone import localdate
 from django.views.decorators.http import require_POST
 
 from dateutil.relativedelta import relativedelta
 
+from . import archive, budgets, categorize, due, idempotency, insights, jobs, journal, periods, statement, tasks
 from .models import (
     Transaction,
     Category,
     Account,
+    Budget,
+    Job,
+    JobStatus,
     TransactionStatus,  # enum PENDING/PAG (PENDENTE/PAGA)
 )
 
@@ -26,13 +34,31 @@ from .models import (
 
 def _period_from_request(request):
     """Lê ?year=YYYY&month=MM; padrão = mês atual."""
-    today = now().date()
+    today = localdate()
     year = int(request.GET.get("year", today.year))
     month = int(request.GET.get("month", today.month))
     return year, month
 
 MONTHS = list(range(1, 13))
 
+def _budget_context(user, year, month):
+    """Painel de orçamento x realizado (contadores incrementais, O(categorias))."""
+    rows = budgets.budget_panel(user, year, month)
+    return {
+        "budget_rows": rows,
+        "budget_over": sum(1 for r in rows if r["status"] == "over"),
+        "budget_categories": Category.objects.filter(kind="EX").order_by("name"),
+    }
+
+def _month_locked(request, *dates):
+    """True (com mensagem) se alguma das datas cai em mês fechado."""
+    closed = sorted(periods.closed_months(request.user, dates))
+    if closed:
+        y, m = closed[0]
+        messages.error(request, f"O mês {m:02d}/{y} está fechado. Reabra-o para alterar lançamentos. 🔒")
+        return True
+    return False
+
 # --------------------------------------------
 # Dashboard
 # --------------------------------------------
@@ -47,49 +73,61 @@ def dashboard(request):
         .select_related("account", "category")
     )
 
+    # Totais do mês por (conta, categoria, status) — snapshot se o mês estiver fechado
+    month_rows, is_closed = periods.month_totals(request.user, year, month)
+
+    def _sum(kind, status=None):
+        return sum(
+            (r["total"] for r in month_rows
+             if r["category__kind"] == kind and (status is None or r["status"] == status)),
+            Decimal("0"),
+        )
+
     # Totais gerais do mês (por tipo via categoria)
-    totals = qs.values("category__kind").annotate(total=Sum("amount"))
-    total_in = sum(t["total"] for t in totals if t["category__kind"] == "IN") or Decimal("0")
-    total_ex = sum(t["total"] for t in totals if t["category__kind"] == "EX") or Decimal("0")
+    total_in = _sum("IN")
+    total_ex = _sum("EX")
     total_ex_abs = abs(total_ex)
     net = total_in + total_ex
 
     # --- Despesas por categoria (mês/ano) -> para o gráfico de barras ---
-    ex_by_cat_qs = (
-        qs.filter(category__kind="EX")
-          .values("category__name")
-          .annotate(total=Sum("amount"))
-    )
-    ex_by_cat = []
-    for r in ex_by_cat_qs:
-        if r["total"]:
-            ex_by_cat.append({
-                "name": r["category__name"],
-                "total": abs(r["total"] or Decimal("0")),
-            })
+    ex_totals = {}
+    for r in month_rows:
+        if r["category__kind"] == "EX":
+            name = r["category__name"]
+            ex_totals[name] = ex_totals.get(name, Decimal("0")) + (r["total"] or Decimal("0"))
+    ex_by_cat = [
+        {"name": name, "total": abs(total)}
+        for name, total in ex_totals.items()
+        if total
+    ]
     ex_by_cat.sort(key=lambda x: x["total"], reverse=True)
     bar_labels = [x["name"] for x in ex_by_cat]
     bar_values = [float(x["total"]) for x in ex_by_cat]
 
     # --- Pagos (PAGO) do mês ---
-    qs_paid = qs.filter(status=TransactionStatus.PAID)
-    totals_paid = qs_paid.values("category__kind").annotate(total=Sum("amount"))
-    total_in_paid = sum(t["total"] for t in totals_paid if t["category__kind"] == "IN") or Decimal("0")
-    total_ex_paid = sum(t["total"] for t in totals_paid if t["category__kind"] == "EX") or Decimal("0")
+    total_in_paid = _sum("IN", TransactionStatus.PAID)
+    total_ex_paid = _sum("EX", TransactionStatus.PAID)
     total_ex_paid_abs = abs(total_ex_paid)
     net_paid = total_in_paid + total_ex_paid  # saldo parcial (apenas pagos)
 
     # --- Pendentes (PENDENTE) do mês ---
-    qs_pending = qs.filter(status=TransactionStatus.PENDING)
-    totals_pending = qs_pending.values("category__kind").annotate(total=Sum("amount"))
-    total_in_pending = sum(t["total"] for t in totals_pending if t["category__kind"] == "IN") or Decimal("0")
-    total_ex_pending = sum(t["total"] for t in totals_pending if t["category__kind"] == "EX") or Decimal("0")
+    total_in_pending = _sum("IN", TransactionStatus.PENDING)
+    total_ex_pending = _sum("EX", TransactionStatus.PENDING)
 
     # Saldos por conta (geral, não filtrado por mês) — como você já tinha
+    # (uma agregação para todas as contas + somas dos anos arquivados)
     accounts = Account.objects.filter(owner=request.user)
+    live_sums = dict(
+        Transaction.objects
+        .filter(account__owner=request.user)
+        .order_by()
+        .values_list("account_id")
+        .annotate(s=Sum("amount"))
+    )
+    archived_sums = archive.archived_account_totals(request.user)
     account_balances = []
     for acc in accounts:
-        acc_sum = acc.transactions.aggregate(s=Sum("amount"))["s"] or Decimal("0")
+        acc_sum = (live_sums.get(acc.id) or Decimal("0")) + (archived_sums.get(acc.id) or Decimal("0"))
         account_balances.append({"account": acc, "balance": acc.initial_balance + acc_sum})
 
     context = {
@@ -97,6 +135,7 @@ def dashboard(request):
         "month": month,
         "year": year,
         "month_name": calendar.month_name[month],
+        "is_closed": is_closed,
 
         # Totais gerais do mês
         "total_in": total_in,
@@ -112,8 +151,8 @@ def dashboard(request):
         "total_in_pending": total_in_pending,
         "total_ex_pending": total_ex_pending,
 
-        # Lista e contas
-        "recent": qs.order_by("-updated_at", "-id")[:10],
+        # Lista e contas (mês fechado: só snapshot, sem consultar as linhas)
+        "recent": [] if is_closed else qs.order_by("-updated_at", "-id")[:10],
         "account_balances": account_balances,
 
         # Dados do gráfico de barras de despesas por categoria
@@ -121,6 +160,19 @@ def dashboard(request):
         "bar_labels": bar_labels,
         "bar_values": bar_values,
     }
+    context.update(_budget_context(request.user, year, month))
+
+    # Vencidas / próximos dias (índice parcial das pendentes, independe do mês filtrado)
+    today = localdate()
+    context["overdue"], context["overdue_count"], context["overdue_total"] = due.overdue(request.user, today)
+    context["upcoming"], context["upcoming_count"], context["upcoming_total"] = due.upcoming(request.user, today)
+    context["upcoming_days"] = due.UPCOMING_DAYS
+
+    # Insights sobre o histórico todo (cache por usuário até a próxima escrita)
+    data = insights.insights_for(request.user, today)
+    context["insight_categories"] = data["categories"][:5]
+    context["insight_recurring"] = data["recurring"]
+    context["insight_outliers"] = data["outliers"][:5]
     return render(request, "dashboard.html", context)
 
 # --------------------------------------------
@@ -144,9 +196,16 @@ def new_transaction(request):
     if request.method == "POST":
         try:
             acc = Account.objects.get(id=request.POST["account"], owner=request.user)
-            cat = Category.objects.get(id=request.POST["category"])
-
             amt = Decimal(str(request.POST["amount"]))
+
+            # Categoria vazia = automática (regras do usuário)
+            cat_id = request.POST.get("category") or categorize.suggest_category(
+                request.user, request.POST["description"], amt, acc.id
+            )
+            if not cat_id:
+                raise ValueError("nenhuma regra encontrou a categoria; escolha uma manualmente")
+            cat = Category.objects.get(id=cat_id)
+
             # Se for despesa e o valor veio positivo, torna negativo
             if cat.kind == "EX" and amt > 0:
                 amt = -amt
@@ -163,59 +222,64 @@ def new_transaction(request):
             # Checkbox (só vale quando NÃO parcelado)
             is_fixed_flag = ('is_fixed' in request.POST) and (installments <= 1)
 
-            if installments <= 1:
-                Transaction.objects.create(
-                    date=start_date,
-                    description=request.POST["description"].strip(),
-                    account=acc,
-                    category=cat,
-                    amount=amt,
-                    status=status_val,
-                    installment_no=None,
-                    installment_count=None,
-                    is_fixed=is_fixed_flag,
-                )
-            else:
-                total = amt
-                n = installments
-
-                base = (total / n).quantize(Decimal("0.01"), rounding=ROUND_DOWN)
-                diff = total - (base * n)  # ajusta centavinho nas primeiras parcelas
-
-                group = uuid.uuid4()
-                desc_base = request.POST["description"].strip() or cat.name
-
-                for i in range(n):
-                    part = base
-                    if diff != 0:
-                        step = Decimal("0.01") if diff > 0 else Decimal("-0.01")
-                        part = base + step
-                        diff -= step
-
-                    due_date = start_date + relativedelta(months=i)
-
-                    Transaction.objects.create(
-                        date=due_date,
-                        description=f"{desc_base} ({i+1}/{n})",
-                        account=acc,
-                        category=cat,
-                        amount=part,
-                        status=(status_val if i == 0 else TransactionStatus.PENDING),
-                        group_id=group,
-                        installment_no=i + 1,
-                        installment_count=n,
-                        is_fixed=False,  # parcelas nunca são "fixas"
+            due_dates = [start_date + relativedelta(months=i) for i in range(max(installments, 1))]
+            if _month_locked(request, *due_dates):
+                return redirect(request.POST.get("next") or preset["next"] or reverse("dashboard"))
+
+            nxt = request.POST.get("next") or preset["next"] or reverse("dashboard")
+            try:
+                # chave + escritas na mesma transação: reenvio (duplo clique, retry) vira no-op
+                with transaction.atomic():
+                    idem = idempotency.claim(
+                        request.user, "new_transaction", request.POST.get("idempotency_key")
                     )
+                    if installments <= 1:
+                        Transaction.objects.create(
+                            date=start_date,
+                            description=request.POST["description"].strip(),
+                            account=acc,
+                            category=cat,
+                            amount=amt,
+                            status=status_val,
+                            installment_no=None,
+                            installment_count=None,
+                            is_fixed=is_fixed_flag,
+                        )
+                    elif installments > settings.JOBS_INSTALLMENTS_THRESHOLD:
+                        # parcelamentos grandes vão para a fila de jobs
+                        job = jobs.enqueue(
+                            "create_installments", owner=request.user,
+                            account_id=acc.id, category_id=cat.id, amount=str(amt),
+                            description=request.POST["description"].strip(),
+                            start_date=start_date.isoformat(), n=installments, status=status_val,
+                        )
+                        if job.status == JobStatus.FAILED:
+                            # job inline falhou: nada foi criado, o reenvio deve tentar de novo
+                            idempotency.release(idem)
+                        elif job.status != JobStatus.DONE:
+                            idempotency.complete(
+                                idem, f"{reverse('job_detail', args=[job.pk])}?next={quote(nxt)}"
+                            )
+                        if job.status != JobStatus.DONE:
+                            return _redirect_job(request, job, nxt, f"Parcelamento em {installments}x")
+                    else:
+                        tasks.create_installments(
+                            acc, cat, amt, request.POST["description"].strip(),
+                            start_date, installments, status_val,
+                        )
+                    idempotency.complete(idem, nxt)
+            except idempotency.DuplicateRequest as dup:
+                messages.info(request, "Este lançamento já foi registrado (envio repetido ignorado).")
+                return redirect(dup.response or nxt)
 
             messages.success(request, f"Lançamento salvo{'s' if installments>1 else ''}! ✅")
-            nxt = request.POST.get("next") or preset["next"]
-            return redirect(nxt or reverse("dashboard"))
+            return redirect(nxt)
 
         except Exception as e:
             messages.error(request, f"Erro ao salvar transação: {e}")
 
     # categorias mais usadas pelo usuário nos últimos 60 dias (para sidebar)
-    cutoff = now().date() - timedelta(days=60)
+    cutoff = localdate() - timedelta(days=60)
     recent_qs = (
         Transaction.objects.filter(account__owner=request.user, date__gte=cutoff)
         .values("category__id", "category__name", "category__kind")
@@ -230,11 +294,13 @@ def new_transaction(request):
     ctx = {
         "accounts": Account.objects.filter(owner=request.user),
         "categories": Category.objects.all().order_by("kind", "name"),
+        "has_rules": request.user.category_rules.filter(is_active=True).exists(),
         "preset": preset,
         "recent_categories": recent_cats,
         "quick_amounts": [20, 50, 100, 150, 200, 350],
         "status_choices": TransactionStatus.choices,
         "installment_options": [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 18, 24],
+        "idempotency_key": idempotency.new_key(),
     }
     return render(request, "new_transaction.html", ctx)
 
@@ -242,12 +308,20 @@ def new_transaction(request):
 # Editar / Excluir / Toggle status
 # --------------------------------------------
 
+EDIT_FIELDS = ["date", "description", "account", "category", "amount", "status", "is_fixed"]
+
+def _posted_version(request, tx):
+    """Versão enviada pelo formulário; sem ela, a lida agora (protege a janela leitura -> escrita)."""
+    raw = request.POST.get("version")
+    return int(raw) if raw not in (None, "") else tx.version
+
 @login_required
 def edit_transaction(request, pk):
     tx = get_object_or_404(Transaction, pk=pk, account__owner=request.user)
 
     if request.method == "POST":
         try:
+            expected_version = _posted_version(request, tx)
             acc = Account.objects.get(id=request.POST["account"], owner=request.user)
             cat = Category.objects.get(id=request.POST["category"])
 
@@ -267,7 +341,11 @@ def edit_transaction(request, pk):
             if status_val not in dict(TransactionStatus.choices):
                 status_val = TransactionStatus.PENDING
 
-            tx.date = request.POST["date"]  # YYYY-MM-DD (ok para DateField)
+            new_date = datetime.fromisoformat(request.POST["date"]).date()  # YYYY-MM-DD
+            if _month_locked(request, tx.date, new_date):
+                return redirect(request.POST.get("next") or reverse("dashboard"))
+
+            tx.date = new_date
             tx.description = request.POST["description"].strip()
             tx.account = acc
             tx.category = cat
@@ -282,7 +360,15 @@ def edit_transaction(request, pk):
             else:
                 tx.is_fixed = ('is_fixed' in request.POST)
 
-            tx.save()
+            # só grava se ninguém alterou a transação desde que o formulário foi aberto
+            if not tx.save_if_unchanged(expected_version, EDIT_FIELDS):
+                messages.error(
+                    request,
+                    "Esta transação foi alterada em outra aba/sessão enquanto você editava. "
+                    "Confira os dados atuais e salve de novo.",
+                )
+                back = request.POST.get("next") or reverse("dashboard")
+                return redirect(f"{reverse('edit_transaction', args=[tx.pk])}?next={quote(back)}")
             messages.success(request, "Transação atualizada! ✅")
             return redirect(request.POST.get("next") or reverse("dashboard"))
 
@@ -303,6 +389,8 @@ def edit_transaction(request, pk):
 @require_POST
 def delete_transaction(request, pk):
     tx = get_object_or_404(Transaction, pk=pk, account__owner=request.user)
+    if _month_locked(request, tx.date):
+        return redirect(request.POST.get("next") or reverse("dashboard"))
     tx.delete()
     messages.success(request, "Transação excluída. 🗑️")
     return redirect(request.POST.get("next") or reverse("dashboard"))
@@ -311,12 +399,19 @@ def delete_transaction(request, pk):
 @require_POST
 def toggle_status(request, pk):
     tx = get_object_or_404(Transaction, pk=pk, account__owner=request.user)
+    if _month_locked(request, tx.date):
+        return redirect(request.POST.get("next") or reverse("dashboard"))
+    try:
+        expected_version = _posted_version(request, tx)
+    except ValueError:
+        expected_version = -1
     tx.status = (
         TransactionStatus.PAID
         if tx.status == TransactionStatus.PENDING
         else TransactionStatus.PENDING
     )
-    tx.save(update_fields=["status"])
+    if not tx.save_if_unchanged(expected_version, ["status"]):
+        messages.error(request, "A transação foi alterada por outra sessão; confira o status atual.")
     return redirect(request.POST.get("next") or reverse("dashboard"))
 
 # --------------------------------------------
@@ -341,19 +436,28 @@ def receipts_view(request):
             year += 1
 
     sections = Category.objects.filter(kind="IN").order_by("name")
-    tx = (
-        Transaction.objects
-        .filter(date__year=year, date__month=month, account__owner=request.user)
-        .select_related("category", "account")
-    )
 
     # usar 'txs' (não 'items') no template
-    by_cat = {c.id: {"category": c, "txs": [], "total": Decimal("0")} for c in sections}
-    for t in tx.filter(category__kind="IN"):
-        b = by_cat.get(t.category_id)
-        if b:
-            b["txs"].append(t)
-            b["total"] += t.amount
+    by_cat = {c.id: {"category": c, "txs": [], "total": Decimal("0"), "count": 0} for c in sections}
+
+    # mês fechado: totais e contagens vêm do snapshot congelado, sem ler Transaction
+    # (os lançamentos continuam em Transações)
+    snap = periods.snapshot_category_totals(request.user, year, month)
+    if snap is not None:
+        for cid, b in by_cat.items():
+            b["total"], b["count"] = snap.get(cid, (Decimal("0"), 0))
+    else:
+        tx = (
+            Transaction.objects
+            .filter(date__year=year, date__month=month, account__owner=request.user, category__kind="IN")
+            .select_related("category", "account")
+        )
+        for t in tx:
+            b = by_cat.get(t.category_id)
+            if b:
+                b["txs"].append(t)
+                b["total"] += t.amount
+                b["count"] += 1
 
     context = {
         "page_title": "Receitas",
@@ -361,6 +465,7 @@ def receipts_view(request):
         "month": month,
         "months": MONTHS,
         "sections": [by_cat[c.id] for c in sections],
+        "is_closed": snap is not None,
     }
     return render(request, "receitas.html", context)
 
@@ -382,18 +487,26 @@ def expenses_view(request):
             year += 1
 
     sections = Category.objects.filter(kind="EX").order_by("name")
-    tx = (
-        Transaction.objects
-        .filter(date__year=year, date__month=month, account__owner=request.user)
-        .select_related("category", "account")
-    )
-
-    by_cat = {c.id: {"category": c, "txs": [], "total": Decimal("0")} for c in sections}
-    for t in tx.filter(category__kind="EX"):
-        b = by_cat.get(t.category_id)
-        if b:
-            b["txs"].append(t)
-            b["total"] += t.amount
+    by_cat = {c.id: {"category": c, "txs": [], "total": Decimal("0"), "count": 0} for c in sections}
+
+    # mês fechado: totais e contagens vêm do snapshot congelado, sem ler Transaction
+    # (os lançamentos continuam em Transações)
+    snap = periods.snapshot_category_totals(request.user, year, month)
+    if snap is not None:
+        for cid, b in by_cat.items():
+            b["total"], b["count"] = snap.get(cid, (Decimal("0"), 0))
+    else:
+        tx = (
+            Transaction.objects
+            .filter(date__year=year, date__month=month, account__owner=request.user, category__kind="EX")
+            .select_related("category", "account")
+        )
+        for t in tx:
+            b = by_cat.get(t.category_id)
+            if b:
+                b["txs"].append(t)
+                b["total"] += t.amount
+                b["count"] += 1
 
     context = {
         "page_title": "Despesas",
@@ -401,7 +514,9 @@ def expenses_view(request):
         "month": month,
         "months": MONTHS,
         "sections": [by_cat[c.id] for c in sections],
+        "is_closed": snap is not None,
     }
+    context.update(_budget_context(request.user, year, month))
     return render(request, "despesas.html", context)
 
 # --------------------------------------------
@@ -509,64 +624,19 @@ def import_fixed(request, kind: str):
         year = int(request.POST.get("year"))
         month = int(request.POST.get("month"))
     except (TypeError, ValueError):
-        today = now().date()
+        today = localdate()
         year, month = today.year, today.month
 
-    # mês anterior
-    first_curr = date(year, month, 1)
-    first_prev = first_curr - relativedelta(months=1)
-
-    # FIXAS do mês anterior (apenas as que NÃO são parceladas por campo)
-    prev_qs = (
-        Transaction.objects
-        .filter(
-            account__owner=request.user,
-            date__year=first_prev.year,
-            date__month=first_prev.month,
-            category__kind=kind,
-            is_fixed=True,
-            installment_count__isnull=True,   # <<— verificação por campo, não por título
-        )
-        .select_related("account", "category")
-        .order_by("date", "id")
-    )
+    target_view = "expenses" if kind == "EX" else "receipts"
+    back = f"{reverse(target_view)}?year={year}&month={month}"
+    if _month_locked(request, (year, month)):
+        return redirect(back)
 
-    created = 0
-    last_day_curr = calendar.monthrange(year, month)[1]
-
-    for t in prev_qs:
-        # mesmo dia (ajustando para meses mais curtos)
-        target_day = min(getattr(t.date, "day", 1), last_day_curr)
-        target_date = date(year, month, target_day)
-
-        # evita duplicar uma importação idêntica no mês alvo
-        exists = Transaction.objects.filter(
-            account__owner=request.user,
-            date=target_date,
-            account=t.account,
-            category=t.category,
-            description=t.description,
-            amount=t.amount,
-            is_fixed=True,
-            installment_count__isnull=True,
-        ).exists()
-        if exists:
-            continue
-
-        # NÃO enviar group_id para permitir o default do model (evita NOT NULL)
-        Transaction.objects.create(
-            date=target_date,
-            description=t.description,       # mantém “(51/360)” se existir — sem heurística
-            account=t.account,
-            category=t.category,
-            amount=t.amount,                 # mantém sinal (despesa negativa)
-            status=TransactionStatus.PENDING,
-            is_fixed=True,
-            installment_no=None,
-            installment_count=None,
-        )
-        created += 1
+    job = jobs.enqueue("import_fixed", owner=request.user, kind=kind, year=year, month=month)
+    if job.status != JobStatus.DONE:
+        return _redirect_job(request, job, back, "Importação de fixas")
 
+    created = job.result["created"]
     if created:
         messages.success(
             request,
@@ -578,5 +648,235 @@ def import_fixed(request, kind: str):
             f"Não havia {'despesas' if kind=='EX' else 'receitas'} fixas para importar do mês anterior."
         )
 
-    target_view = "expenses" if kind == "EX" else "receipts"
-    return redirect(f"{reverse(target_view)}?year={year}&month={month}")
\ No newline at end of file
+    return redirect(back)
+
+
+# --------------------------------------------
+# Extrato por conta (saldo corrente)
+# --------------------------------------------
+
+def _statement_from_request(request, pk):
+    acc = get_object_or_404(Account, pk=pk, owner=request.user)
+    try:
+        limit = int(request.GET.get("limit") or statement.PAGE_SIZE)
+    except ValueError:
+        limit = statement.PAGE_SIZE
+    page = statement.statement_page(
+        acc,
+        before=request.GET.get("before") or None,
+        after=request.GET.get("after") or None,
+        limit=limit,
+    )
+    return acc, page
+
+@login_required
+def account_statement(request, pk):
+    try:
+        acc, page = _statement_from_request(request, pk)
+    except statement.InvalidCursor:
+        messages.error(request, "Link de paginação inválido.")
+        return redirect("account_statement", pk=pk)
+
+    return render(request, "extrato.html", {
+        "account": acc,
+        "accounts": Account.objects.filter(owner=request.user),
+        "rows": page["rows"],
+        "older": page["older"],
+        "newer": page["newer"],
+        "closing_balance": page["closing_balance"],
+    })
+
+@login_required
+def account_statement_api(request, pk):
+    try:
+        acc, page = _statement_from_request(request, pk)
+    except statement.InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse({
+        "account": {"id": acc.id, "name": acc.name},
+        "rows": [
+            {
+                "id": r["id"],
+                "date": r["date"],
+                "description": r["description"],
+                "category": r["category__name"],
+                "amount": r["amount"],
+                "status": r["status"],
+                "balance": r["balance"],
+            }
+            for r in page["rows"]
+        ],
+        "older": page["older"],
+        "newer": page["newer"],
+    })
+
+
+# --------------------------------------------
+# Fechamento de mês
+# --------------------------------------------
+
+def _period_from_post(request):
+    try:
+        return int(request.POST.get("year")), int(request.POST.get("month"))
+    except (TypeError, ValueError):
+        today = localdate()
+        return today.year, today.month
+
+@login_required
+@require_POST
+def close_month(request):
+    year, month = _period_from_post(request)
+    periods.close_month(request.user, year, month)
+    messages.success(request, f"Mês {month:02d}/{year} fechado. 🔒")
+    return redirect(request.POST.get("next") or f"{reverse('dashboard')}?year={year}&month={month}")
+
+@login_required
+@require_POST
+def reopen_month(request):
+    year, month = _period_from_post(request)
+    periods.reopen_month(request.user, year, month)
+    messages.success(request, f"Mês {month:02d}/{year} reaberto. 🔓")
+    return redirect(request.POST.get("next") or f"{reverse('dashboard')}?year={year}&month={month}")
+
+
+# --------------------------------------------
+# Calendário de vencimentos (pendentes)
+# --------------------------------------------
+
+@login_required
+def due_calendar(request):
+    year, month = _period_from_request(request)
+    nav = request.GET.get("nav")
+    if nav == "prev":
+        month -= 1
+        if month == 0:
+            month = 12
+            year -= 1
+    elif nav == "next":
+        month += 1
+        if month == 13:
+            month = 1
+            year += 1
+
+    weeks = due.month_calendar(request.user, year, month)
+    in_month = [d for w in weeks for d in w if d["in_month"]]
+    context = {
+        "year": year,
+        "month": month,
+        "months": MONTHS,
+        "weekdays": ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"],
+        "weeks": weeks,
+        "today": localdate(),
+        "month_count": sum(len(d["items"]) for d in in_month),
+        "month_total": sum((d["total"] for d in in_month), Decimal("0")),
+    }
+    return render(request, "vencimentos.html", context)
+
+
+# --------------------------------------------
+# Orçamentos por categoria
+# --------------------------------------------
+
+@login_required
+@require_POST
+def set_budget(request):
+    """Define (ou remove, com limite vazio/0) o orçamento de uma categoria no mês."""
+    year, month = _period_from_post(request)
+    back = request.POST.get("next") or f"{reverse('expenses')}?year={year}&month={month}"
+    category = get_object_or_404(Category, id=request.POST.get("category"), kind="EX")
+    raw = (request.POST.get("limit") or "").strip().replace(",", ".")
+    try:
+        limit = Decimal(raw) if raw else Decimal("0")
+    except InvalidOperation:
+        messages.error(request, "Limite inválido.")
+        return redirect(back)
+    # NaN/Infinity e valores que não cabem em Budget.limit
+    if not limit.is_finite() or limit < 0 or limit > budgets.MAX_LIMIT:
+        messages.error(request, "Limite inválido.")
+        return redirect(back)
+    limit = limit.quantize(budgets.CENT)
+
+    if not limit:
+        Budget.objects.filter(owner=request.user, category=category, year=year, month=month).delete()
+        messages.success(request, f"Orçamento de {category.name} removido.")
+    else:
+        Budget.objects.update_or_create(
+            owner=request.user, category=category, year=year, month=month,
+            defaults={"limit": limit},
+        )
+        messages.success(request, f"Orçamento de {category.name}: R$ {limit:.2f}.")
+    return redirect(back)
+
+
+# --------------------------------------------
+# Sincronização incremental (journal)
+# --------------------------------------------
+
+CHANGES_PAGE_SIZE = 500
+CHANGES_MAX_PAGE_SIZE = 5000
+
+@login_required
+def changes_view(request):
+    """
+    GET /api/changes/?since=<cursor>&limit=N
+    Devolve as alterações depois do cursor (do usuário + globais), em ordem de
+    commit. O cursor é opaco (seq, ou "txid.seq" no PostgreSQL — ver
+    core/journal.py); o cliente repete com since=<next> enquanto has_more for true.
+    """
+    since = request.GET.get("since") or 0
+    try:
+        journal.parse_cursor(since)
+        limit = int(request.GET.get("limit") or CHANGES_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({"error": "since/limit inválidos."}, status=400)
+    limit = max(1, min(limit, CHANGES_MAX_PAGE_SIZE))
+
+    rows, next_cursor, has_more = journal.changes_page(request.user, since, limit)
+    return JsonResponse({
+        "changes": [
+            {"seq": seq, "entity": entity, "op": op, "id": object_id, "data": data}
+            for seq, entity, op, object_id, data in rows
+        ],
+        "next": next_cursor,
+        "has_more": has_more,
+    })
+
+
+# --------------------------------------------
+# Jobs (progresso)
+# --------------------------------------------
+
+def _redirect_job(request, job, next_url, label):
+    """Job na fila (ou falhou): leva à página de progresso, que volta para next_url."""
+    if job.status == JobStatus.FAILED:
+        messages.error(request, f"{label}: erro ao executar. ❌")
+        return redirect(next_url)
+    messages.info(request, f"{label} enviado para processamento. ⏳")
+    return redirect(f"{reverse('job_detail', args=[job.pk])}?next={quote(next_url)}")
+
+@login_required
+def job_detail(request, pk):
+    job = get_object_or_404(Job, pk=pk, owner=request.user)
+    # a página navega sozinha para `next` ao terminar: só URLs deste site
+    next_url = request.GET.get("next")
+    if not next_url or not url_has_allowed_host_and_scheme(
+        next_url, allowed_hosts={request.get_host()}, require_https=request.is_secure()
+    ):
+        next_url = reverse("dashboard")
+    return render(request, "job.html", {"job": job, "next": next_url})
+
+@login_required
+def job_status(request, pk):
+    job = get_object_or_404(Job, pk=pk, owner=request.user)
+    return JsonResponse({
+        "id": job.pk,
+        "name": job.name,
+        "status": job.status,
+        "status_display": job.get_status_display(),
+        "progress_done": job.progress_done,
+        "progress_total": job.progress_total,
+        "progress_pct": job.progress_pct,
+        "result": job.result,
+        "error": job.error.splitlines()[-1] if job.error else "",
+    })